@@ -0,0 +1,65 @@
+"""
+Build time and memory of the in-memory availability index, and the cost of
+"who is free in this window?" from the index versus the same question in SQL.
+
+    python benchmarks/availability_index.py [--sizes N,N,...] [--psychologists N]
+"""
+import argparse
+from datetime import date, time, timedelta
+
+from sqlalchemy import func, literal_column, select
+
+from availability_search import seed
+from common import print_table, setup_database, timed, tm_session
+from ruangpulih.availability import AvailabilityIndex
+from ruangpulih.models.schedule import Schedule
+
+
+def free_in_window_sql(session, date_from, date_to, time_from, time_to):
+    """The earliest free slot per psychologist in the window, as one grouped query."""
+    return session.execute(
+        select(Schedule.psychologist_id, func.min(literal_column("schedules.date || ' ' || schedules.time_slot"))).where(
+            Schedule.is_booked == False,
+            Schedule.date.between(date_from, date_to),
+            Schedule.time_slot >= time_from,
+            Schedule.time_slot < time_to,
+        ).group_by(Schedule.psychologist_id)
+    ).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,300000')
+    parser.add_argument('--psychologists', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    table = []
+    for size in [int(s) for s in args.sizes.split(',')]:
+        engine, session_factory = setup_database()
+        with tm_session(session_factory) as session:
+            start = seed(session, size, args.psychologists)
+
+        # "Who is free next Tuesday-to-Thursday morning?"
+        date_from = start + timedelta(days=(1 - start.weekday()) % 7)
+        date_to = date_from + timedelta(days=2)
+        window = (date_from, date_to, time(9, 0), time(12, 0))
+
+        with tm_session(session_factory) as session:
+            index = AvailabilityIndex.build(session, date.today())
+            sql_ms = timed(lambda: free_in_window_sql(session, *window), args.repeat)
+        index_ms = timed(lambda: index.first_free_in_window(*window), args.repeat)
+        stats = index.stats()
+        assert len(index.first_free_in_window(*window)) == args.psychologists
+
+        table.append((
+            size, stats['free_slots'], f"{stats['bytes'] / 1024:.0f}", f"{stats['build_seconds'] * 1000:.0f}",
+            f'{sql_ms:.2f}', f'{index_ms:.3f}',
+        ))
+        engine.dispose()
+
+    print_table(('schedules', 'free slots', 'index KiB', 'build (ms)', 'SQL window (ms)', 'index window (ms)'), table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Latency of one /psychologists/search page as the catalog grows, next to
+the full /psychologists/available payload the front end used to filter.
+
+    python benchmarks/availability_search.py [--sizes N,N,...] [--psychologists N]
+"""
+import argparse
+import uuid
+from datetime import date, time, timedelta
+
+from pyramid import testing
+from sqlalchemy import insert
+
+from common import make_request, print_table, setup_database, timed, tm_session
+from ruangpulih.models.schedule import Schedule
+from ruangpulih.models.user import User
+from ruangpulih.views.pyschologist import build_available_psychologists, search_available_schedules
+
+
+def seed(session, rows, psychologists):
+    """``rows`` hourly slots (08:00-17:00) spread over ``psychologists``; a third are booked."""
+    users = [dict(id=str(uuid.uuid4()), username=f'psy_{i}', email=f'psy_{i}@example.com', role='psychologist', password='x')
+             for i in range(psychologists)]
+    session.execute(insert(User), users)
+    start = date.today() + timedelta(days=1)
+    session.execute(insert(Schedule), [
+        dict(id=str(uuid.uuid4()), psychologist_id=users[n % psychologists]['id'],
+             date=start + timedelta(days=n // (10 * psychologists)),
+             time_slot=time(8 + n // psychologists % 10, 0), is_booked=n % 3 == 0)
+        for n in range(rows)
+    ])
+    return start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,300000')
+    parser.add_argument('--psychologists', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    testing.setUp(settings={})
+    table = []
+    for size in [int(s) for s in args.sizes.split(',')]:
+        engine, session_factory = setup_database()
+        with tm_session(session_factory) as session:
+            start = seed(session, size, args.psychologists)
+
+        # A week a few days out, mornings only: the example from the request.
+        params = {
+            'date_from': (start + timedelta(days=3)).isoformat(),
+            'date_to': (start + timedelta(days=7)).isoformat(),
+            'time_from': '09:00', 'time_to': '12:00', 'limit': '20',
+        }
+        with tm_session(session_factory) as session:
+            search_ms = timed(lambda: search_available_schedules(make_request(session, params=params)), args.repeat)
+            available_ms = timed(lambda: build_available_psychologists(make_request(session), date.today()),
+                                 max(1, args.repeat // 10))
+        table.append((size, f'{search_ms:.2f}', f'{available_ms:.1f}'))
+        engine.dispose()
+
+    print_table(('schedules', 'search page of 20 (ms)', 'full /available (ms)'), table)
+
+
+if __name__ == '__main__':
+    main()
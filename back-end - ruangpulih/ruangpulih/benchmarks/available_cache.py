@@ -0,0 +1,71 @@
+"""
+Latency and statements per request for GET /psychologists/available with
+and without the response cache, plus the hit ratio under a mixed workload
+where every ``--write-every``-th request books a slot.
+
+    python benchmarks/available_cache.py [--psychologists N] [--slots N] [--requests N] [--write-every N]
+"""
+import argparse
+
+from pyramid.threadlocal import get_current_registry
+
+from common import (
+    StatementCounter, make_request, print_table, seed_schedules, seed_users,
+    setup_database, timed, tm_session,
+)
+from ruangpulih.caching import AVAILABLE_PSYCHOLOGISTS_CACHE, GenerationalCache
+from ruangpulih.views.bookings import create_booking
+from ruangpulih.views.pyschologist import get_psychologists_with_available_schedules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--psychologists', type=int, default=50)
+    parser.add_argument('--slots', type=int, default=40, help='available slots per psychologist')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--write-every', type=int, default=20)
+    args = parser.parse_args()
+
+    engine, session_factory = setup_database()
+    with tm_session(session_factory) as session:
+        psychologist_ids = seed_users(session, 'psychologist', args.psychologists)
+        [client_id] = seed_users(session, 'client', 1)
+        schedule_ids = seed_schedules(session, psychologist_ids, args.slots)
+
+    def read():
+        with tm_session(session_factory) as session:
+            get_psychologists_with_available_schedules(make_request(session))
+
+    def book(schedule_id):
+        with tm_session(session_factory) as session:
+            create_booking(make_request(session, client_id, json_body={'schedule_id': schedule_id}))
+
+    registry = get_current_registry()
+    rows = []
+    for name, cache in [('uncached', None), ('cached', GenerationalCache())]:
+        registry[AVAILABLE_PSYCHOLOGISTS_CACHE] = cache
+        read()  # warm up (and fill the cache)
+        with StatementCounter(engine) as counter:
+            ms = timed(read, args.requests)
+        rows.append((name, f'{counter.count / args.requests:.1f}', f'{ms:.3f}', '-'))
+
+    cache = GenerationalCache()
+    registry[AVAILABLE_PSYCHOLOGISTS_CACHE] = cache
+    writes = iter(schedule_ids)
+    with StatementCounter(engine) as counter:
+        def mixed(i=[0]):
+            i[0] += 1
+            if i[0] % args.write_every == 0:
+                book(next(writes))
+            read()
+        ms = timed(mixed, args.requests)
+    stats = cache.stats()
+    hit_ratio = stats['hits'] / max(stats['hits'] + stats['misses'], 1)
+    rows.append((f'cached, 1 write per {args.write_every}', f'{counter.count / args.requests:.1f}',
+                 f'{ms:.3f}', f'{hit_ratio:.0%}'))
+
+    print_table(('mode', 'statements/request', 'ms/request', 'hit ratio'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+A dashboard page load through the whole WSGI application, signed in with
+the auth-ticket cookie: /bookings, /schedules and /psychologists/{id} as
+three requests, next to one POST /batch. Runs in process, so the network
+round trips a batch also saves come on top.
+
+    python benchmarks/batch_requests.py [--repeat N]
+"""
+import argparse
+import os
+import tempfile
+
+from webtest import TestApp
+
+from common import StatementCounter, print_table, seed_schedules, seed_users, timed, tm_session
+from ruangpulih import main as make_app
+from ruangpulih.models.meta import Base
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = make_app({}, **{
+            'sqlalchemy.url': 'sqlite:///' + os.path.join(directory, 'bench.sqlite'),
+            'bcrypt.workers': '1', 'bcrypt.rounds': '4',
+        })
+        engine = app.registry['dbsession_factory'].kw['bind']
+        Base.metadata.create_all(engine)
+        with tm_session(app.registry['dbsession_factory']) as session:
+            [psychologist_id] = seed_users(session, 'psychologist', 1)
+            seed_schedules(session, [psychologist_id], 50)
+
+        client = TestApp(app, extra_environ={'HTTP_ORIGIN': 'http://localhost:5173'})
+        client.post_json('/register', {'username': 'c', 'email': 'c@example.com', 'password': 'pw', 'role': 'client'})
+        client.post_json('/login', {'email': 'c@example.com', 'password': 'pw'})
+
+        paths = ['/bookings', '/schedules?limit=20', f'/psychologists/{psychologist_id}']
+        separate = lambda: [client.get(path) for path in paths]
+        batched = lambda: client.post_json('/batch', {'requests': [{'path': path} for path in paths]})
+        assert [r['status'] for r in batched().json['responses']] == [200, 200, 200]
+
+        table = []
+        for name, load in ((f'{len(paths)} requests', separate), ('1 batch', batched)):
+            with StatementCounter(engine) as counter:
+                load()
+            table.append((name, f'{timed(load, args.repeat):.2f}', counter.count))
+        engine.dispose()
+
+    print_table(('dashboard load', 'ms', 'statements'), table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Cost of keeping clients' booking lists current by polling GET /bookings,
+next to pushing changes over /events: the poll is a query per client per
+interval whether or not anything changed; a push is one formatted frame
+per change, queued to the streams of the users it concerns.
+
+    python benchmarks/booking_events.py [--clients N] [--bookings N] [--interval S]
+"""
+import argparse
+import uuid
+
+from pyramid import testing
+from sqlalchemy import insert
+
+from common import StatementCounter, make_request, print_table, seed_schedules, seed_users, setup_database, timed, tm_session
+from ruangpulih.events import EventHub
+from ruangpulih.models.booking import Booking
+from ruangpulih.views.bookings import list_bookings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--bookings', type=int, default=20, help='bookings per client')
+    parser.add_argument('--interval', type=float, default=10, help='poll interval in seconds')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    testing.setUp(settings={})
+    engine, session_factory = setup_database()
+    with tm_session(session_factory) as session:
+        [psychologist_id] = seed_users(session, 'psychologist', 1)
+        client_ids = seed_users(session, 'client', args.clients)
+        schedule_ids = seed_schedules(session, [psychologist_id], args.clients * args.bookings, is_booked=True)
+        session.flush()
+        session.execute(insert(Booking), [
+            dict(id=str(uuid.uuid4()), client_id=client_ids[n % args.clients], schedule_id=schedule_id, status='pending')
+            for n, schedule_id in enumerate(schedule_ids)
+        ])
+
+    with tm_session(session_factory) as session:
+        poll = lambda: list_bookings(make_request(session, userid=client_ids[0]))
+        poll_ms = timed(poll, args.repeat)
+        with StatementCounter(engine) as counter:
+            poll()
+    engine.dispose()
+
+    hub = EventHub(max_streams=args.clients + 1)
+    subscriptions = [hub.subscribe(client_id) for client_id in client_ids]
+    hub.subscribe(psychologist_id)
+    data = b'{"id": "%s", "status": "confirmed"}' % str(uuid.uuid4()).encode()
+
+    def push():
+        hub.publish([client_ids[0], psychologist_id], 'booking.updated', data)
+        subscriptions[0].queue.get_nowait()
+    push_ms = timed(push, args.repeat * 100)
+
+    polls_per_minute = args.clients * 60 / args.interval
+    print_table(
+        ('', 'per request', 'per minute for all clients'),
+        [
+            (f'poll every {args.interval:g}s', f'{poll_ms:.2f} ms, {counter.count} statements',
+             f'{polls_per_minute * poll_ms:.0f} ms, {polls_per_minute * counter.count:.0f} statements'),
+            ('push one change', f'{push_ms * 1000:.1f} us, 0 statements', 'only when bookings change'),
+        ],
+    )
+    print(f'{hub.stream_count()} open streams, each holding a queue and a server worker thread')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Publishing a month of availability: one add_schedule request per slot
+versus a single add_schedules_bulk request with a recurrence rule.
+
+    python benchmarks/bulk_schedules.py [--weeks N] [--slots-per-day N]
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from common import StatementCounter, make_request, print_table, seed_users, setup_database, tm_session
+from ruangpulih.views.schedules import add_schedule, add_schedules_bulk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--weeks', type=int, default=4)
+    parser.add_argument('--slots-per-day', type=int, default=8)
+    args = parser.parse_args()
+
+    engine, session_factory = setup_database()
+    with tm_session(session_factory) as session:
+        one_by_one_id, bulk_id = seed_users(session, 'psychologist', 2)
+
+    start = date(2030, 1, 7)  # a Monday
+    end = start + timedelta(weeks=args.weeks) - timedelta(days=1)
+    time_slots = [f'{8 + i:02d}:00' for i in range(args.slots_per_day)]
+    weekdays = ['mon', 'tue', 'wed', 'thu', 'fri']
+
+    slots = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            slots.extend({'date': day.isoformat(), 'time_slot': t} for t in time_slots)
+        day += timedelta(days=1)
+
+    def one_by_one():
+        for slot in slots:
+            with tm_session(session_factory) as session:
+                add_schedule(make_request(session, one_by_one_id, json_body=slot))
+
+    def bulk():
+        with tm_session(session_factory) as session:
+            return add_schedules_bulk(make_request(session, bulk_id, json_body={'recurrence': {
+                'date_from': start.isoformat(), 'date_to': end.isoformat(),
+                'weekdays': weekdays, 'time_slots': time_slots,
+            }}))
+
+    rows = []
+    for name, fn in [(f'{len(slots)} x add_schedule', one_by_one), ('1 x add_schedules_bulk', bulk)]:
+        with StatementCounter(engine) as counter:
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+        rows.append((name, counter.count, f'{elapsed * 1000:.1f}'))
+
+    # Re-publishing the same rule only runs the duplicate check.
+    with StatementCounter(engine) as counter:
+        started = time.perf_counter()
+        result = bulk()
+        elapsed = time.perf_counter() - started
+    rows.append((f'bulk again ({len(result["skipped"])} skipped)', counter.count, f'{elapsed * 1000:.1f}'))
+
+    print_table(('requests', 'statements', 'ms total'), rows)
+
+
+if __name__ == '__main__':
+    main()
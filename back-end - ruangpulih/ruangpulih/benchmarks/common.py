@@ -0,0 +1,111 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+The scripts are not part of the test suite; run them from the project
+root once the package is installed, e.g. ``python benchmarks/write_statements.py``.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, time as dtime, timedelta
+
+import transaction
+from pyramid.response import Response
+from sqlalchemy import event
+
+from ruangpulih.models import get_engine, get_session_factory, get_tm_session
+from ruangpulih.models.meta import Base
+from ruangpulih.models.schedule import Schedule
+from ruangpulih.models.user import User
+from ruangpulih.testing import DummyRequest
+
+
+def make_request(dbsession, userid=None, json_body=None, matchdict=None, params=None):
+    """Builds a request that the view functions can be called with directly."""
+    request = DummyRequest(dbsession=dbsession, json_body=json_body, matchdict=matchdict, params=params)
+    request.authenticated_userid = userid
+    request.response = Response()
+    request.tm = transaction.manager
+    return request
+
+
+def setup_database(url='sqlite://', **settings):
+    """Creates the schema on a fresh engine and returns (engine, session_factory)."""
+    settings['sqlalchemy.url'] = url
+    engine = get_engine(settings)
+    Base.metadata.create_all(engine)
+    return engine, get_session_factory(engine)
+
+
+@contextmanager
+def tm_session(session_factory):
+    """Yields a transaction-managed session that is committed on exit."""
+    with transaction.manager:
+        yield get_tm_session(session_factory, transaction.manager)
+
+
+def seed_users(session, role, count, prefix=None):
+    """Adds ``count`` users with a dummy password hash and returns their ids."""
+    prefix = prefix or role
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    session.add_all([
+        User(id=user_id, username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com', role=role, password='x')
+        for i, user_id in enumerate(ids)
+    ])
+    return ids
+
+
+def seed_schedules(session, psychologist_ids, per_psychologist, start=None, is_booked=False):
+    """Adds hourly slots (08:00-17:00) on consecutive days for each psychologist."""
+    start = start or date.today() + timedelta(days=1)
+    ids = []
+    rows = []
+    for psychologist_id in psychologist_ids:
+        for n in range(per_psychologist):
+            schedule_id = str(uuid.uuid4())
+            ids.append(schedule_id)
+            rows.append(Schedule(
+                id=schedule_id,
+                psychologist_id=psychologist_id,
+                date=start + timedelta(days=n // 10),
+                time_slot=dtime(8 + n % 10, 0),
+                is_booked=is_booked,
+            ))
+    session.add_all(rows)
+    return ids
+
+
+class StatementCounter:
+    """Counts statements executed on ``engine`` while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+
+def timed(fn, repeat):
+    """Runs ``fn`` ``repeat`` times and returns the mean wall time in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(v)) for v in column) for column in zip(headers, *rows)]
+    line = '  '.join(f'{{:<{w}}}' for w in widths)
+    print(line.format(*headers))
+    print(line.format(*['-' * w for w in widths]))
+    for row in rows:
+        print(line.format(*row))
@@ -0,0 +1,78 @@
+"""
+Refreshing a detail page that has not changed: the full payload next to a
+conditional GET answered with 304 after the version-only lookup. The full
+timings stop at the view's return value; rendering the JSON comes on top.
+
+    python benchmarks/conditional_gets.py [--schedules N] [--reviews N]
+"""
+import argparse
+import uuid
+
+from pyramid import testing
+from pyramid.httpexceptions import HTTPNotModified
+from sqlalchemy import insert
+
+from common import StatementCounter, make_request, print_table, seed_schedules, seed_users, setup_database, timed, tm_session
+from ruangpulih.models.booking import Booking
+from ruangpulih.models.review import Review
+from ruangpulih.views.bookings import get_booking
+from ruangpulih.views.pyschologist import get_psychologist_detail
+from ruangpulih.views.schedules import get_schedule
+
+
+def refresh(view, session, etag=None, **kwargs):
+    request = make_request(session, **kwargs)
+    if etag:
+        request.headers['If-None-Match'] = f'"{etag}"'
+    try:
+        view(request)
+    except HTTPNotModified:
+        pass
+    return request.response.etag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--schedules', type=int, default=500, help='free schedules of the psychologist')
+    parser.add_argument('--reviews', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    testing.setUp(settings={})
+    engine, session_factory = setup_database()
+    with tm_session(session_factory) as session:
+        [psychologist_id] = seed_users(session, 'psychologist', 1)
+        [client_id] = seed_users(session, 'client', 1)
+        [booked_id] = seed_schedules(session, [psychologist_id], 1, is_booked=True)
+        seed_schedules(session, [psychologist_id], args.schedules)
+        session.flush()
+        booking_id = str(uuid.uuid4())
+        session.execute(insert(Booking), [dict(id=booking_id, client_id=client_id, schedule_id=booked_id, status='confirmed')])
+        session.execute(insert(Review), [
+            dict(id=str(uuid.uuid4()), booking_id=booking_id, psychologist_id=psychologist_id, rating=5, comment='Great session')
+            for _ in range(args.reviews)
+        ])
+
+    cases = [
+        ('GET /bookings/{id}', get_booking, dict(userid=client_id, matchdict={'id': booking_id})),
+        ('GET /schedules/{id}', get_schedule, dict(matchdict={'id': booked_id})),
+        (f'GET /psychologists/{{id}} ({args.schedules} slots)', get_psychologist_detail, dict(matchdict={'id': psychologist_id})),
+    ]
+    table = []
+    with tm_session(session_factory) as session:
+        for name, view, kwargs in cases:
+            etag = refresh(view, session, **kwargs)
+            row = [name]
+            for conditional in (None, etag):
+                with StatementCounter(engine) as counter:
+                    refresh(view, session, conditional, **kwargs)
+                ms = timed(lambda: refresh(view, session, conditional, **kwargs), args.repeat)
+                row += [f'{ms:.3f}', counter.count]
+            table.append(row)
+    engine.dispose()
+
+    print_table(('endpoint', 'full (ms)', 'statements', '304 (ms)', 'statements'), table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Cost of a CORS preflight through the whole WSGI application, next to the
+cheapest GET, and proof that preflights never reach the database.
+
+    python benchmarks/cors_preflight.py [--requests N]
+"""
+import argparse
+import os
+import tempfile
+
+from pyramid.interfaces import ITweens
+
+from common import StatementCounter, print_table, timed
+from ruangpulih import main as make_app
+from ruangpulih.models.meta import Base
+
+
+def call(app, method, path, origin='http://localhost:5173', **extra):
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': None,
+        'HTTP_ORIGIN': origin,
+    }
+    environ.update(extra)
+    status = []
+    body = b''.join(app(environ, lambda s, headers, exc_info=None: status.append(s)))
+    return status[0], body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = 'sqlite:///' + os.path.join(directory, 'bench.sqlite')
+        app = make_app({}, **{'sqlalchemy.url': url, 'sqlstats.enabled': 'false', 'metrics.enabled': 'true'})
+        engine = app.registry['dbsession_factory'].kw['bind']
+        Base.metadata.create_all(engine)
+
+        preflight = lambda: call(
+            app, 'OPTIONS', '/bookings',
+            HTTP_ACCESS_CONTROL_REQUEST_METHOD='POST',
+            HTTP_ACCESS_CONTROL_REQUEST_HEADERS='content-type',
+        )
+        status, _ = preflight()
+        assert status.startswith('204'), status
+
+        counter = StatementCounter(engine)
+        with counter:
+            preflight_ms = timed(preflight, args.requests)
+        preflight_statements = counter.count
+
+        with counter:
+            get_ms = timed(lambda: call(app, 'GET', '/reviews'), args.requests // 10)
+        get_statements = counter.count
+
+        print('tweens (outermost first):', ', '.join(name for name, _ in app.registry.queryUtility(ITweens).implicit()))
+        print_table(('request', 'us/request', 'SQL statements'), [
+            ('OPTIONS /bookings (preflight)', f'{preflight_ms * 1000:.1f}', preflight_statements),
+            ('GET /reviews (empty table)', f'{get_ms * 1000:.1f}', get_statements),
+        ])
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
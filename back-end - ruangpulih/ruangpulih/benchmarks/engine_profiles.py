@@ -0,0 +1,106 @@
+"""
+Mixed read/write throughput on a SQLite file under each engine profile:
+reader threads page through free slots while writer threads add schedules,
+each in its own committed transaction.
+
+    python benchmarks/engine_profiles.py [--seconds N] [--readers N] [--writers N]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, time as dtime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+
+from common import print_table, seed_users
+from ruangpulih.models import ENGINE_PROFILES, get_engine, get_session_factory
+from ruangpulih.models.meta import Base
+from ruangpulih.models.schedule import Schedule
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = get_engine({
+            'sqlalchemy.url': 'sqlite:///' + os.path.join(directory, 'bench.sqlite'),
+            'sqlalchemy.profile': profile,
+        })
+        Base.metadata.create_all(engine)
+        session_factory = get_session_factory(engine)
+
+        with session_factory() as session:
+            [psychologist_id] = seed_users(session, 'psychologist', 1)
+            start = date.today() + timedelta(days=1)
+            session.execute(insert(Schedule), [
+                dict(id=str(uuid.uuid4()), psychologist_id=psychologist_id,
+                     date=start + timedelta(days=n // 10), time_slot=dtime(8 + n % 10), is_booked=False)
+                for n in range(args.rows)
+            ])
+            session.commit()
+
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+
+        def count(key):
+            with lock:
+                counts[key] += 1
+
+        def reader():
+            page = select(Schedule.id, Schedule.date, Schedule.time_slot).where(
+                Schedule.is_booked == False, Schedule.date >= start
+            ).order_by(Schedule.date, Schedule.time_slot, Schedule.id).limit(50)
+            while time.perf_counter() < deadline:
+                try:
+                    with session_factory() as session:
+                        session.execute(page).all()
+                    count('reads')
+                except OperationalError:
+                    count('locked')
+
+        def writer(n):
+            i = 0
+            while time.perf_counter() < deadline:
+                i += 1
+                try:
+                    with session_factory() as session:
+                        session.add(Schedule(psychologist_id=psychologist_id, date=date(2040, 1, 1) + timedelta(days=i),
+                                             time_slot=dtime(n % 24), is_booked=False))
+                        session.commit()
+                    count('writes')
+                except OperationalError:
+                    count('locked')
+
+        threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+        threads += [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    return (
+        profile,
+        f"{counts['reads'] / args.seconds:.0f}",
+        f"{counts['writes'] / args.seconds:.0f}",
+        counts['locked'],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = [run_profile(profile, args) for profile in ENGINE_PROFILES]
+    print_table(('profile', 'reads/s', 'writes/s', '"database is locked" errors'), rows)
+
+
+if __name__ == '__main__':
+    main()
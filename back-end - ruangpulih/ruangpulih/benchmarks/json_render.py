@@ -0,0 +1,47 @@
+"""
+Response size and render time of the json renderer variants for a page of
+schedules as returned by GET /schedules.
+
+    python benchmarks/json_render.py [--rows N] [--repeat N]
+"""
+import argparse
+
+from pyramid.response import Response
+
+from common import make_request, print_table, seed_schedules, seed_users, setup_database, timed, tm_session
+from ruangpulih.models.schedule import Schedule
+from ruangpulih.renderers import json_renderer_from_settings, orjson
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    engine, session_factory = setup_database()
+    with tm_session(session_factory) as session:
+        [psychologist_id] = seed_users(session, 'psychologist', 1)
+        seed_schedules(session, [psychologist_id], args.rows)
+
+    with tm_session(session_factory) as session:
+        payload = [s.to_dict() for s in session.query(Schedule)]
+        request = make_request(session)
+
+    variants = [('pretty (indent=4)', {'json.pretty': 'true'}), ('compact json', {'json.encoder': 'json'})]
+    if orjson is not None:
+        variants.append(('compact orjson', {'json.encoder': 'orjson'}))
+
+    rows = []
+    for name, settings in variants:
+        render = json_renderer_from_settings(settings)(None)
+        request.response = Response()
+        body = render(payload, {'request': request})
+        ms = timed(lambda: render(payload, {'request': request}), args.repeat)
+        rows.append((name, f'{len(body) / 1024:.0f}', f'{ms:.2f}'))
+
+    print_table(('renderer', 'KiB', 'ms/render'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Per-request cost of the metrics tween: time added around a trivial handler
+and memory retained after many requests (which should stay at zero once
+every route and status has been seen).
+
+    python benchmarks/metrics_overhead.py [--requests N]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from pyramid import testing
+from pyramid.response import Response
+
+from common import print_table, timed
+from ruangpulih.metrics import RequestMetrics, metrics_tween_factory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100000)
+    args = parser.parse_args()
+
+    config = testing.setUp()
+    config.registry['request_metrics'] = RequestMetrics(['bookings'])
+    route = testing.DummyResource(name='bookings')
+    response = Response(body=b'[]')
+
+    def handler(request):
+        return response
+
+    request = testing.DummyRequest()
+    request.matched_route = route
+    tween = metrics_tween_factory(handler, config.registry)
+
+    bare_us = timed(lambda: handler(request), args.requests) * 1000
+    tween_us = timed(lambda: tween(request), args.requests) * 1000
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(args.requests):
+        tween(request)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, 'filename')
+                   if 'tracemalloc' not in stat.traceback[0].filename)
+
+    print_table(('measure', 'value'), [
+        ('handler alone (us/request)', f'{bare_us:.2f}'),
+        ('with metrics tween (us/request)', f'{tween_us:.2f}'),
+        ('tween overhead (us/request)', f'{tween_us - bare_us:.2f}'),
+        (f'memory retained after {args.requests} requests (bytes)', retained),
+        ('peak traced memory while recording (bytes)', peak),
+    ])
+
+
+if __name__ == '__main__':
+    main()
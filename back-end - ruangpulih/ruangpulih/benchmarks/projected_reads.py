@@ -0,0 +1,113 @@
+"""
+ORM objects versus column-projected rows for the read-only list payloads,
+at ``--rows`` schedules (half of them booked) and ``--rows`` reviews.
+
+    python benchmarks/projected_reads.py [--rows N] [--psychologists N]
+"""
+import argparse
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from pyramid import testing
+from sqlalchemy import insert
+from sqlalchemy.orm import Query, joinedload, selectinload
+
+from common import make_request, print_table, setup_database, timed, tm_session
+from ruangpulih.models.booking import Booking
+from ruangpulih.models.review import Review
+from ruangpulih.models.schedule import Schedule
+from ruangpulih.models.user import User
+from ruangpulih.projections import REVIEW_COLUMNS, SCHEDULE_COLUMNS, review_row_to_dict, schedule_rows_to_dicts
+from ruangpulih.streaming import stream_json_array
+from ruangpulih.views.pyschologist import build_available_psychologists, psychologist_to_dict, schedule_to_dict_simple
+
+
+def orm_available(session, today):
+    """The ORM implementation /psychologists/available used before (without ratings)."""
+    schedules = session.query(Schedule).options(joinedload(Schedule.psychologist)).filter(
+        Schedule.is_booked == False, Schedule.date >= today
+    ).order_by(Schedule.psychologist_id, Schedule.date, Schedule.time_slot).all()
+    data = {}
+    for schedule in schedules:
+        if schedule.psychologist_id not in data:
+            data[schedule.psychologist_id] = psychologist_to_dict(schedule.psychologist, available_schedules=[])
+        data[schedule.psychologist_id]['available_schedules'].append(schedule_to_dict_simple(schedule))
+    return list(data.values())
+
+
+def seed(session, rows, psychologists):
+    users = [dict(id=str(uuid.uuid4()), username=f'psy_{i}', email=f'psy_{i}@example.com', role='psychologist', password='x')
+             for i in range(psychologists)]
+    client = dict(id=str(uuid.uuid4()), username='client', email='client@example.com', role='client', password='x')
+    session.execute(insert(User), users + [client])
+
+    start = date.today() + timedelta(days=1)
+    schedules, bookings = [], []
+    for n in range(rows):
+        schedule_id = str(uuid.uuid4())
+        booked = n % 2 == 1
+        schedules.append(dict(id=schedule_id, psychologist_id=users[n % psychologists]['id'],
+                              date=start + timedelta(days=n // (10 * psychologists)),
+                              time_slot=time(8 + n // psychologists % 10, 0), is_booked=booked))
+        if booked:
+            bookings.append(dict(id=str(uuid.uuid4()), client_id=client['id'], schedule_id=schedule_id,
+                                 status='confirmed', created_at=datetime(2026, 1, 1) + timedelta(seconds=n)))
+    session.execute(insert(Schedule), schedules)
+    session.execute(insert(Booking), bookings)
+    session.execute(insert(Review), [
+        dict(id=str(uuid.uuid4()), booking_id=bookings[n % len(bookings)]['id'],
+             psychologist_id=users[n % psychologists]['id'], rating=1 + n % 5, comment='ok',
+             created_at=datetime(2026, 1, 1) + timedelta(seconds=n))
+        for n in range(rows)
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--psychologists', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    config = testing.setUp(settings={})
+    engine, session_factory = setup_database()
+    config.registry['dbsession_factory'] = session_factory
+    with tm_session(session_factory) as session:
+        seed(session, args.rows, args.psychologists)
+
+    today = date.today()
+    schedule_order = (Schedule.date, Schedule.time_slot, Schedule.id)
+    review_order = (Review.created_at.desc(), Review.id.desc())
+
+    def stream(query, **kw):
+        with tm_session(session_factory) as session:
+            response = stream_json_array(make_request(session), query.with_session(session), **kw)
+        for _ in response.app_iter:
+            pass
+
+    def run_available(builder):
+        def run():
+            with tm_session(session_factory) as session:
+                builder(make_request(session), today)
+        return run
+
+    cases = [
+        ('/psychologists/available', 'orm', run_available(lambda request, today: orm_available(request.dbsession, today))),
+        ('/psychologists/available', 'projected', run_available(build_available_psychologists)),
+        ('/schedules?stream=true', 'orm', lambda: stream(
+            Query(Schedule).options(selectinload(Schedule.bookings).joinedload(Booking.client))
+            .order_by(*schedule_order), serialize=Schedule.to_dict)),
+        ('/schedules?stream=true', 'projected', lambda: stream(
+            Query(SCHEDULE_COLUMNS).order_by(*schedule_order),
+            serialize_chunk=schedule_rows_to_dicts)),
+        ('/reviews?stream=true', 'orm', lambda: stream(
+            Query(Review).order_by(*review_order), serialize=Review.to_dict)),
+        ('/reviews?stream=true', 'projected', lambda: stream(
+            Query(REVIEW_COLUMNS).order_by(*review_order), serialize=review_row_to_dict)),
+    ]
+    rows = [(endpoint, path, f'{timed(fn, args.repeat):.0f}') for endpoint, path, fn in cases]
+    print_table(('endpoint', 'path', 'ms/request'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+The list endpoints with their default payloads next to a thin one asked
+for with ?fields= and ?include=, at ``--rows`` booked schedules. The
+timings stop at the view's return value; the JSON size is what rendering
+it would produce.
+
+    python benchmarks/sparse_fields.py [--rows N] [--repeat N]
+"""
+import argparse
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from pyramid import testing
+from sqlalchemy import insert
+
+from common import StatementCounter, make_request, print_table, seed_schedules, seed_users, setup_database, timed, tm_session
+from ruangpulih.models.booking import Booking
+from ruangpulih.views.bookings import list_bookings
+from ruangpulih.views.schedules import list_schedules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    testing.setUp(settings={})
+    engine, session_factory = setup_database()
+    with tm_session(session_factory) as session:
+        [psychologist_id] = seed_users(session, 'psychologist', 1)
+        [client_id] = seed_users(session, 'client', 1)
+        schedule_ids = seed_schedules(session, [psychologist_id], args.rows, is_booked=True)
+        session.flush()
+        session.execute(insert(Booking), [
+            dict(id=str(uuid.uuid4()), client_id=client_id, schedule_id=schedule_id, status='confirmed',
+                 created_at=datetime(2026, 1, 1) + timedelta(seconds=n))
+            for n, schedule_id in enumerate(schedule_ids)
+        ])
+
+    limit = str(args.rows)
+    cases = [
+        ('GET /bookings', list_bookings, {}),
+        ('GET /bookings?fields=id,status&include=', list_bookings, {'fields': 'id,status', 'include': ''}),
+        ('GET /schedules', list_schedules, {'limit': limit}),
+        ('GET /schedules?include=', list_schedules, {'limit': limit, 'include': ''}),
+    ]
+    table = []
+    with tm_session(session_factory) as session:
+        def load(view, params):
+            session.expunge_all()
+            return view(make_request(session, userid=client_id, params=params))
+
+        for name, view, params in cases:
+            with StatementCounter(engine) as counter:
+                data = load(view, params)
+            size = len(json.dumps(data, default=str))
+            table.append((name, f'{timed(lambda: load(view, params), args.repeat):.2f}', counter.count, size))
+    engine.dispose()
+
+    print_table(('endpoint', 'ms', 'statements', 'JSON bytes'), table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Peak Python memory, time to first byte and total time for GET /bookings
+built as one list versus streamed with ?stream=true.
+
+    python benchmarks/stream_lists.py [--bookings N ...]
+"""
+import argparse
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+from pyramid import testing
+from pyramid.renderers import render
+
+from common import make_request, print_table, seed_schedules, seed_users, setup_database, tm_session
+from ruangpulih.models.booking import Booking
+from ruangpulih.views.bookings import list_bookings
+
+
+def measure(fn):
+    """Returns (peak KiB, ms to first chunk, total ms, bytes) for a body-producing fn."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in fn():
+        if first is None:
+            first = time.perf_counter()
+        size += len(chunk)
+    total = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024, (first - start) * 1000, (total - start) * 1000, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    config = testing.setUp(settings={})
+    config.include('ruangpulih.renderers')
+    registry = config.registry
+
+    rows = []
+    for count in args.bookings:
+        engine, session_factory = setup_database()
+        registry['dbsession_factory'] = session_factory
+        with tm_session(session_factory) as session:
+            [psychologist_id] = seed_users(session, 'psychologist', 1)
+            [client_id] = seed_users(session, 'client', 1)
+            schedule_ids = seed_schedules(session, [psychologist_id], count, is_booked=True)
+            session.flush()
+            created = datetime(2026, 1, 1)
+            session.add_all([
+                Booking(id=str(uuid.uuid4()), client_id=client_id, schedule_id=schedule_id,
+                        status='confirmed', created_at=created + timedelta(minutes=i))
+                for i, schedule_id in enumerate(schedule_ids)
+            ])
+
+        def as_list():
+            with tm_session(session_factory) as session:
+                request = make_request(session, client_id)
+                body = render('json', list_bookings(request), request)
+            yield body
+
+        def streamed():
+            with tm_session(session_factory) as session:
+                request = make_request(session, client_id, params={'stream': 'true'})
+                response = list_bookings(request)
+            yield from response.app_iter
+
+        for name, fn in [('list', as_list), ('stream', streamed)]:
+            peak, ttfb, total, size = measure(fn)
+            rows.append((count, name, f'{size / 1024:.0f}', f'{peak:.0f}', f'{ttfb:.1f}', f'{total:.1f}'))
+        engine.dispose()
+
+    print_table(('bookings', 'mode', 'body KiB', 'peak KiB', 'first byte ms', 'total ms'), rows)
+
+
+if __name__ == '__main__':
+    main()
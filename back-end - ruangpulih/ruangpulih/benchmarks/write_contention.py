@@ -0,0 +1,90 @@
+"""
+Writers racing to edit the same schedule on a SQLite file: every writer
+loads the schedule before any of them flushes. Stale writers answered with
+412 at once, next to replaying their whole request the way pyramid_retry
+treats a stale flush.
+
+    python benchmarks/write_contention.py [--writers N] [--rounds N] [--attempts N]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import transaction
+from pyramid import testing
+from pyramid.httpexceptions import HTTPPreconditionFailed
+from sqlalchemy import event
+
+from common import StatementCounter, make_request, print_table, seed_schedules, seed_users, setup_database, tm_session
+from ruangpulih.models import get_tm_session
+from ruangpulih.views.schedules import update_schedule
+
+
+def run(round_number, strategy, writers, attempts, session_factory, psychologist_id, schedule_id):
+    """One round; returns (writes applied, attempts that found the schedule changed)."""
+    barrier = threading.Barrier(writers)
+    applied = []
+    stale = []
+
+    def writer(n):
+        for attempt in range(attempts if strategy == 'replay' else 1):
+            tm = transaction.TransactionManager(explicit=True)
+            try:
+                with tm:
+                    session = get_tm_session(session_factory, tm)
+                    if attempt == 0:
+                        event.listen(session, 'before_flush', lambda *args: barrier.wait(), once=True)
+                    request = make_request(session, userid=psychologist_id, matchdict={'id': schedule_id},
+                                           json_body={'time_slot': f'{n % 24:02d}:{round_number % 60:02d}'})
+                    request.tm = tm
+                    update_schedule(request)
+                applied.append(n)
+                return
+            except HTTPPreconditionFailed:
+                stale.append(n)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(applied), len(stale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--attempts', type=int, default=3, help='retry.attempts for the replay strategy')
+    args = parser.parse_args()
+
+    testing.setUp(settings={})
+    table = []
+    for strategy in ('412', 'replay'):
+        with tempfile.TemporaryDirectory() as directory:
+            engine, session_factory = setup_database('sqlite:///' + os.path.join(directory, 'bench.sqlite'))
+            with tm_session(session_factory) as session:
+                [psychologist_id] = seed_users(session, 'psychologist', 1)
+                [schedule_id] = seed_schedules(session, [psychologist_id], 1)
+
+            totals = [0, 0]
+            started = time.perf_counter()
+            with StatementCounter(engine) as counter:
+                for round_number in range(1, args.rounds + 1):
+                    for i, value in enumerate(run(round_number, strategy, args.writers, args.attempts,
+                                                  session_factory, psychologist_id, schedule_id)):
+                        totals[i] += value
+            elapsed = time.perf_counter() - started
+            engine.dispose()
+
+        applied, stale = totals
+        table.append((strategy, applied, stale, counter.count, f'{elapsed * 1000 / args.rounds:.1f}'))
+
+    print_table(('stale writers get', 'writes applied', 'stale attempts', 'statements', 'ms per round'), table)
+    print('Writes applied by a replay overwrite a change their client never saw.')
+
+
+if __name__ == '__main__':
+    main()
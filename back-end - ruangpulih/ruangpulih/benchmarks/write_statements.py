@@ -0,0 +1,73 @@
+"""
+Statements and wall time per write request for the booking and schedule
+write views, including the transaction commit.
+
+    python benchmarks/write_statements.py [--requests N] [--user-cache]
+"""
+import argparse
+import time
+
+from pyramid.threadlocal import get_current_registry
+
+from common import (
+    StatementCounter, make_request, print_table, seed_schedules, seed_users,
+    setup_database, tm_session,
+)
+from ruangpulih.views.bookings import create_booking, update_booking_status
+from ruangpulih.security import UserCache
+from ruangpulih.views.schedules import add_schedule
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--user-cache', action='store_true',
+                        help='serve request.user from the cross-request cache')
+    args = parser.parse_args()
+
+    if args.user_cache:
+        get_current_registry()['user_cache'] = UserCache()
+
+    engine, session_factory = setup_database()
+    with tm_session(session_factory) as session:
+        [psychologist_id] = seed_users(session, 'psychologist', 1)
+        client_ids = seed_users(session, 'client', args.requests)
+        schedule_ids = seed_schedules(session, [psychologist_id], args.requests)
+
+    booking_ids = []
+
+    def run_create_booking(i):
+        with tm_session(session_factory) as session:
+            request = make_request(session, client_ids[i], json_body={'schedule_id': schedule_ids[i]})
+            booking_ids.append(create_booking(request)['id'])
+
+    def run_confirm_booking(i):
+        with tm_session(session_factory) as session:
+            request = make_request(session, psychologist_id, json_body={'status': 'confirmed'},
+                                   matchdict={'id': booking_ids[i]})
+            update_booking_status(request)
+
+    def run_add_schedule(i):
+        with tm_session(session_factory) as session:
+            request = make_request(session, psychologist_id, json_body={
+                'date': f'2030-{1 + i // 28 % 12:02d}-{1 + i % 28:02d}', 'time_slot': '09:00'})
+            add_schedule(request)
+
+    rows = []
+    for name, fn in [
+        ('create_booking', run_create_booking),
+        ('update_booking_status', run_confirm_booking),
+        ('add_schedule', run_add_schedule),
+    ]:
+        with StatementCounter(engine) as counter:
+            start = time.perf_counter()
+            for i in range(args.requests):
+                fn(i)
+            elapsed = time.perf_counter() - start
+        rows.append((name, f'{counter.count / args.requests:.1f}', f'{elapsed * 1000 / args.requests:.3f}'))
+
+    print_table(('view', 'statements/request', 'ms/request'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,7 @@
 from pyramid.config import Configurator
 from pyramid.authentication import AuthTktAuthenticationPolicy
 from pyramid.authorization import ACLAuthorizationPolicy
-from .cors import cors_tween_factory
-from pyramid.renderers import JSON
+from .security import get_request_user
 
 
 def main(global_config, **settings):
@@ -20,11 +19,20 @@ def main(global_config, **settings):
         config.set_authentication_policy(authn_policy)  # Set authentication policy
         config.set_authorization_policy(authz_policy)  # Set authorization policy
         
-        config.add_tween('.cors_tween_factory')  # Add CORS tween
-        config.add_renderer('json', JSON(indent=4))
+        config.include('.cors')  # CORS tween, see cors.* settings
+        config.include('.renderers')  # JSON renderer, see json.* settings
 
         config.include('pyramid_jinja2')
         config.include('.models')
+        config.include('.hashing')
+        config.include('.security')
+        config.include('.caching')
+        config.include('.availability')
+        config.include('.events')
+        config.include('.sqlstats')
+        config.include('.metrics')
+        # The authenticated user (id, role, username), loaded once per request.
+        config.add_request_method(get_request_user, 'user', reify=True)
         config.include('.routes')
     
         config.scan()  # Memindai semua view-config
@@ -0,0 +1,31 @@
+"""Add row version columns to users, schedules and bookings
+
+Revision ID: 3a8c5e1f9b62
+Revises: 47c0b5e9a8d1
+Create Date: 2026-10-18 17:20:44.318906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a8c5e1f9b62'
+down_revision = '47c0b5e9a8d1'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('users', 'schedules', 'bookings')
+
+
+def upgrade():
+    # Existing rows start at version 1, like new ones.
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default=sa.text('1')))
+
+
+def downgrade():
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,32 @@
+"""Allow at most one active booking per schedule
+
+Revision ID: 47c0b5e9a8d1
+Revises: e2a94b7d3c60
+Create Date: 2026-10-18 15:02:36.471822
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '47c0b5e9a8d1'
+down_revision = 'e2a94b7d3c60'
+branch_labels = None
+depends_on = None
+
+ACTIVE_STATUSES = sa.text("status IN ('pending', 'confirmed')")
+
+
+def upgrade():
+    # Fails if a schedule already has several pending/confirmed bookings;
+    # those have to be resolved by hand before upgrading.
+    op.create_index(
+        op.f('uq_bookings_schedule_id_active'),
+        'bookings', ['schedule_id'], unique=True,
+        sqlite_where=ACTIVE_STATUSES,
+        postgresql_where=ACTIVE_STATUSES)
+
+
+def downgrade():
+    op.drop_index(op.f('uq_bookings_schedule_id_active'), table_name='bookings')
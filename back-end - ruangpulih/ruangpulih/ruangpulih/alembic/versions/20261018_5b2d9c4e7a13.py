@@ -0,0 +1,46 @@
+"""Add composite indexes for schedule, booking and review lookups
+
+Revision ID: 5b2d9c4e7a13
+Revises: 0f0bff5f685f
+Create Date: 2026-10-18 09:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2d9c4e7a13'
+down_revision = '0f0bff5f685f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Psychologist-scoped schedule listings (detail page, /schedules for psychologists).
+    op.create_index(
+        op.f('ix_schedules_psychologist_id_date_time_slot'),
+        'schedules', ['psychologist_id', 'date', 'time_slot'], unique=False)
+    # Future unbooked slots across all psychologists (/psychologists/available).
+    op.create_index(
+        op.f('ix_schedules_is_booked_date_time_slot'),
+        'schedules', ['is_booked', 'date', 'time_slot'], unique=False)
+    # Client booking history and booking lookups through their schedule.
+    op.create_index(
+        op.f('ix_bookings_client_id_created_at'),
+        'bookings', ['client_id', 'created_at'], unique=False)
+    op.create_index(
+        op.f('ix_bookings_schedule_id_status'),
+        'bookings', ['schedule_id', 'status'], unique=False)
+    # Review -> booking join used for psychologist ratings.
+    op.create_index(
+        op.f('ix_reviews_booking_id'),
+        'reviews', ['booking_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_reviews_booking_id'), table_name='reviews')
+    op.drop_index(op.f('ix_bookings_schedule_id_status'), table_name='bookings')
+    op.drop_index(op.f('ix_bookings_client_id_created_at'), table_name='bookings')
+    op.drop_index(op.f('ix_schedules_is_booked_date_time_slot'), table_name='schedules')
+    op.drop_index(op.f('ix_schedules_psychologist_id_date_time_slot'), table_name='schedules')
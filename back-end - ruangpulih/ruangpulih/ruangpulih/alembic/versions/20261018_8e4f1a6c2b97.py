@@ -0,0 +1,26 @@
+"""Add schedules (date, time_slot, id) index for keyset pagination
+
+Revision ID: 8e4f1a6c2b97
+Revises: 5b2d9c4e7a13
+Create Date: 2026-10-18 11:04:27.550193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4f1a6c2b97'
+down_revision = '5b2d9c4e7a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        op.f('ix_schedules_date_time_slot_id'),
+        'schedules', ['date', 'time_slot', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_schedules_date_time_slot_id'), table_name='schedules')
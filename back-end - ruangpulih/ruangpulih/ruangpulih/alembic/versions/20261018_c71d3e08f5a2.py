@@ -0,0 +1,55 @@
+"""Add reviews.psychologist_id and reviews.created_at for paginated review listings
+
+Revision ID: c71d3e08f5a2
+Revises: 8e4f1a6c2b97
+Create Date: 2026-10-18 12:31:09.802614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71d3e08f5a2'
+down_revision = '8e4f1a6c2b97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews') as batch_op:
+        batch_op.add_column(sa.Column('psychologist_id', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key(
+            op.f('fk_reviews_psychologist_id_users'), 'users', ['psychologist_id'], ['id'])
+
+    # Backfill from the reviewed booking; its creation time is the closest
+    # thing we have to when existing reviews were written.
+    op.execute(
+        "UPDATE reviews SET "
+        "psychologist_id = (SELECT schedules.psychologist_id FROM bookings "
+        "JOIN schedules ON schedules.id = bookings.schedule_id "
+        "WHERE bookings.id = reviews.booking_id), "
+        "created_at = (SELECT bookings.created_at FROM bookings "
+        "WHERE bookings.id = reviews.booking_id)"
+    )
+    op.execute("UPDATE reviews SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+
+    with op.batch_alter_table('reviews') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+    op.create_index(
+        op.f('ix_reviews_created_at_id'),
+        'reviews', ['created_at', 'id'], unique=False)
+    op.create_index(
+        op.f('ix_reviews_psychologist_id_created_at_id'),
+        'reviews', ['psychologist_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_reviews_psychologist_id_created_at_id'), table_name='reviews')
+    op.drop_index(op.f('ix_reviews_created_at_id'), table_name='reviews')
+    with op.batch_alter_table('reviews') as batch_op:
+        batch_op.drop_constraint(op.f('fk_reviews_psychologist_id_users'), type_='foreignkey')
+        batch_op.drop_column('created_at')
+        batch_op.drop_column('psychologist_id')
@@ -0,0 +1,46 @@
+"""Add psychologist_ratings aggregate table
+
+Revision ID: e2a94b7d3c60
+Revises: c71d3e08f5a2
+Create Date: 2026-10-18 13:47:52.114390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a94b7d3c60'
+down_revision = 'c71d3e08f5a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('psychologist_ratings',
+    sa.Column('psychologist_id', sa.String(), nullable=False),
+    sa.Column('review_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('rating_1_count', sa.Integer(), nullable=False),
+    sa.Column('rating_2_count', sa.Integer(), nullable=False),
+    sa.Column('rating_3_count', sa.Integer(), nullable=False),
+    sa.Column('rating_4_count', sa.Integer(), nullable=False),
+    sa.Column('rating_5_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['psychologist_id'], ['users.id'], name=op.f('fk_psychologist_ratings_psychologist_id_users')),
+    sa.PrimaryKeyConstraint('psychologist_id', name=op.f('pk_psychologist_ratings'))
+    )
+    op.execute(
+        "INSERT INTO psychologist_ratings (psychologist_id, review_count, rating_sum, "
+        "rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count) "
+        "SELECT psychologist_id, COUNT(id), SUM(rating), "
+        "SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN rating = 4 THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN rating = 5 THEN 1 ELSE 0 END) "
+        "FROM reviews WHERE psychologist_id IS NOT NULL GROUP BY psychologist_id"
+    )
+
+
+def downgrade():
+    op.drop_table('psychologist_ratings')
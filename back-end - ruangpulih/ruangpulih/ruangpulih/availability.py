@@ -0,0 +1,279 @@
+"""
+In-process index of free schedule slots, answering "who is free Tuesday
+morning, and from when?" without a query.
+
+Each psychologist's free slots are one bitset: a Python int with
+``SLOTS_PER_DAY`` bits per day, counted from the day the index was built,
+and a bit per quarter hour. A question about a date range and time window
+becomes one AND against a mask repeating the window for every day in the
+range, which CPython runs over the whole horizon in C; the first free
+slot is the lowest set bit of the result.
+
+The schedule views only accept times on a quarter hour; a slot written
+some other way, at 09:10 say, is reported as 09:00.
+"""
+import logging
+import sys
+import threading
+from datetime import datetime, time, timedelta
+from time import perf_counter
+
+from pyramid.settings import asbool
+from sqlalchemy import or_, select, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+
+from .models.schedule import Schedule
+
+log = logging.getLogger(__name__)
+
+AVAILABILITY_INDEX = 'availability_index'
+
+# Longest date range GET /psychologists/free answers; the window mask grows with it.
+DEFAULT_MAX_DAYS = 90
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+_DAY_BYTES = SLOTS_PER_DAY // 8
+
+
+def slot_of(time_slot):
+    return (time_slot.hour * 60 + time_slot.minute) // SLOT_MINUTES
+
+
+def time_of(slot):
+    return time(*divmod(slot * SLOT_MINUTES, 60))
+
+
+def window_mask(time_from=None, time_to=None):
+    """Bits of the slots starting in ``[time_from, time_to)`` within one day."""
+    first = slot_of(time_from) if time_from is not None else 0
+    last = slot_of(time_to) if time_to is not None else SLOTS_PER_DAY
+    return ((1 << last) - 1) & ~((1 << first) - 1)
+
+
+class AvailabilityIndex:
+    """Free slots per psychologist as bitsets; see the module docstring."""
+
+    def __init__(self, base_date):
+        self.base_date = base_date
+        self.built = False
+        self.build_seconds = None
+        self._bitmaps = {}
+        self._lock = threading.Lock()
+        # Held while a commit's days are read and applied; see sync_availability.
+        self.refresh_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, dbsession, today, date_to=None):
+        """The index of every free slot from ``today`` (to ``date_to``)."""
+        started = perf_counter()
+        index = cls(today)
+        query = select(Schedule.psychologist_id, Schedule.date, Schedule.time_slot).where(
+            Schedule.is_booked == False, Schedule.date >= today
+        )
+        if date_to is not None:
+            query = query.where(Schedule.date <= date_to)
+        index.load(dbsession.execute(query))
+        index.build_seconds = perf_counter() - started
+        return index
+
+    def load(self, rows):
+        """Adds ``(psychologist_id, date, time_slot)`` rows of free slots."""
+        # Bits are set in one bytearray per psychologist and converted to an
+        # int once; setting them on the int would copy it for every row.
+        buffers = {}
+        for psychologist_id, day, time_slot in rows:
+            offset = (day - self.base_date).days
+            if offset < 0:
+                continue
+            position = offset * SLOTS_PER_DAY + slot_of(time_slot)
+            buffer = buffers.get(psychologist_id)
+            if buffer is None:
+                buffer = buffers[psychologist_id] = bytearray()
+            if len(buffer) <= position // 8:
+                buffer.extend(bytes(max(position // 8 + 1 - len(buffer), 30 * _DAY_BYTES)))
+            buffer[position // 8] |= 1 << (position % 8)
+
+        with self._lock:
+            for psychologist_id, buffer in buffers.items():
+                bitmap = self._bitmaps.get(psychologist_id, 0) | int.from_bytes(buffer, 'little')
+                self._bitmaps[psychologist_id] = bitmap
+            self.built = True
+
+    def replace_days(self, day_masks):
+        """Sets the free slots of whole days from ``{(psychologist_id, date): mask}``."""
+        with self._lock:
+            for (psychologist_id, day), mask in day_masks.items():
+                offset = (day - self.base_date).days
+                if offset < 0:
+                    continue
+                shift = offset * SLOTS_PER_DAY
+                bitmap = self._bitmaps.get(psychologist_id, 0) & ~(DAY_MASK << shift) | (mask << shift)
+                if bitmap:
+                    self._bitmaps[psychologist_id] = bitmap
+                else:
+                    self._bitmaps.pop(psychologist_id, None)
+
+    def _range_mask(self, date_from, date_to, time_from, time_to):
+        first = max((date_from - self.base_date).days, 0)
+        days = (date_to - self.base_date).days + 1 - first
+        if days <= 0:
+            return 0
+        # window * (1 + 2**96 + 2**192 + ...) repeats the window on every day.
+        repeat = ((1 << (SLOTS_PER_DAY * days)) - 1) // DAY_MASK
+        return (window_mask(time_from, time_to) * repeat) << (first * SLOTS_PER_DAY)
+
+    def _first_slot(self, bits):
+        position = (bits & -bits).bit_length() - 1
+        offset, slot = divmod(position, SLOTS_PER_DAY)
+        return self.base_date + timedelta(days=offset), time_of(slot)
+
+    def first_free_in_window(self, date_from, date_to, time_from=None, time_to=None):
+        """
+        ``{psychologist_id: (date, time)}`` of the earliest free slot in the
+        window, for every psychologist with one.
+        """
+        mask = self._range_mask(date_from, date_to, time_from, time_to)
+        if not mask:
+            return {}
+        with self._lock:
+            bitmaps = list(self._bitmaps.items())
+        found = {}
+        for psychologist_id, bitmap in bitmaps:
+            hits = bitmap & mask
+            if hits:
+                found[psychologist_id] = self._first_slot(hits)
+        return found
+
+    def stats(self):
+        with self._lock:
+            bitmaps = list(self._bitmaps.values())
+        return {
+            'psychologists': len(bitmaps),
+            'free_slots': sum(bin(bitmap).count('1') for bitmap in bitmaps),
+            'bytes': sys.getsizeof(self._bitmaps) + sum(sys.getsizeof(bitmap) for bitmap in bitmaps),
+            'build_seconds': self.build_seconds,
+        }
+
+
+def _build_from_primary(registry):
+    # Never from a request's session, which may be a lagging replica: the
+    # index is only kept in sync by the writes that follow its build.
+    session = registry['dbsession_factory']()
+    try:
+        return AvailabilityIndex.build(session, datetime.utcnow().date())
+    finally:
+        session.close()
+
+
+def _build_index(registry):
+    try:
+        index = _build_from_primary(registry)
+    except SQLAlchemyError:
+        # Typically the schema is not created yet; built on first use instead.
+        log.warning('Availability index not built at startup', exc_info=True)
+        return
+    registry[AVAILABILITY_INDEX] = index
+    stats = index.stats()
+    log.info(
+        'Built availability index: %d psychologists, %d free slots, %d bytes in %.1f ms',
+        stats['psychologists'], stats['free_slots'], stats['bytes'], stats['build_seconds'] * 1000,
+    )
+
+
+_build_lock = threading.Lock()
+
+
+def get_availability_index(request):
+    """
+    The registry's index, built now from the primary database if startup
+    could not; None when disabled.
+    """
+    index = request.registry.get(AVAILABILITY_INDEX)
+    if index is None or index.built:
+        return index
+    with _build_lock:
+        index = request.registry[AVAILABILITY_INDEX]
+        if not index.built:
+            index = request.registry[AVAILABILITY_INDEX] = _build_from_primary(request.registry)
+    return index
+
+
+def read_day_masks(connection, days=(), schedule_ids=()):
+    """
+    ``{(psychologist_id, date): mask}`` of the free slots on the given days
+    and on the days of the given schedules, with one query on the
+    psychologist/date index.
+    """
+    key = tuple_(Schedule.psychologist_id, Schedule.date)
+    touched = []
+    if days:
+        touched.append(key.in_(days))
+    if schedule_ids:
+        touched.append(key.in_(
+            select(Schedule.psychologist_id, Schedule.date).where(Schedule.id.in_(schedule_ids))
+        ))
+
+    day_masks = {tuple(day): 0 for day in days}
+    rows = connection.execute(
+        select(Schedule.psychologist_id, Schedule.date, Schedule.time_slot, Schedule.is_booked).where(
+            or_(*touched)
+        )
+    )
+    for psychologist_id, day, time_slot, is_booked in rows:
+        mask = day_masks.get((psychologist_id, day), 0)
+        if not is_booked:
+            mask |= 1 << slot_of(time_slot)
+        day_masks[(psychologist_id, day)] = mask
+    return day_masks
+
+
+def _refresh_days(index, engine, days, schedule_ids):
+    # Reading and applying under one lock means the last refresh of a day
+    # reads it after every commit whose hook ran before, so hooks running
+    # out of commit order cannot put back an older state.
+    with index.refresh_lock:
+        try:
+            with engine.connect() as connection:
+                day_masks = read_day_masks(connection, days, schedule_ids)
+        except SQLAlchemyError:
+            log.warning('Availability index refresh failed; rebuilding it on next use', exc_info=True)
+            index.built = False
+            return
+        index.replace_days(day_masks)
+
+
+def sync_availability(request, days=(), schedule_ids=()):
+    """
+    Refreshes the index for the psychologist-days a write touched, given as
+    ``(psychologist_id, date)`` pairs and/or ids of schedules on those days.
+
+    Once the transaction commits, those days are read again from the
+    database the write went to and replace what the index holds. Reading
+    them after the commit, rather than in the transaction, keeps concurrent
+    writes to the same day from overwriting each other's changes.
+    """
+    index = request.registry.get(AVAILABILITY_INDEX)
+    if index is None or not index.built or not (days or schedule_ids):
+        return
+
+    days, schedule_ids = [tuple(day) for day in days], list(schedule_ids)
+    engine = request.dbsession.get_bind()
+    request.tm.get().addAfterCommitHook(
+        lambda success: success and _refresh_days(index, engine, days, schedule_ids)
+    )
+
+
+def includeme(config):
+    """
+    Build the availability index at startup when
+    ``availability_index.enabled`` is true.
+
+    Activate this setup using ``config.include('ruangpulih.availability')``.
+    """
+    if not asbool(config.get_settings().get('availability_index.enabled', False)):
+        config.registry[AVAILABILITY_INDEX] = None
+        return
+    config.registry[AVAILABILITY_INDEX] = AvailabilityIndex(datetime.utcnow().date())
+    config.action(None, _build_index, args=(config.registry,), order=1)
@@ -0,0 +1,111 @@
+import threading
+import time
+
+AVAILABLE_PSYCHOLOGISTS_CACHE = 'available_psychologists_cache'
+
+
+class GenerationalCache:
+    """
+    In-process cache for payloads that only change when the app writes.
+
+    Writers call ``invalidate()``, which bumps a generation number; a value
+    computed under an older generation is never stored, so a rebuild racing
+    with a write cannot repopulate the cache with stale data. Misses are
+    single-flight: concurrent requests for the same missing key wait for one
+    rebuild instead of all running the query. ``ttl`` (seconds) bounds
+    staleness for changes made outside the app.
+    """
+
+    def __init__(self, ttl=300, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            generation, expires_at, value = entry
+            if generation != self._generation or expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self.hits += 1
+            return entry
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def get_or_compute(self, key, compute):
+        """Returns ``(value, hit)``; ``compute()`` runs at most once per miss."""
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry[2], True
+
+        with self._key_lock(key):
+            # Another request may have rebuilt it while we waited.
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry[2], True
+
+            with self._lock:
+                generation = self._generation
+                self.misses += 1
+            value = compute()
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[key] = (generation, self.clock() + self.ttl, value)
+            return value, False
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+            }
+
+
+def invalidate_available_psychologists(request):
+    """
+    Marks the /psychologists/available payload stale after a schedule or
+    booking write.
+
+    The cache is invalidated right away and again once the transaction
+    commits, so a rebuild that ran between the two (and so could not see
+    the write yet) is discarded as well.
+    """
+    cache = request.registry.get(AVAILABLE_PSYCHOLOGISTS_CACHE)
+    if cache is None:
+        return
+    cache.invalidate()
+    request.tm.get().addAfterCommitHook(lambda success: cache.invalidate())
+
+
+def includeme(config):
+    """
+    Set up the response caches, configured by
+    ``cache.available_psychologists.ttl`` (seconds, 0 disables the cache).
+
+    Activate this setup using ``config.include('ruangpulih.caching')``.
+    """
+    settings = config.get_settings()
+    ttl = float(settings.get('cache.available_psychologists.ttl', 300))
+    config.registry[AVAILABLE_PSYCHOLOGISTS_CACHE] = GenerationalCache(ttl=ttl) if ttl > 0 else None
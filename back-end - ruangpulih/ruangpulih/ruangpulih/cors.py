@@ -1,30 +1,113 @@
-# In a file called tweens.py or in the main file
 from pyramid.response import Response
-from pyramid.httpexceptions import HTTPForbidden
+from pyramid.settings import asbool, aslist
+from pyramid.tweens import INGRESS
+
+DEFAULT_ALLOWED_ORIGINS = ('http://localhost:5173',)
+DEFAULT_ALLOW_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+DEFAULT_ALLOW_HEADERS = ('Content-Type', 'Authorization', 'If-Match', 'If-None-Match')
+DEFAULT_EXPOSE_HEADERS = (
+    'ETag', 'X-Next-Cursor', 'X-Cache', 'X-DB-Queries', 'X-DB-Time-Ms', 'X-DB-Repeated-Queries',
+)
+
+
+class CORSPolicy:
+    """
+    CORS settings resolved once at startup: the allowed origins as a set and
+    the response headers as ready-made tuples, so handling a request is a
+    set lookup and a list extend.
+
+    ``*`` grants every origin with a literal ``*``, which browsers only honour
+    for requests without cookies, so it cannot be combined with credentials.
+    Otherwise allowed origins are echoed back.
+    """
+
+    def __init__(self, allowed_origins=DEFAULT_ALLOWED_ORIGINS, allow_credentials=True,
+                 allow_methods=DEFAULT_ALLOW_METHODS, allow_headers=DEFAULT_ALLOW_HEADERS,
+                 expose_headers=DEFAULT_EXPOSE_HEADERS, max_age=3600):
+        self.allowed_origins = frozenset(allowed_origins)
+        self.allow_any_origin = '*' in self.allowed_origins
+        if self.allow_any_origin and allow_credentials:
+            # Echoing any origin with credentials would let every site read
+            # the signed-in user's data with their auth cookie.
+            raise ValueError("cors.allowed_origins = * cannot be combined with cors.allow_credentials = true")
+
+        common = []
+        if allow_credentials:
+            common.append(('Access-Control-Allow-Credentials', 'true'))
+        self.preflight_headers = tuple(common + [
+            ('Access-Control-Allow-Methods', ', '.join(allow_methods)),
+            ('Access-Control-Allow-Headers', ', '.join(allow_headers)),
+            ('Access-Control-Max-Age', str(max_age)),
+        ])
+        if expose_headers:
+            common.append(('Access-Control-Expose-Headers', ', '.join(expose_headers)))
+        self.response_headers = tuple(common)
+
+    def allow_origin(self, origin):
+        """The Access-Control-Allow-Origin value for ``origin``, or None."""
+        if origin is None:
+            return None
+        if self.allow_any_origin:
+            return '*'
+        return origin if origin in self.allowed_origins else None
+
+    def preflight(self, origin):
+        """The complete response to an OPTIONS request from ``origin``."""
+        # Vary: Origin since the answer depends on it.
+        headerlist = [('Vary', 'Origin'), ('Content-Length', '0')]
+        allow_origin = self.allow_origin(origin)
+        if allow_origin:
+            headerlist.append(('Access-Control-Allow-Origin', allow_origin))
+            headerlist.extend(self.preflight_headers)
+        return Response(status=204, headerlist=headerlist)
+
+    def add_headers(self, response, origin):
+        """Adds the CORS headers for ``origin`` to an actual response."""
+        headerlist = response.headerlist
+        headerlist.append(('Vary', 'Origin'))
+        allow_origin = self.allow_origin(origin)
+        if allow_origin:
+            headerlist.append(('Access-Control-Allow-Origin', allow_origin))
+            headerlist.extend(self.response_headers)
+
+
+def policy_from_settings(settings):
+    allowed_origins = aslist(settings.get('cors.allowed_origins', ' '.join(DEFAULT_ALLOWED_ORIGINS)))
+    return CORSPolicy(
+        allowed_origins=allowed_origins,
+        # Credentials are on by default, except with "*", which rules them out.
+        allow_credentials=asbool(settings.get('cors.allow_credentials', '*' not in allowed_origins)),
+        allow_methods=aslist(settings.get('cors.allow_methods', ' '.join(DEFAULT_ALLOW_METHODS))),
+        allow_headers=aslist(settings.get('cors.allow_headers', ' '.join(DEFAULT_ALLOW_HEADERS))),
+        expose_headers=aslist(settings.get('cors.expose_headers', ' '.join(DEFAULT_EXPOSE_HEADERS))),
+        max_age=int(settings.get('cors.max_age', 3600)),
+    )
+
 
 def cors_tween_factory(handler, registry):
+    """
+    Answers OPTIONS requests directly and adds CORS headers to every other
+    response. Registered right under INGRESS, so preflights never reach the
+    transaction manager, database session, authentication policy or router.
+    """
+    policy = policy_from_settings(registry.settings or {})
+
     def cors_tween(request):
-        # Allow specific origin (not *)
-        allowed_origin = 'http://localhost:5173'
-
-        if request.method == 'OPTIONS':
-            # Preflight response
-            response = request.response
-            response.headers['Access-Control-Allow-Origin'] = allowed_origin
-            response.headers['Access-Control-Allow-Credentials'] = 'true'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-            response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-            response.headers['Access-Control-Max-Age'] = '3600'
-            
-            return response
-
-        # Actual response
+        origin = request.environ.get('HTTP_ORIGIN')
+        if request.environ['REQUEST_METHOD'] == 'OPTIONS':
+            return policy.preflight(origin)
+
         response = handler(request)
-        response.headers['Access-Control-Allow-Origin'] = allowed_origin
-        response.headers['Access-Control-Allow-Credentials'] = 'true'
-        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        
+        policy.add_headers(response, origin)
         return response
 
-    return cors_tween
\ No newline at end of file
+    return cors_tween
+
+
+def includeme(config):
+    """
+    Add the CORS tween, configured by the ``cors.*`` settings.
+
+    Activate this setup using ``config.include('ruangpulih.cors')``.
+    """
+    config.add_tween('ruangpulih.cors.cors_tween_factory', under=INGRESS)
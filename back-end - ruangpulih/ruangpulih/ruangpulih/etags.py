@@ -0,0 +1,71 @@
+"""
+Strong ETags for detail endpoints, derived from the ``version`` columns of
+the rows a payload is built from, and the preconditions of writes to them.
+
+A view that supports conditional GETs answers ``If-None-Match`` with a
+version-only query first: if the ETag still matches it returns 304 without
+loading relationships or serializing anything. Otherwise, and for plain
+GETs, it builds the payload as usual and tags it with the ETag computed
+from the same versions, read off the loaded objects.
+
+Writes are checked twice. ``If-Match`` is compared with the ETag of what
+the view loaded, so a client cannot overwrite a change it has not seen.
+Schedules and bookings are also mapped with ``version_id_col``: their
+UPDATE and DELETE statements only match the version that was loaded, so a
+concurrent write that lands between the load and the flush makes the
+flush fail. Both answer 412 Precondition Failed at once; pyramid_retry
+would otherwise replay the whole request for the stale flush.
+"""
+import hashlib
+
+from pyramid.httpexceptions import HTTPNotModified, HTTPPreconditionFailed
+from sqlalchemy.orm.exc import StaleDataError
+from webob.etag import ETagMatcher
+
+
+def compute_etag(kind, *parts):
+    """
+    The ETag of a ``kind`` of payload built from rows at ``parts``: ids and
+    versions, as tuples, in an order that does not depend on the query.
+    """
+    return hashlib.blake2b(repr((kind,) + parts).encode(), digest_size=16).hexdigest()
+
+
+def wants_revalidation(request):
+    """True when the request carries ``If-None-Match``."""
+    return bool(request.headers.get('If-None-Match'))
+
+
+def conditional_response(request, etag):
+    """
+    Raises 304 Not Modified when ``If-None-Match`` matches ``etag``; otherwise
+    sets it as the response's ETag.
+    """
+    header = request.headers.get('If-None-Match')
+    if header and etag in ETagMatcher.parse(header, strong=False):
+        raise HTTPNotModified(headers={'ETag': f'"{etag}"'})
+    request.response.etag = etag
+
+
+def check_if_match(request, etag):
+    """
+    Raises 412 Precondition Failed when ``If-Match`` is given and does not
+    match ``etag``, the current ETag of the resource about to be written.
+    """
+    header = request.headers.get('If-Match')
+    if header and etag not in ETagMatcher.parse(header):
+        raise HTTPPreconditionFailed(
+            json_body={"error": "The resource has changed since it was read"},
+            headers={'ETag': f'"{etag}"'},
+        )
+
+
+def flush_versioned(request):
+    """
+    Flushes the pending writes of a view. A versioned row changed by someone
+    else since it was loaded answers 412 instead of a replayed request.
+    """
+    try:
+        request.dbsession.flush()
+    except StaleDataError:
+        raise HTTPPreconditionFailed(json_body={"error": "The resource was changed by another request"})
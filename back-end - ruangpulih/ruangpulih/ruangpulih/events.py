@@ -0,0 +1,246 @@
+"""
+Server-sent events for booking changes, so clients hold one idle
+connection instead of re-polling GET /bookings.
+
+Write views publish through ``publish_after_commit``; each user's open
+``GET /events`` streams receive the events addressed to them. Events are
+numbered, and the most recent are kept, so a client that reconnects with
+``Last-Event-ID`` (EventSource does this on its own) gets what it missed.
+
+The hub lives in the process: with several server processes, a client
+only sees events published by the process it is connected to.
+
+An open stream holds a server worker thread for up to
+``events.stream_seconds``, so each process keeps at most
+``events.max_streams`` of them open, well below its worker threads. Past
+that, ``GET /events`` answers at once with the events missed since
+``Last-Event-ID`` and asks the client, through ``retry``, to come back
+after ``events.poll_seconds``: an EventSource then polls on its own,
+without holding a worker between polls.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+from pyramid.httpexceptions import HTTPNotFound
+from pyramid.response import Response
+from pyramid.settings import asbool
+from pyramid.view import view_config
+
+from .renderers import compact_dumps_from_settings
+from .security import require_user
+
+EVENT_HUB = 'event_hub'
+
+# Events a stream may fall behind by before it is closed; the client
+# reconnects and catches up from the history.
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """One open stream: the events queued for it, in order."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class EventHub:
+    """
+    In-process publish/subscribe of events to users' open streams.
+
+    ``max_streams`` bounds the open streams, since the server dedicates a
+    worker thread to each; ``history`` is how many events are kept for
+    clients resuming with Last-Event-ID or polling.
+    """
+
+    def __init__(self, max_streams=8, history=1000):
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._history = deque(maxlen=history)
+        self._subscriptions = {}
+        self._stream_count = 0
+
+    def subscribe(self, user_id, last_event_id=None):
+        """
+        A Subscription for ``user_id``, with any kept events after
+        ``last_event_id`` already queued; None when ``max_streams`` are open.
+        """
+        with self._lock:
+            if self._stream_count >= self.max_streams:
+                return None
+            subscription = Subscription(user_id)
+            for frame in self._missed(user_id, last_event_id):
+                subscription.queue.put_nowait(frame)
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            self._stream_count += 1
+            return subscription
+
+    def poll(self, user_id, last_event_id=None):
+        """
+        ``(frames, last_id)``: the kept events for ``user_id`` after
+        ``last_event_id``, and the id of the newest event published so far.
+        """
+        with self._lock:
+            return self._missed(user_id, last_event_id), self._last_id
+
+    def _missed(self, user_id, last_event_id):
+        if last_event_id is None:
+            return []
+        missed = [
+            frame for event_id, user_ids, frame in self._history
+            if event_id > last_event_id and user_id in user_ids
+        ]
+        return missed[-SUBSCRIPTION_QUEUE_SIZE:]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+            self._stream_count -= 1
+
+    def publish(self, user_ids, name, data):
+        """Sends event ``name`` with ``data`` (JSON bytes) to every stream of ``user_ids``."""
+        user_ids = frozenset(user_ids)
+        with self._lock:
+            self._last_id += 1
+            # Formatted once and shared by every stream it goes to.
+            frame = b'id: %d\nevent: %s\ndata: %s\n\n' % (self._last_id, name.encode('ascii'), data)
+            self._history.append((self._last_id, user_ids, frame))
+            for user_id in user_ids:
+                for subscription in self._subscriptions.get(user_id, ()):
+                    try:
+                        subscription.queue.put_nowait(frame)
+                    except queue.Full:
+                        subscription.overflowed = True
+            return self._last_id
+
+    def stream_count(self):
+        with self._lock:
+            return self._stream_count
+
+
+class EventStream:
+    """
+    The body of an event stream: queued events as they arrive, a comment
+    every ``heartbeat`` seconds so proxies keep the connection open, and
+    the end of the stream after ``duration`` seconds to free the worker.
+
+    The server calls ``close`` when the stream ends or the client goes
+    away, even before the first event was sent; it frees the stream's slot.
+    """
+
+    def __init__(self, hub, subscription, duration, heartbeat, clock=time.monotonic):
+        self.hub = hub
+        self.subscription = subscription
+        self.duration = duration
+        self.heartbeat = heartbeat
+        self.clock = clock
+
+    def __iter__(self):
+        deadline = self.clock() + self.duration
+        yield b'retry: 1000\n\n'
+        while not self.subscription.overflowed:
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return
+            try:
+                frame = self.subscription.queue.get(timeout=min(self.heartbeat, remaining))
+            except queue.Empty:
+                yield b': keepalive\n\n'
+                continue
+            yield frame
+
+    def close(self):
+        self.hub.unsubscribe(self.subscription)
+
+
+def _parse_last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.params.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+@view_config(route_name='events', request_method='GET')
+def booking_events(request):
+    """
+    A text/event-stream of the caller's booking events (``booking.created``,
+    ``booking.updated``, ``booking.deleted``), whose data is the booking as
+    returned by the bookings endpoints.
+
+    When ``events.max_streams`` are already open, the stream ends right
+    away: it carries the missed events, then an ``id`` line that moves the
+    client's Last-Event-ID to the newest event, and a ``retry`` of
+    ``events.poll_seconds``.
+    """
+    hub = request.registry.get(EVENT_HUB)
+    if hub is None:
+        raise HTTPNotFound(json_body={"error": "Events are disabled"})
+    user_id = require_user(request).id
+    last_event_id = _parse_last_event_id(request)
+    settings = request.registry.settings
+
+    subscription = hub.subscribe(user_id, last_event_id)
+    if subscription is None:
+        frames, last_id = hub.poll(user_id, last_event_id)
+        retry_ms = int(float(settings.get('events.poll_seconds', 10)) * 1000)
+        response = Response(
+            body=b'retry: %d\n\n' % retry_ms + b''.join(frames) + b'id: %d\n\n' % last_id,
+            content_type='text/event-stream',
+            charset='utf-8',
+        )
+    else:
+        response = Response(
+            app_iter=EventStream(
+                hub, subscription,
+                float(settings.get('events.stream_seconds', 55)),
+                float(settings.get('events.heartbeat_seconds', 15)),
+            ),
+            content_type='text/event-stream',
+            charset='utf-8',
+        )
+    response.cache_control = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # unbuffered behind nginx
+    return response
+
+
+def publish_after_commit(request, user_ids, name, data):
+    """
+    Publishes event ``name`` to ``user_ids`` if and when the current
+    transaction commits. ``data`` is serialized right away, while the ORM
+    objects it came from are still loaded.
+    """
+    hub = request.registry.get(EVENT_HUB)
+    if hub is None:
+        return
+    payload = compact_dumps_from_settings(request.registry.settings)(data)
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    request.tm.get().addAfterCommitHook(lambda success: success and hub.publish(user_ids, name, payload))
+
+
+def includeme(config):
+    """
+    Add the ``/events`` stream when ``events.enabled`` is true, configured
+    by ``events.max_streams``, ``events.stream_seconds``,
+    ``events.heartbeat_seconds``, ``events.poll_seconds`` and
+    ``events.history``.
+
+    Activate this setup using ``config.include('ruangpulih.events')``.
+    """
+    settings = config.get_settings()
+    if not asbool(settings.get('events.enabled', False)):
+        config.registry[EVENT_HUB] = None
+        return
+    config.registry[EVENT_HUB] = EventHub(
+        max_streams=int(settings.get('events.max_streams', 8)),
+        history=int(settings.get('events.history', 1000)),
+    )
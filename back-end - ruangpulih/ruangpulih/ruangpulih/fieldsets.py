@@ -0,0 +1,78 @@
+"""
+``?fields=`` and ``?include=``: which attributes of a resource are
+serialized, and which related resources are embedded, and so loaded at all.
+
+    GET /bookings?fields=id,status&include=
+    GET /schedules/<id>?include=current_booking,psychologist
+
+``fields`` lists top-level attributes; ``id`` is always returned. Without
+it every attribute is. ``include`` lists relationships, dotted for nested
+ones (``schedule.psychologist``), and implies their parents. Without it an
+endpoint embeds what it always has; an empty ``include=`` embeds nothing,
+which lets views skip the joins or queries behind those relationships.
+"""
+from pyramid.httpexceptions import HTTPBadRequest
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class Fieldset:
+    """The attributes and relationships one request asked for."""
+
+    def __init__(self, fields, include, relation_keys):
+        self.fields = fields
+        self.include = include
+        self._keep = None if fields is None else fields | {'id'} | relation_keys
+
+    @property
+    def key(self):
+        """Identifies the representation, for ETags."""
+        return (None if self.fields is None else tuple(sorted(self.fields)), tuple(sorted(self.include)))
+
+    def pick(self, data):
+        """``data`` without the attributes that were not asked for."""
+        if self._keep is None:
+            return data
+        return {name: value for name, value in data.items() if name in self._keep}
+
+
+class FieldsetSpec:
+    """
+    The ``attributes`` and ``relations`` a resource can be asked for.
+    ``relations`` maps each include path to the payload key it adds at the
+    top level, or None for nested ones.
+    """
+
+    def __init__(self, attributes, relations, default_include):
+        self.attributes = frozenset(attributes)
+        self.relations = dict(relations)
+        self.relation_keys = frozenset(key for key in self.relations.values() if key)
+        self.default = Fieldset(None, frozenset(default_include), self.relation_keys)
+
+    def parse(self, request):
+        """The fieldset of ``request``; unknown names are a 400."""
+        fields = request.params.get('fields')
+        include = request.params.get('include')
+        if fields is None and include is None:
+            return self.default
+
+        if fields is not None:
+            fields = frozenset(_split(fields))
+            unknown = sorted(fields - self.attributes)
+            if unknown:
+                raise HTTPBadRequest(json_body={"error": f"Unknown field: {', '.join(unknown)}"})
+
+        if include is None:
+            include = self.default.include
+        else:
+            paths = set()
+            for path in _split(include):
+                if path not in self.relations:
+                    raise HTTPBadRequest(json_body={"error": f"Unknown include: {path}"})
+                parts = path.split('.')
+                paths.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+            include = frozenset(paths)
+
+        return Fieldset(fields, include, self.relation_keys)
@@ -0,0 +1,137 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.hash import bcrypt
+from pyramid.httpexceptions import HTTPServiceUnavailable
+
+DEFAULT_ROUNDS = 12
+DEFAULT_TIMEOUT = 10.0
+
+
+def _hash(password, rounds):
+    return bcrypt.using(rounds=rounds).hash(password)
+
+
+def _verify(password, password_hash):
+    return bcrypt.verify(password, password_hash)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing/verification off the request thread.
+
+    With ``workers`` > 0 the work goes to a process pool so CPU-bound hashing
+    does not hold waitress threads (or the GIL) for the duration; with
+    ``workers`` = 0 it runs inline. In both modes at most ``max_pending``
+    operations may be queued or running at once. Beyond that, or when a
+    result takes longer than ``timeout`` seconds, callers get a 503 instead
+    of piling up behind the pool. A pool whose worker died is replaced on
+    the next call; the calls it fails also get a 503.
+    """
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=0, max_pending=None, timeout=DEFAULT_TIMEOUT):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending or max(workers, 1) * 4
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # spawn: forking a process that is already running server
+                    # threads can copy held locks into the children.
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                    )
+        return self._executor
+
+    def _discard_executor(self, executor):
+        """Drops a broken ``executor`` so the next call starts a new pool."""
+        with self._executor_lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _broken(self, executor):
+        self._discard_executor(executor)
+        return HTTPServiceUnavailable(
+            json_body={"error": "Authentication is restarting, please retry shortly"},
+            headers={'Retry-After': '1'},
+        )
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPServiceUnavailable(
+                json_body={"error": "Too many authentication requests, please retry shortly"},
+                headers={'Retry-After': '1'},
+            )
+        if not self.workers:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException as exc:
+            self._slots.release()
+            if isinstance(exc, BrokenProcessPool):
+                raise self._broken(executor)
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HTTPServiceUnavailable(
+                json_body={"error": "Authentication is taking too long, please retry shortly"},
+                headers={'Retry-After': '1'},
+            )
+        except BrokenProcessPool:
+            raise self._broken(executor)
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, password_hash):
+        return self._run(_verify, password, password_hash)
+
+    def needs_update(self, password_hash):
+        """True if ``password_hash`` was made with a different cost setting."""
+        return bcrypt.using(rounds=self.rounds).needs_update(password_hash)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def hasher_from_settings(settings):
+    timeout = settings.get('bcrypt.timeout')
+    max_pending = settings.get('bcrypt.max_pending')
+    return PasswordHasher(
+        rounds=int(settings.get('bcrypt.rounds', DEFAULT_ROUNDS)),
+        workers=int(settings.get('bcrypt.workers', 0)),
+        max_pending=int(max_pending) if max_pending else None,
+        timeout=float(timeout) if timeout else DEFAULT_TIMEOUT,
+    )
+
+
+def get_password_hasher(request):
+    return request.registry['password_hasher']
+
+
+def includeme(config):
+    """
+    Register the password hasher configured by the ``bcrypt.*`` settings.
+
+    Activate this setup using ``config.include('ruangpulih.hashing')``.
+    """
+    config.registry['password_hasher'] = hasher_from_settings(config.get_settings())
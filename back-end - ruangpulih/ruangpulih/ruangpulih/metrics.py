@@ -0,0 +1,198 @@
+import threading
+import time
+from bisect import bisect_left
+
+from pyramid.httpexceptions import HTTPForbidden
+from pyramid.interfaces import IRoutesMapper
+from pyramid.response import Response
+from pyramid.settings import asbool, aslist
+
+from .caching import AVAILABLE_PSYCHOLOGISTS_CACHE
+from .renderers import RENDER_SECONDS_KEY
+from .sqlstats import collect
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implied.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label for requests that matched no route (mostly 404s; CORS preflights are
+# answered above this tween and not counted).
+UNMATCHED_ROUTE = 'unmatched'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Client addresses allowed to read the metrics unless metrics.allowed_ips says otherwise.
+DEFAULT_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+
+class RouteMetrics:
+    """Counters for one route. Updated under ``RequestMetrics.lock``."""
+
+    __slots__ = ('buckets', 'count', 'latency_sum', 'db_seconds', 'render_seconds', 'response_bytes', 'statuses')
+
+    def __init__(self, bucket_count):
+        self.buckets = [0] * (bucket_count + 1)  # the last one is +Inf
+        self.count = 0
+        self.latency_sum = 0.0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.response_bytes = 0
+        self.statuses = {}
+
+
+class RequestMetrics:
+    """
+    Per-route request metrics, exported in the Prometheus text format.
+
+    Everything a request updates is allocated up front (one RouteMetrics
+    per route, fixed histogram buckets), so recording a request is a bisect
+    and a handful of additions under a lock.
+    """
+
+    def __init__(self, route_names=(), buckets=LATENCY_BUCKETS):
+        self.bucket_bounds = tuple(buckets)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.routes = {}
+        for name in (UNMATCHED_ROUTE,) + tuple(route_names):
+            self.routes[name] = RouteMetrics(len(self.bucket_bounds))
+
+    def started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def finished(self, route_name, status, latency, db_seconds, render_seconds, response_bytes):
+        bucket = bisect_left(self.bucket_bounds, latency)
+        with self.lock:
+            self.in_flight -= 1
+            route = self.routes.get(route_name)
+            if route is None:
+                route = self.routes[route_name] = RouteMetrics(len(self.bucket_bounds))
+            route.buckets[bucket] += 1
+            route.count += 1
+            route.latency_sum += latency
+            route.db_seconds += db_seconds
+            route.render_seconds += render_seconds
+            route.response_bytes += response_bytes
+            route.statuses[status] = route.statuses.get(status, 0) + 1
+
+    def render(self, extra_counters=()):
+        """The metrics as Prometheus text exposition format."""
+        lines = [
+            '# HELP ruangpulih_request_duration_seconds Time from the tween to the response, by route.',
+            '# TYPE ruangpulih_request_duration_seconds histogram',
+        ]
+        with self.lock:
+            routes = list(self.routes.items())
+            for name, route in routes:
+                cumulative = 0
+                for bound, count in zip(self.bucket_bounds + ('+Inf',), route.buckets):
+                    cumulative += count
+                    lines.append(f'ruangpulih_request_duration_seconds_bucket{{route="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'ruangpulih_request_duration_seconds_sum{{route="{name}"}} {route.latency_sum}')
+                lines.append(f'ruangpulih_request_duration_seconds_count{{route="{name}"}} {route.count}')
+
+            lines += [
+                '# HELP ruangpulih_responses_total Responses by route and status code.',
+                '# TYPE ruangpulih_responses_total counter',
+            ]
+            for name, route in routes:
+                for status, count in sorted(route.statuses.items()):
+                    lines.append(f'ruangpulih_responses_total{{route="{name}",status="{status}"}} {count}')
+
+            for attribute, metric, help_text in [
+                ('db_seconds', 'ruangpulih_db_seconds_total', 'Time spent executing SQL statements, by route.'),
+                ('render_seconds', 'ruangpulih_render_seconds_total', 'Time spent rendering JSON responses, by route.'),
+                ('response_bytes', 'ruangpulih_response_bytes_total', 'Response body bytes (when the length is known), by route.'),
+            ]:
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+                lines += [f'{metric}{{route="{name}"}} {getattr(route, attribute)}' for name, route in routes]
+
+            lines += [
+                '# HELP ruangpulih_requests_in_flight Requests currently being handled.',
+                '# TYPE ruangpulih_requests_in_flight gauge',
+                f'ruangpulih_requests_in_flight {self.in_flight}',
+            ]
+
+        for metric, help_text, value in extra_counters:
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter', f'{metric} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def metrics_tween_factory(handler, registry):
+    """
+    Records latency, status, database time, JSON render time and response
+    size of every request against its route name.
+
+    Work done while a streamed body is sent (see streaming.py) happens after
+    the response leaves this tween and is not included.
+    """
+    metrics = registry['request_metrics']
+
+    def metrics_tween(request):
+        metrics.started()
+        start = time.perf_counter()
+        status = 500
+        response_bytes = 0
+        try:
+            with collect(track_statements=False) as stats:
+                response = handler(request)
+            status = response.status_code
+            response_bytes = response.content_length or 0
+            return response
+        finally:
+            route = getattr(request, 'matched_route', None)
+            metrics.finished(
+                route.name if route is not None else UNMATCHED_ROUTE,
+                status,
+                time.perf_counter() - start,
+                stats.duration,
+                request.environ.get(RENDER_SECONDS_KEY, 0.0),
+                response_bytes,
+            )
+
+    return metrics_tween
+
+
+def metrics_view(request):
+    if request.client_addr not in request.registry['metrics_allowed_ips']:
+        raise HTTPForbidden(json_body={"error": "Metrics are not available from this address"})
+    extra_counters = []
+    cache = request.registry.get(AVAILABLE_PSYCHOLOGISTS_CACHE)
+    if cache is not None:
+        stats = cache.stats()
+        extra_counters += [
+            ('ruangpulih_available_psychologists_cache_hits_total',
+             'Requests served from the /psychologists/available cache.', stats['hits']),
+            ('ruangpulih_available_psychologists_cache_misses_total',
+             'Rebuilds of the /psychologists/available payload.', stats['misses']),
+        ]
+    body = request.registry['request_metrics'].render(extra_counters)
+    return Response(body=body.encode('utf-8'), content_type=CONTENT_TYPE, charset=None)
+
+
+def _create_metrics(registry):
+    # Runs once routes are registered, so each gets its counters up front.
+    mapper = registry.queryUtility(IRoutesMapper)
+    names = [route.name for route in mapper.get_routes()] if mapper is not None else []
+    registry['request_metrics'] = RequestMetrics(names)
+
+
+def includeme(config):
+    """
+    Add the metrics tween and a ``metrics.path`` (default ``/metrics``)
+    route serving them when ``metrics.enabled`` is true. Only clients at
+    ``metrics.allowed_ips`` (default: loopback) may read them.
+
+    Activate this setup using ``config.include('ruangpulih.metrics')``.
+    """
+    settings = config.get_settings()
+    if not asbool(settings.get('metrics.enabled', False)):
+        return
+    config.registry['metrics_allowed_ips'] = frozenset(
+        aslist(settings.get('metrics.allowed_ips', ' '.join(DEFAULT_ALLOWED_IPS)))
+    )
+    config.add_route('metrics', settings.get('metrics.path', '/metrics'))
+    config.add_view(metrics_view, route_name='metrics', request_method='GET')
+    # Above pyramid_tm so the commit is part of the measured latency.
+    config.add_tween('ruangpulih.metrics.metrics_tween_factory', over='pyramid_tm.tm_tween_factory')
+    config.action(None, _create_metrics, args=(config.registry,), order=1)
@@ -1,10 +1,16 @@
-from sqlalchemy import engine_from_config
+from functools import partial
+from itertools import cycle
+
+from pyramid.settings import asbool, aslist
+from sqlalchemy import engine_from_config, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import configure_mappers
 import zope.sqlalchemy
 
 # Import all models to ensure they are attached to the Base.metadata
 from .booking import Booking
+from .rating import PsychologistRating
 from .review import Review
 from .schedule import Schedule
 from .user import User
@@ -12,8 +18,103 @@ from .user import User
 # Run configure_mappers after defining all models to ensure relationships are set up
 configure_mappers()
 
+# Long-running web processes: a larger pool, connections checked before use
+# and recycled, and on SQLite write-ahead logging so readers are not blocked
+# by a writer. synchronous = NORMAL is durable across application crashes in
+# WAL mode; a power loss may drop the last commits.
+_WEB_PROFILE = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+    'query_cache_size': 1000,
+    'sqlite_pragmas': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,  # 256 MiB
+        'cache_size': -65536,  # negative means KiB, i.e. 64 MiB
+        'busy_timeout': 5000,  # ms
+    },
+}
+
+# Engine tuning selected with ``sqlalchemy.profile``. Any option below can
+# still be set on its own (``sqlalchemy.pool_size = 5``), and any SQLite
+# pragma as ``sqlalchemy.sqlite.<pragma>``; those win over the profile.
+ENGINE_PROFILES = {
+    # SQLAlchemy's and SQLite's own defaults.
+    'default': {},
+    'web': _WEB_PROFILE,
+    # As 'web', but every commit is synced to disk.
+    'durable': dict(_WEB_PROFILE, sqlite_pragmas=dict(_WEB_PROFILE['sqlite_pragmas'], synchronous='FULL')),
+}
+
+ENGINE_OPTION_TYPES = {
+    'pool_size': int,
+    'max_overflow': int,
+    'pool_recycle': int,
+    'pool_timeout': int,
+    'pool_pre_ping': asbool,
+    'query_cache_size': int,
+}
+
+# Options that only make sense for a pool of connections to a file; an
+# in-memory SQLite database lives in a single connection.
+_FILE_ONLY_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'pool_pre_ping')
+_FILE_ONLY_PRAGMAS = ('journal_mode', 'mmap_size')
+
+def _set_sqlite_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
 def get_engine(settings, prefix='sqlalchemy.'):
-    return engine_from_config(settings, prefix)
+    """
+    Creates the engine for ``<prefix>url``, tuned by the ``<prefix>profile``
+    named in ``ENGINE_PROFILES`` (default: 'default').
+    """
+    profile_name = settings.get(prefix + 'profile', 'default')
+    if profile_name not in ENGINE_PROFILES:
+        raise ValueError(
+            f"{prefix}profile must be one of {', '.join(ENGINE_PROFILES)}, not {profile_name!r}"
+        )
+    profile = ENGINE_PROFILES[profile_name]
+
+    url = make_url(settings[prefix + 'url'])
+    is_sqlite = url.get_backend_name() == 'sqlite'
+    in_memory = is_sqlite and url.database in (None, '', ':memory:')
+
+    options = {}
+    for name, coerce in ENGINE_OPTION_TYPES.items():
+        if prefix + name in settings:
+            options[name] = coerce(settings[prefix + name])
+        elif name in profile and not (in_memory and name in _FILE_ONLY_OPTIONS):
+            options[name] = profile[name]
+
+    pragmas = {}
+    if is_sqlite:
+        pragmas = {
+            name: value for name, value in profile.get('sqlite_pragmas', {}).items()
+            if not (in_memory and name in _FILE_ONLY_PRAGMAS)
+        }
+        for key, value in settings.items():
+            if key.startswith(prefix + 'sqlite.'):
+                pragmas[key[len(prefix + 'sqlite.'):]] = value
+
+    # Everything else under the prefix is passed to create_engine as before.
+    config = {
+        key: value for key, value in settings.items()
+        if key.startswith(prefix)
+        and key[len(prefix):] not in ENGINE_OPTION_TYPES
+        and key != prefix + 'profile'
+        and not key.startswith(prefix + 'sqlite.')
+    }
+    engine = engine_from_config(config, prefix, **options)
+    if pragmas:
+        event.listen(engine, 'connect', partial(_set_sqlite_pragmas, pragmas))
+    return engine
 
 def get_session_factory(engine):
     factory = sessionmaker()
@@ -45,10 +146,66 @@ def get_tm_session(session_factory, transaction_manager):
         dbsession, transaction_manager=transaction_manager)
     return dbsession
 
+# GET routes whose views only read and can be served slightly stale, and so
+# may go to a replica. Detail routes (bookings, schedules, psychologists)
+# are left out: clients read back what they just wrote through them. So is
+# GET /psychologists/available, whose cached answer would keep a replica's
+# lag for the whole TTL after the write that invalidated it.
+REPLICA_ROUTES = frozenset([
+    'schedules',
+    'bookings',
+    'reviews',
+    'psychologists_search',
+    'psychologists_free',
+])
+
+SAFE_METHODS = frozenset(['GET', 'HEAD'])
+
+# Routes that are POSTed to but only read (POST /batch runs GETs), so they
+# do not keep the client on the primary afterwards.
+READ_ONLY_ROUTES = frozenset(['batch'])
+
+# Set after a write; while present, the client's reads stay on the primary
+# so it sees its own writes whatever the replication lag.
+PRIMARY_COOKIE = 'ruangpulih_primary'
+
+def request_session_factory(request):
+    """
+    The session factory for this request: one of the replicas for a safe
+    request to a replica route, unless the client wrote recently; otherwise
+    the primary.
+    """
+    registry = request.registry
+    replicas = registry.get('replica_session_factories')
+    if replicas is not None and request.method in SAFE_METHODS and PRIMARY_COOKIE not in request.cookies:
+        route = getattr(request, 'matched_route', None)
+        if route is not None and route.name in registry['replica_routes']:
+            return next(replicas)
+    return registry['dbsession_factory']
+
+def _stick_to_primary(request, response):
+    response.set_cookie(
+        PRIMARY_COOKIE, '1', max_age=request.registry['replica_read_your_writes'], httponly=True
+    )
+
+def get_dbsession(request):
+    if request.registry.get('replica_session_factories') is not None and request.method not in SAFE_METHODS:
+        route = getattr(request, 'matched_route', None)
+        read_only = route is not None and route.name in READ_ONLY_ROUTES
+        if request.registry['replica_read_your_writes'] > 0 and not read_only:
+            request.add_response_callback(_stick_to_primary)
+    return get_tm_session(request_session_factory(request), request.tm)
+
 def includeme(config):
     """
     Initialize the model for a Pyramid app.
 
+    Read replicas are optional: ``replicas`` names them, and each is
+    configured like the primary under ``replica.<name>.`` (``url``,
+    ``profile``, ...). ``replica.routes`` overrides ``REPLICA_ROUTES`` and
+    ``replica.read_your_writes`` sets how long (seconds, default 5) a client
+    reads from the primary after a write.
+
     Activate this setup using ``config.include('ruangpulih.models')``.
     """
     settings = config.get_settings()
@@ -60,8 +217,12 @@ def includeme(config):
     session_factory = get_session_factory(get_engine(settings))
     config.registry['dbsession_factory'] = session_factory
 
-    config.add_request_method(
-        lambda r: get_tm_session(session_factory, r.tm),
-        'dbsession',
-        reify=True
-    )
+    replicas = [
+        get_session_factory(get_engine(settings, prefix=f'replica.{name}.'))
+        for name in aslist(settings.get('replicas', ''))
+    ]
+    config.registry['replica_session_factories'] = cycle(replicas) if replicas else None
+    config.registry['replica_routes'] = frozenset(aslist(settings.get('replica.routes', ' '.join(REPLICA_ROUTES))))
+    config.registry['replica_read_your_writes'] = int(settings.get('replica.read_your_writes', 5))
+
+    config.add_request_method(get_dbsession, 'dbsession', reify=True)
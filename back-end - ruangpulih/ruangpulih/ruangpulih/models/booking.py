@@ -1,33 +1,54 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Enum, ForeignKey, DateTime
+from sqlalchemy import Column, String, Enum, ForeignKey, DateTime, Index, text
 from sqlalchemy.orm import relationship
-from .meta import Base
+from .meta import Base, version_column
 
 class Booking(Base):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        Index('ix_bookings_client_id_created_at', 'client_id', 'created_at'),
+        Index('ix_bookings_schedule_id_status', 'schedule_id', 'status'),
+        # At most one pending/confirmed booking per schedule.
+        Index(
+            'uq_bookings_schedule_id_active', 'schedule_id', unique=True,
+            sqlite_where=text("status IN ('pending', 'confirmed')"),
+            postgresql_where=text("status IN ('pending', 'confirmed')"),
+        ),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     client_id = Column(String, ForeignKey('users.id'))
     schedule_id = Column(String, ForeignKey('schedules.id'))
     status = Column(Enum("pending", "confirmed", "rejected", name="booking_status"), default="pending")
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = version_column()
+
+    # ORM updates and deletes check the version they loaded; see ruangpulih.etags.
+    __mapper_args__ = {'version_id_col': version}
 
     client = relationship("User", back_populates="bookings")
     schedule = relationship("Schedule", back_populates="bookings")
 
-    def to_dict(self):
+    # Relationships to_dict() embeds unless told otherwise; see ruangpulih.fieldsets.
+    DEFAULT_INCLUDE = frozenset({'client'})
+
+    def to_dict(self, include=DEFAULT_INCLUDE):
         data = {
             "id": self.id,
             "client_id": self.client_id,
             "schedule_id": self.schedule_id,
             "status": self.status,
-            "created_at": self.created_at.isoformat() if self.created_at else None
+            "created_at": self.created_at
         }
-        
-        if self.client:
+
+        if 'client' in include and self.client:
             data['client_details'] = self.client.to_dict()
 
+        if 'schedule' in include and self.schedule:
+            nested = {'psychologist'} if 'schedule.psychologist' in include else ()
+            data['schedule'] = self.schedule.to_dict(include=nested)
+
         return data
 
     def __repr__(self):
@@ -1,3 +1,4 @@
+from sqlalchemy import Column, Integer, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.schema import MetaData
 
@@ -14,3 +15,13 @@ NAMING_CONVENTION = {
 
 metadata = MetaData(naming_convention=NAMING_CONVENTION)
 Base = declarative_base(metadata=metadata)
+
+
+def version_column():
+    """
+    A row version: 1 on insert and incremented by every UPDATE of the row,
+    ORM flushes and Core ``update()`` statements alike. Detail endpoints
+    derive their ETags from it; models that name it their
+    ``version_id_col`` also get optimistic locking.
+    """
+    return Column(Integer, nullable=False, default=1, server_default=text('1'), onupdate=text('version + 1'))
@@ -0,0 +1,93 @@
+from sqlalchemy import Column, String, Integer, ForeignKey, case, delete, event, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from .meta import Base
+from .review import Review
+
+RATING_VALUES = (1, 2, 3, 4, 5)
+
+# INSERT constructs with ON CONFLICT DO UPDATE, per dialect.
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+class PsychologistRating(Base):
+    """
+    Running rating totals per psychologist, kept in step with ``reviews`` so
+    list and detail views can show ratings without scanning every review.
+    """
+    __tablename__ = 'psychologist_ratings'
+
+    psychologist_id = Column(String, ForeignKey('users.id'), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_1_count = Column(Integer, nullable=False, default=0)
+    rating_2_count = Column(Integer, nullable=False, default=0)
+    rating_3_count = Column(Integer, nullable=False, default=0)
+    rating_4_count = Column(Integer, nullable=False, default=0)
+    rating_5_count = Column(Integer, nullable=False, default=0)
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 1)
+
+    @property
+    def histogram(self):
+        return {str(r): getattr(self, f'rating_{r}_count') for r in RATING_VALUES}
+
+    def __repr__(self):
+        return (
+            f"<PsychologistRating(psychologist_id='{self.psychologist_id}', "
+            f"review_count={self.review_count}, rating_sum={self.rating_sum})>"
+        )
+
+@event.listens_for(Review, 'after_insert')
+def add_review_to_rating(mapper, connection, review):
+    """
+    Folds a newly inserted review into its psychologist's totals. A single
+    upsert creates or updates the totals row, so concurrent first reviews of
+    a psychologist cannot both try to insert it.
+    """
+    if review.psychologist_id is None or review.rating is None:
+        return
+
+    table = PsychologistRating.__table__
+    histogram_column = f'rating_{review.rating}_count' if review.rating in RATING_VALUES else None
+
+    values = {
+        'review_count': table.c.review_count + 1,
+        'rating_sum': table.c.rating_sum + review.rating,
+    }
+    if histogram_column:
+        values[histogram_column] = table.c[histogram_column] + 1
+
+    row = {f'rating_{r}_count': 0 for r in RATING_VALUES}
+    row.update(psychologist_id=review.psychologist_id, review_count=1, rating_sum=review.rating)
+    if histogram_column:
+        row[histogram_column] = 1
+
+    upsert = UPSERT_INSERTS[connection.dialect.name](table).values(row)
+    connection.execute(upsert.on_conflict_do_update(index_elements=[table.c.psychologist_id], set_=values))
+
+def rebuild_psychologist_ratings(dbsession):
+    """
+    Recomputes every psychologist's totals from the ``reviews`` table.
+    Returns the number of psychologists with at least one review.
+    """
+    table = PsychologistRating.__table__
+    totals = select(
+        Review.psychologist_id,
+        func.count(Review.id),
+        func.sum(Review.rating),
+        *[func.sum(case((Review.rating == r, 1), else_=0)) for r in RATING_VALUES]
+    ).where(Review.psychologist_id.is_not(None)).group_by(Review.psychologist_id)
+
+    dbsession.execute(delete(table))
+    result = dbsession.execute(
+        insert(table).from_select(
+            ['psychologist_id', 'review_count', 'rating_sum']
+            + [f'rating_{r}_count' for r in RATING_VALUES],
+            totals
+        )
+    )
+    dbsession.expire_all()
+    return result.rowcount
@@ -1,15 +1,28 @@
 import uuid
-from sqlalchemy import Column, String, Text, ForeignKey, Integer
+from datetime import datetime
+from sqlalchemy import Column, String, Text, ForeignKey, Integer, DateTime, Index, event, select
 from sqlalchemy.orm import relationship
 from .meta import Base
+from .booking import Booking
+from .schedule import Schedule
 
 class Review(Base):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        Index('ix_reviews_booking_id', 'booking_id'),
+        # Newest-first listings, globally and per psychologist.
+        Index('ix_reviews_created_at_id', 'created_at', 'id'),
+        Index('ix_reviews_psychologist_id_created_at_id', 'psychologist_id', 'created_at', 'id'),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     booking_id = Column(String, ForeignKey('bookings.id'), nullable=False)
+    # Denormalized from booking -> schedule so reviews can be listed per
+    # psychologist without joining through bookings and schedules.
+    psychologist_id = Column(String, ForeignKey('users.id'))
     rating = Column(Integer, nullable=False)
     comment = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
     booking = relationship("Booking")
 
@@ -17,8 +30,10 @@ class Review(Base):
         return {
             "id": self.id,
             "booking_id": self.booking_id,
+            "psychologist_id": self.psychologist_id,
             "rating": self.rating,
-            "comment": self.comment
+            "comment": self.comment,
+            "created_at": self.created_at
         }
 
     def __repr__(self):
@@ -26,3 +41,13 @@ class Review(Base):
             f"<Review(id='{self.id}', booking_id='{self.booking_id}', "
             f"rating='{self.rating}')>"
         )
+
+@event.listens_for(Review, 'before_insert')
+def fill_psychologist_id(mapper, connection, review):
+    """Copies the psychologist of the reviewed booking onto the review."""
+    if review.psychologist_id is None and review.booking_id is not None:
+        review.psychologist_id = connection.scalar(
+            select(Schedule.psychologist_id)
+            .join(Booking, Booking.schedule_id == Schedule.id)
+            .where(Booking.id == review.booking_id)
+        )
@@ -1,27 +1,42 @@
 import uuid
-from sqlalchemy import Column, String, Date, Time, Boolean, ForeignKey
+from sqlalchemy import Column, String, Date, Time, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from .meta import Base
+from .meta import Base, version_column
 
 class Schedule(Base):
     __tablename__ = 'schedules'
+    __table_args__ = (
+        # Psychologist-scoped listings: filter on psychologist_id, range/order on date + time_slot.
+        Index('ix_schedules_psychologist_id_date_time_slot', 'psychologist_id', 'date', 'time_slot'),
+        # Availability lookups across psychologists: is_booked = false, then date range.
+        Index('ix_schedules_is_booked_date_time_slot', 'is_booked', 'date', 'time_slot'),
+        # Keyset pagination order for GET /schedules.
+        Index('ix_schedules_date_time_slot_id', 'date', 'time_slot', 'id'),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     psychologist_id = Column(String, ForeignKey('users.id'))
     date = Column(Date, nullable=False)
     time_slot = Column(Time, nullable=False)
     is_booked = Column(Boolean, default=False)
+    version = version_column()
+
+    # ORM updates and deletes check the version they loaded; see ruangpulih.etags.
+    __mapper_args__ = {'version_id_col': version}
 
     psychologist = relationship("User", back_populates="schedules")
     bookings = relationship("Booking", back_populates="schedule", uselist=True, cascade="all, delete-orphan")
 
-    def to_dict(self):
+    # Relationships to_dict() embeds unless told otherwise; see ruangpulih.fieldsets.
+    DEFAULT_INCLUDE = frozenset({'current_booking', 'current_booking.client'})
+
+    def to_dict(self, include=DEFAULT_INCLUDE):
         data = {
             "id": self.id,
             "psychologist_id": self.psychologist_id,
-            "date": self.date.isoformat(),
-            "time_slot": self.time_slot.strftime('%H:%M'),
+            "date": self.date,
+            "time_slot": self.time_slot,
             "is_booked": self.is_booked
         }
 
@@ -30,13 +45,17 @@ class Schedule(Base):
         # You might need to refine the filtering logic if there are multiple bookings
         # and you need a specific one (e.g., 'confirmed' status, or latest).
         current_booking = None
-        if self.is_booked and self.bookings:
+        if 'current_booking' in include and self.is_booked and self.bookings:
             current_booking = next((b for b in self.bookings if b.status == 'confirmed'), None)
             if not current_booking:
                 current_booking = self.bookings[0]
 
         if current_booking:
-            data['current_booking'] = current_booking.to_dict()
+            nested = {'client'} if 'current_booking.client' in include else ()
+            data['current_booking'] = current_booking.to_dict(include=nested)
+
+        if 'psychologist' in include and self.psychologist:
+            data['psychologist'] = self.psychologist.to_dict()
 
         return data
 
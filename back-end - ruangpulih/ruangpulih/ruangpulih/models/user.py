@@ -2,7 +2,7 @@ import uuid
 from sqlalchemy import Column, String, Enum
 from sqlalchemy.orm import relationship
 from passlib.hash import bcrypt
-from .meta import Base
+from .meta import Base, version_column
 
 class User(Base):
     __tablename__ = 'users'
@@ -16,6 +16,7 @@ class User(Base):
         Enum("client", "psychologist", name="role_enum"),
         nullable=False
     )
+    version = version_column()
 
     schedules = relationship("Schedule", back_populates="psychologist")
     bookings = relationship("Booking", back_populates="client")
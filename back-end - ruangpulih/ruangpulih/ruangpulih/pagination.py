@@ -0,0 +1,92 @@
+import base64
+import json
+from datetime import date, datetime, time
+
+from pyramid.httpexceptions import HTTPBadRequest
+from sqlalchemy import bindparam, tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Reads ``?limit=`` from the request, clamped to ``maximum``."""
+    raw = request.params.get('limit')
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise HTTPBadRequest(json_body={"error": "limit must be an integer"})
+    if limit < 1:
+        raise HTTPBadRequest(json_body={"error": "limit must be positive"})
+    return min(limit, maximum)
+
+
+def encode_cursor(values):
+    """Encodes the sort key of the last row on a page as an opaque token."""
+    payload = [v.isoformat() if isinstance(v, (date, time, datetime)) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """
+    Decodes a cursor produced by ``encode_cursor`` back into Python values
+    matching the types of ``columns``.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(columns):
+            raise ValueError(token)
+        values = []
+        for column, value in zip(columns, payload):
+            python_type = column.type.python_type
+            if python_type in (date, time, datetime):
+                value = python_type.fromisoformat(value)
+            values.append(value)
+        return values
+    except (ValueError, TypeError):
+        raise HTTPBadRequest(json_body={"error": "Invalid cursor"})
+
+
+def keyset_page(query, order_by, limit, cursor=None, descending=False):
+    """
+    Fetches one page of ``query`` ordered by the ``order_by`` columns, starting
+    after ``cursor``.
+
+    The last column must be unique (normally the primary key) so the sort key
+    identifies exactly one row. Returns ``(rows, next_cursor)``; ``next_cursor``
+    is None on the last page.
+    """
+    if cursor:
+        values = decode_cursor(cursor, order_by)
+        key = tuple_(*order_by)
+        bound = tuple_(*[bindparam(None, v, type_=c.type) for c, v in zip(order_by, values)])
+        query = query.filter(key < bound if descending else key > bound)
+
+    ordering = [c.desc() for c in order_by] if descending else list(order_by)
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], c.key) for c in order_by])
+    return rows, next_cursor
+
+
+def keyset_paginate(request, query, order_by, descending=False):
+    """
+    Applies ``keyset_page`` using the ``limit`` and ``cursor`` request
+    parameters. The cursor for the next page, if any, is set on the
+    ``X-Next-Cursor`` response header.
+    """
+    rows, next_cursor = keyset_page(
+        query, order_by, get_page_size(request),
+        cursor=request.params.get('cursor'), descending=descending
+    )
+    if next_cursor:
+        request.response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
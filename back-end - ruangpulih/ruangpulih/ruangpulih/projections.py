@@ -0,0 +1,128 @@
+"""
+Column-projected read paths for the list endpoints.
+
+These select only the columns a payload needs, as plain rows, and build the
+same dictionaries as the models' ``to_dict`` methods without constructing
+ORM objects, tracking them in the identity map or loading relationships.
+"""
+from sqlalchemy import select
+
+from .models.booking import Booking
+from .models.review import Review
+from .models.schedule import Schedule
+from .models.user import User
+
+SCHEDULE_COLUMNS = (
+    Schedule.id,
+    Schedule.psychologist_id,
+    Schedule.date,
+    Schedule.time_slot,
+    Schedule.is_booked,
+)
+
+REVIEW_COLUMNS = (
+    Review.id,
+    Review.booking_id,
+    Review.psychologist_id,
+    Review.rating,
+    Review.comment,
+    Review.created_at,
+)
+
+
+def review_row_to_dict(row):
+    """Same payload as ``Review.to_dict()`` for a row of ``REVIEW_COLUMNS``."""
+    return {
+        "id": row.id,
+        "booking_id": row.booking_id,
+        "psychologist_id": row.psychologist_id,
+        "rating": row.rating,
+        "comment": row.comment,
+        "created_at": row.created_at,
+    }
+
+
+def _current_bookings(dbsession, schedule_ids, with_client=True):
+    """
+    Maps schedule id -> the booking ``Schedule.to_dict()`` reports as
+    current (the confirmed one, else the earliest), with its client unless
+    ``with_client`` is false, in a single query.
+    """
+    columns = [Booking.id, Booking.client_id, Booking.schedule_id, Booking.status, Booking.created_at]
+    if with_client:
+        columns += [
+            User.id.label('client_user_id'),
+            User.username.label('client_username'),
+            User.email.label('client_email'),
+            User.role.label('client_role'),
+        ]
+    query = select(*columns).where(
+        Booking.schedule_id.in_(schedule_ids)
+    ).order_by(Booking.schedule_id, Booking.created_at, Booking.id)
+    if with_client:
+        query = query.outerjoin(User, User.id == Booking.client_id)
+
+    current = {}
+    for row in dbsession.execute(query):
+        chosen = current.get(row.schedule_id)
+        if chosen is None or (row.status == 'confirmed' and chosen.status != 'confirmed'):
+            current[row.schedule_id] = row
+    return current
+
+
+def _users(dbsession, user_ids):
+    """Maps user id -> ``User.to_dict()``, in a single query."""
+    rows = dbsession.execute(
+        select(User.id, User.username, User.email, User.role).where(User.id.in_(user_ids))
+    )
+    return {row.id: {"id": row.id, "username": row.username, "email": row.email, "role": row.role} for row in rows}
+
+
+def _booking_row_to_dict(row, with_client):
+    data = {
+        "id": row.id,
+        "client_id": row.client_id,
+        "schedule_id": row.schedule_id,
+        "status": row.status,
+        "created_at": row.created_at,
+    }
+    if with_client and row.client_user_id is not None:
+        data['client_details'] = {
+            "id": row.client_user_id,
+            "username": row.client_username,
+            "email": row.client_email,
+            "role": row.client_role,
+        }
+    return data
+
+
+def schedule_rows_to_dicts(dbsession, rows, include=Schedule.DEFAULT_INCLUDE):
+    """
+    Same payloads as ``Schedule.to_dict(include)`` for rows of
+    ``SCHEDULE_COLUMNS``. Current bookings of the booked schedules, and the
+    psychologists, are each loaded with one query for all of ``rows``, and
+    only when ``include`` asks for them.
+    """
+    with_client = 'current_booking.client' in include
+    booked_ids = [row.id for row in rows if row.is_booked] if 'current_booking' in include else []
+    current = _current_bookings(dbsession, booked_ids, with_client) if booked_ids else {}
+    psychologist_ids = {row.psychologist_id for row in rows if row.psychologist_id} if 'psychologist' in include else ()
+    psychologists = _users(dbsession, sorted(psychologist_ids)) if psychologist_ids else {}
+
+    payloads = []
+    for row in rows:
+        data = {
+            "id": row.id,
+            "psychologist_id": row.psychologist_id,
+            "date": row.date,
+            "time_slot": row.time_slot,
+            "is_booked": row.is_booked,
+        }
+        booking = current.get(row.id)
+        if booking is not None:
+            data['current_booking'] = _booking_row_to_dict(booking, with_client)
+        psychologist = psychologists.get(row.psychologist_id)
+        if psychologist is not None:
+            data['psychologist'] = psychologist
+        payloads.append(data)
+    return payloads
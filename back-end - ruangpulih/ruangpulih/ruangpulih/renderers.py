@@ -0,0 +1,110 @@
+import json
+from datetime import date, time
+from time import perf_counter
+
+from pyramid.renderers import JSON
+from pyramid.settings import asbool
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def with_datetime_default(default):
+    """
+    Wraps the renderer's ``default`` hook so dates and times serialize
+    without going through its adapter lookup, which list payloads would
+    otherwise hit once or more per row.
+    """
+    def encode(obj):
+        if isinstance(obj, date):  # and datetime, which subclasses date
+            return obj.isoformat()
+        if isinstance(obj, time):
+            # Schedule slots are minute-granular and the API has always sent HH:MM.
+            return obj.isoformat(timespec='minutes')
+        return default(obj)
+    return encode
+
+
+# request.environ key accumulating the time spent rendering JSON, which the
+# metrics tween reports as serialization time.
+RENDER_SECONDS_KEY = 'ruangpulih.render_seconds'
+
+
+class TimedJSON(JSON):
+    """``JSON`` renderer that also records how long rendering took."""
+
+    def __call__(self, info):
+        render = super().__call__(info)
+
+        def timed_render(value, system):
+            start = perf_counter()
+            try:
+                return render(value, system)
+            finally:
+                request = system.get('request')
+                if request is not None:
+                    environ = request.environ
+                    environ[RENDER_SECONDS_KEY] = environ.get(RENDER_SECONDS_KEY, 0.0) + perf_counter() - start
+
+        return timed_render
+
+
+def json_dumps(value, default=None, **kw):
+    return json.dumps(value, default=with_datetime_default(default), **kw)
+
+
+def orjson_dumps(value, default=None, **kw):
+    # Pass dates and times through so they get the same formats as with json_dumps.
+    return orjson.dumps(value, default=with_datetime_default(default), option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def use_orjson(settings):
+    """Resolves the ``json.encoder`` setting (``auto``, ``orjson`` or ``json``)."""
+    encoder = settings.get('json.encoder', 'auto')
+    if encoder not in ('auto', 'orjson', 'json'):
+        raise ValueError(f"json.encoder must be 'auto', 'orjson' or 'json', not {encoder!r}")
+    if encoder == 'orjson' and orjson is None:
+        raise ValueError("json.encoder = orjson but orjson is not installed")
+    return encoder != 'json' and orjson is not None
+
+
+def json_renderer_from_settings(settings):
+    """
+    Builds the ``json`` renderer.
+
+    ``json.pretty`` (default false) indents output for reading during
+    development. Otherwise output is compact and ``json.encoder`` picks the
+    serializer: ``orjson``, ``json`` (standard library) or ``auto`` (the
+    default; orjson when it is installed).
+    """
+    orjson_enabled = use_orjson(settings)
+    if asbool(settings.get('json.pretty', False)):
+        return TimedJSON(serializer=json_dumps, indent=4)
+    if orjson_enabled:
+        return TimedJSON(serializer=orjson_dumps)
+    return TimedJSON(serializer=json_dumps, separators=(',', ':'))
+
+
+def _not_serializable(obj):
+    raise TypeError(f'{obj!r} is not JSON serializable')
+
+
+def compact_dumps_from_settings(settings):
+    """
+    Returns a ``value -> bytes`` function producing the same compact JSON as
+    the renderer, for code that writes responses itself (see streaming.py).
+    """
+    if use_orjson(settings):
+        return lambda value: orjson_dumps(value, default=_not_serializable)
+    return lambda value: json_dumps(value, default=_not_serializable, separators=(',', ':')).encode('utf-8')
+
+
+def includeme(config):
+    """
+    Register the ``json`` renderer configured by the ``json.*`` settings.
+
+    Activate this setup using ``config.include('ruangpulih.renderers')``.
+    """
+    config.add_renderer('json', json_renderer_from_settings(config.get_settings()))
@@ -9,6 +9,7 @@ def includeme(config):
 
     # Schedules routes
     config.add_route('schedules', '/schedules')                     # GET (list), POST (create)
+    config.add_route('schedules_bulk', '/schedules/bulk')           # POST (create many); before schedule_detail
     config.add_route('schedule_detail', '/schedules/{id}')          # GET (detail), PUT (update), DELETE (delete)
 
     # Bookings routes
@@ -17,7 +18,15 @@ def includeme(config):
 
     # Psychologists routes
     config.add_route('psychologists_with_available_schedules', '/psychologists/available')
+    config.add_route('psychologists_search', '/psychologists/search')  # GET; before psychologist_detail
+    config.add_route('psychologists_free', '/psychologists/free')      # GET; before psychologist_detail
     config.add_route('psychologist_detail', '/psychologists/{id}')
 
+    # Booking change notifications (server-sent events)
+    config.add_route('events', '/events')
+
     # Reviews routes
     config.add_route('reviews', '/reviews')
+
+    # Several GETs in one round trip
+    config.add_route('batch', '/batch')
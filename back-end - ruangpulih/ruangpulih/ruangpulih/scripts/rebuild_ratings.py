@@ -0,0 +1,35 @@
+import argparse
+import sys
+import transaction
+
+from pyramid.paster import bootstrap, setup_logging
+
+from ..models.rating import rebuild_psychologist_ratings
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Recompute psychologist rating totals from the reviews table.'
+    )
+    parser.add_argument(
+        'config_uri',
+        help='Configuration file, e.g., development.ini',
+    )
+    return parser.parse_args(argv[1:])
+
+
+def main(argv=sys.argv):
+    args = parse_args(argv)
+    setup_logging(args.config_uri)
+    env = bootstrap(args.config_uri)
+
+    try:
+        with env['request'].tm:
+            dbsession = env['request'].dbsession
+            count = rebuild_psychologist_ratings(dbsession)
+            transaction.commit()
+            print(f"Rebuilt rating totals for {count} psychologist(s).")
+    except Exception as e:
+        print(f"An error occurred while rebuilding ratings: {e}")
+        transaction.abort()
+        sys.exit(1)
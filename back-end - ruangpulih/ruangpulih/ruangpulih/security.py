@@ -0,0 +1,122 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict, namedtuple
+
+from pyramid.httpexceptions import HTTPUnauthorized
+from sqlalchemy import event
+
+from .models.user import User
+
+# What views need to know about the caller; deliberately not an ORM object
+# so it can be shared across requests and threads.
+RequestUser = namedtuple('RequestUser', ['id', 'role', 'username'])
+
+_caches = weakref.WeakSet()
+
+
+class UserCache:
+    """
+    Thread-safe LRU cache of ``user id -> RequestUser`` with a time-to-live.
+
+    Entries are dropped as soon as the user row is updated or deleted through
+    the ORM; the TTL bounds staleness for changes made any other way.
+    """
+
+    def __init__(self, max_size=1024, ttl=300, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user):
+        with self._lock:
+            self._entries[user.id] = (user, self.clock() + self.ttl)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, user):
+    for cache in list(_caches):
+        cache.invalidate(user.id)
+
+
+def get_request_user(request):
+    """
+    Loads the authenticated user's id, role and username, at most once per
+    request (it is registered as the reified ``request.user``) and, when
+    ``auth.user_cache_size`` is set, at most once per TTL across requests.
+    """
+    user_id = request.authenticated_userid
+    if not user_id:
+        return None
+
+    cache = request.registry.get('user_cache')
+    if cache is not None:
+        user = cache.get(user_id)
+        if user is not None:
+            return user
+
+    row = request.dbsession.query(User.id, User.role, User.username).filter(User.id == user_id).first()
+    if row is None:
+        return None
+
+    user = RequestUser(*row)
+    if cache is not None:
+        cache.set(user)
+    return user
+
+
+def require_user(request):
+    """Returns ``request.user`` or raises 401 for anonymous requests."""
+    user = request.user
+    if user is None:
+        raise HTTPUnauthorized(json_body={"error": "Unauthorized"})
+    return user
+
+
+def includeme(config):
+    """
+    Set up the optional cross-request cache behind ``request.user``,
+    configured by ``auth.user_cache_size`` (0 disables it) and
+    ``auth.user_cache_ttl`` seconds.
+
+    Activate this setup using ``config.include('ruangpulih.security')``.
+    """
+    settings = config.get_settings()
+    cache_size = int(settings.get('auth.user_cache_size', 0))
+    if cache_size > 0:
+        config.registry['user_cache'] = UserCache(
+            max_size=cache_size,
+            ttl=float(settings.get('auth.user_cache_ttl', 300)),
+        )
+    else:
+        config.registry['user_cache'] = None
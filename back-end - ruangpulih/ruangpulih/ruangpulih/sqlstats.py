@@ -0,0 +1,154 @@
+import contextvars
+import logging
+import threading
+import time
+
+from pyramid.settings import asbool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+# A statement executed this many times in one request, with different
+# parameters, is almost always a lazy load inside a loop (N+1).
+DEFAULT_REPEAT_THRESHOLD = 5
+
+QUERY_COUNT_HEADER = 'X-DB-Queries'
+QUERY_TIME_HEADER = 'X-DB-Time-Ms'
+REPEATED_QUERIES_HEADER = 'X-DB-Repeated-Queries'
+
+_current = contextvars.ContextVar('ruangpulih_sqlstats', default=None)
+
+
+class SQLStats:
+    """
+    Statements executed while collecting, and the time spent in them.
+
+    With ``track_statements=False`` only the count and time are kept, which
+    is all the metrics tween needs. Use it as a context manager; collectors
+    nest, and statements are also recorded by the collector that was active
+    when this one was entered.
+    """
+
+    def __init__(self, track_statements=True):
+        self.count = 0
+        self.duration = 0.0
+        self.track_statements = track_statements
+        self.parent = None
+        self._by_statement = {}
+        self._token = None
+
+    def __enter__(self):
+        install()
+        self.parent = _current.get()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _current.reset(self._token)
+
+    def record(self, statement, parameters, duration):
+        self.count += 1
+        self.duration += duration
+        if self.track_statements:
+            entry = self._by_statement.get(statement)
+            if entry is None:
+                entry = self._by_statement[statement] = [0, set()]
+            entry[0] += 1
+            entry[1].add(repr(parameters))
+        if self.parent is not None:
+            self.parent.record(statement, parameters, duration)
+
+    def repeated(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """
+        ``(statement, executions)`` for every statement run at least
+        ``threshold`` times with differing parameters, most frequent first.
+        """
+        found = [
+            (statement, count)
+            for statement, (count, parameters) in self._by_statement.items()
+            if count >= threshold and len(parameters) > 1
+        ]
+        return sorted(found, key=lambda item: -item[1])
+
+    def summary(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        lines = [f'{self.count} statements in {self.duration * 1000:.1f} ms']
+        lines += [f'  {count}x {statement}' for statement, count in self.repeated(threshold)]
+        return '\n'.join(lines)
+
+
+# The start time lives on the statement's execution context, which is
+# discarded with it, so a statement that raises leaves nothing behind.
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._sqlstats_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = getattr(context, '_sqlstats_started', None)
+    if stats is not None and started is not None:
+        stats.record(statement, parameters, time.perf_counter() - started)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """Hooks statement timing into every engine; a no-op unless collecting."""
+    global _installed
+    if _installed:
+        return
+    with _install_lock:
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _installed = True
+
+
+def collect(track_statements=True):
+    """``with collect() as stats:`` records the statements run in the block."""
+    return SQLStats(track_statements)
+
+
+def sql_stats_tween_factory(handler, registry):
+    """
+    Counts the statements (and database time) of each request, reports them
+    in response headers and logs statements that look like N+1 queries.
+
+    Statements run by a streamed body (see streaming.py) happen after the
+    response leaves this tween and are not counted.
+    """
+    threshold = int(registry.settings.get('sqlstats.repeat_threshold', DEFAULT_REPEAT_THRESHOLD))
+
+    def sql_stats_tween(request):
+        with collect() as stats:
+            response = handler(request)
+
+        response.headers[QUERY_COUNT_HEADER] = str(stats.count)
+        response.headers[QUERY_TIME_HEADER] = f'{stats.duration * 1000:.2f}'
+        repeated = stats.repeated(threshold)
+        if repeated:
+            response.headers[REPEATED_QUERIES_HEADER] = str(len(repeated))
+            for statement, count in repeated:
+                log.warning(
+                    'Possible N+1 in %s %s: statement ran %d times: %s',
+                    request.method, request.path, count, ' '.join(statement.split()),
+                )
+        return response
+
+    return sql_stats_tween
+
+
+def includeme(config):
+    """
+    Add the per-request SQL statistics tween when ``sqlstats.enabled`` is
+    true; ``sqlstats.repeat_threshold`` sets when repeats are reported.
+
+    Activate this setup using ``config.include('ruangpulih.sqlstats')``.
+    """
+    if asbool(config.get_settings().get('sqlstats.enabled', False)):
+        # Above pyramid_tm so the commit is counted too.
+        config.add_tween('ruangpulih.sqlstats.sql_stats_tween_factory', over='pyramid_tm.tm_tween_factory')
@@ -0,0 +1,63 @@
+from pyramid.response import Response
+from pyramid.settings import asbool
+
+from .models import request_session_factory
+from .renderers import compact_dumps_from_settings
+
+# Rows fetched per round trip, and per chunk of output handed to the server.
+STREAM_CHUNK_SIZE = 500
+
+
+def wants_stream(request):
+    """True when the client asked for the whole result with ``?stream=true``."""
+    return asbool(request.params.get('stream', False))
+
+
+def _iter_json_array(session_factory, query, serialize_chunk, dumps, chunk_size):
+    # pyramid_tm commits and closes request.dbsession as soon as the view
+    # returns, before the server starts pulling from app_iter, so the rows
+    # are read through a session owned by this generator instead (from the
+    # same primary or replica as request.dbsession).
+    session = session_factory()
+    try:
+        yield b'['
+        separator = b''
+        rows = []
+        for row in query.with_session(session).yield_per(chunk_size):
+            rows.append(row)
+            if len(rows) == chunk_size:
+                yield separator + b','.join(dumps(p) for p in serialize_chunk(session, rows))
+                separator = b','
+                rows = []
+        if rows:
+            yield separator + b','.join(dumps(p) for p in serialize_chunk(session, rows))
+        yield b']'
+    finally:
+        session.close()
+
+
+def stream_json_array(request, query, serialize=None, chunk_size=STREAM_CHUNK_SIZE, serialize_chunk=None):
+    """
+    Returns a response whose body is the JSON array ``[serialize(row), ...]``
+    for every row of ``query``, written incrementally.
+
+    Rows are fetched ``chunk_size`` at a time, so memory use does not depend
+    on the size of the result and the first bytes go out after the first
+    chunk. ``query`` must be fully built (filters, ordering) and must not
+    joinedload collections, which ``yield_per`` cannot do; use selectinload.
+    Everything that can fail with a 4xx should be checked before calling
+    this, since the status line is sent before the rows are read.
+
+    Instead of ``serialize``, ``serialize_chunk(session, rows)`` may return
+    the payloads for a whole chunk, for serializers that load related rows
+    once per chunk through the stream's ``session``.
+    """
+    if serialize_chunk is None:
+        serialize_chunk = lambda session, rows: map(serialize, rows)
+    return Response(
+        app_iter=_iter_json_array(
+            request_session_factory(request), query, serialize_chunk,
+            compact_dumps_from_settings(request.registry.settings), chunk_size,
+        ),
+        content_type='application/json',
+    )
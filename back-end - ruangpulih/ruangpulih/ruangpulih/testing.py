@@ -0,0 +1,17 @@
+"""
+Request doubles shared by the test suite and the benchmark scripts.
+"""
+from pyramid import testing
+from pyramid.decorator import reify
+
+from .security import get_request_user
+
+
+class DummyRequest(testing.DummyRequest):
+    """DummyRequest whose authenticated_userid can be assigned directly."""
+    authenticated_userid = None
+
+    @reify
+    def user(self):
+        # Mirrors the request.user method registered in ruangpulih.main().
+        return get_request_user(self)
@@ -1,9 +1,17 @@
+import json
 import unittest
+from contextlib import contextmanager
 import transaction
-from datetime import date, time, datetime
+from datetime import date, time, datetime, timedelta
 from pyramid import testing
-from pyramid.httpexceptions import HTTPNotFound, HTTPUnauthorized, HTTPBadRequest, HTTPConflict
+from pyramid.response import Response
+from pyramid.httpexceptions import HTTPForbidden, HTTPNotFound, HTTPNotModified, HTTPPreconditionFailed, HTTPUnauthorized, HTTPBadRequest, HTTPConflict, HTTPServiceUnavailable
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
+import os
+import re
+import tempfile
+import threading
 import uuid
 
 # Import models
@@ -12,22 +20,35 @@ from .models.user import User
 from .models.schedule import Schedule
 from .models.booking import Booking
 from .models.review import Review
+from .models.rating import PsychologistRating, rebuild_psychologist_ratings
+from .availability import AVAILABILITY_INDEX, AvailabilityIndex
+from .caching import AVAILABLE_PSYCHOLOGISTS_CACHE, GenerationalCache
+from .events import EVENT_HUB, EventHub, EventStream, booking_events
+from .cors import cors_tween_factory
+from .hashing import PasswordHasher
+from .metrics import RequestMetrics, metrics_tween_factory, metrics_view
+from .projections import REVIEW_COLUMNS, SCHEDULE_COLUMNS, review_row_to_dict, schedule_rows_to_dicts
+from .renderers import json_renderer_from_settings, orjson
+from .sqlstats import QUERY_COUNT_HEADER, REPEATED_QUERIES_HEADER, collect, sql_stats_tween_factory
+from .streaming import stream_json_array
+from .security import RequestUser, UserCache, get_request_user
+from .testing import DummyRequest
 
 # Import views
 from .views.auth import register, login, logout
-from .views.schedules import list_schedules, add_schedule, get_schedule, update_schedule, delete_schedule
+from .views.schedules import list_schedules, add_schedule, add_schedules_bulk, get_schedule, update_schedule, delete_schedule
 from .views.bookings import list_bookings, create_booking, get_booking, update_booking_status, delete_booking
 from .views.reviews import create_review, list_reviews
-from .views.pyschologist import get_psychologists_with_available_schedules, get_psychologist_detail
+from .views.pyschologist import get_free_psychologists, get_psychologists_with_available_schedules, get_psychologist_detail, search_available_schedules
 
 
-def dummy_request(dbsession, authenticated_userid=None, json_body=None, matchdict=None):
+def dummy_request(dbsession, authenticated_userid=None, json_body=None, matchdict=None, params=None):
     """
     Creates a dummy request object for testing Pyramid views.
     """
-    req = testing.DummyRequest(dbsession=dbsession, json_body=json_body, matchdict=matchdict)
+    req = DummyRequest(dbsession=dbsession, json_body=json_body, matchdict=matchdict, params=params)
     req.authenticated_userid = authenticated_userid
-    req.response = testing.DummyResponse() # Needed for headers in login/logout
+    req.response = Response() # Needed for headers in login/logout
     req.registry.settings = {'tm.manager_hook': 'pyramid_tm.explicit_manager'} # Required for tm.begin() in main
     req.tm = transaction.manager # Attach transaction manager
     return req
@@ -40,6 +61,8 @@ class BaseTest(unittest.TestCase):
             'sqlalchemy.url': 'sqlite:///:memory:' # Use in-memory SQLite for fast tests
         })
         self.config.include('.models')
+        self.config.include('.hashing')
+        self.config.include('.security')
         settings = self.config.get_settings()
 
         from .models import (
@@ -120,6 +143,18 @@ class BaseTest(unittest.TestCase):
         self.session.flush()
 
 
+    @contextmanager
+    def assert_query_budget(self, max_statements, repeat_threshold=5):
+        """
+        Fails if the block runs more than ``max_statements`` statements, or
+        repeats one ``repeat_threshold`` times with different parameters
+        (an N+1 lazy load).
+        """
+        with collect() as stats:
+            yield stats
+        self.assertLessEqual(stats.count, max_statements, stats.summary(repeat_threshold))
+        self.assertEqual(stats.repeated(repeat_threshold), [], stats.summary(repeat_threshold))
+
     def tearDown(self):
         # Abort the transaction to roll back any changes made during the test
         self.transaction.abort()
@@ -128,6 +163,34 @@ class BaseTest(unittest.TestCase):
         Base.metadata.drop_all(self.engine)
 
 
+def _remove_database_files(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+class FileDatabaseTest(unittest.TestCase):
+    """
+    Base for tests that need an on-disk SQLite database, shared by several
+    connections or threads where BaseTest's in-memory one is not.
+    """
+
+    def temp_database_url(self):
+        """The URL of a new SQLite file, removed with its WAL files after the test."""
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.addCleanup(_remove_database_files, path)
+        return f'sqlite:///{path}'
+
+    def create_file_database(self):
+        """``(engine, session_factory)`` of a new database file with the schema."""
+        from .models import get_engine, get_session_factory
+        engine = get_engine({'sqlalchemy.url': self.temp_database_url()})
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(engine)
+        return engine, get_session_factory(engine)
+
+
 class TestAuthViews(BaseTest):
     """Tests for authentication views (register, login, logout)."""
 
@@ -224,6 +287,59 @@ class TestAuthViews(BaseTest):
             login(request)
         self.assertIn('Missing fields: password', cm.exception.json_body['error'])
 
+    def test_login_rehashes_when_rounds_change(self):
+        self.config.registry['password_hasher'] = PasswordHasher(rounds=4)
+        request = dummy_request(self.session, json_body={
+            'email': self.client_user.email,
+            'password': 'client_pass'
+        })
+        login(request)
+        self.assertTrue(self.client_user.password.startswith('$2b$04$'))
+        self.assertTrue(self.client_user.check_password('client_pass'))
+
+    def test_login_returns_503_when_hasher_saturated(self):
+        hasher = PasswordHasher(max_pending=1)
+        self.config.registry['password_hasher'] = hasher
+        hasher._slots.acquire()  # simulate a hash already in flight
+        request = dummy_request(self.session, json_body={
+            'email': self.client_user.email,
+            'password': 'client_pass'
+        })
+        with self.assertRaises(HTTPServiceUnavailable) as cm:
+            login(request)
+        self.assertEqual(cm.exception.headers['Retry-After'], '1')
+
+    def test_process_pool_hasher(self):
+        hasher = PasswordHasher(rounds=4, workers=1)
+        try:
+            password_hash = hasher.hash('secret')
+            self.assertTrue(hasher.verify('secret', password_hash))
+            self.assertFalse(hasher.verify('wrong', password_hash))
+            self.assertFalse(hasher.needs_update(password_hash))
+            self.assertTrue(PasswordHasher(rounds=5).needs_update(password_hash))
+        finally:
+            hasher.shutdown()
+
+    def test_process_pool_hasher_recovers_from_a_dead_worker(self):
+        hasher = PasswordHasher(rounds=4, workers=1, max_pending=2)
+        try:
+            password_hash = hasher.hash('secret')
+            executor = hasher._executor
+            for process in list(executor._processes.values()):
+                process.kill()
+                process.join()
+            # Calls that meet the broken pool get a 503 and free their slot.
+            for _ in range(3):
+                try:
+                    hasher.verify('secret', password_hash)
+                except HTTPServiceUnavailable as exc:
+                    self.assertIn('restarting', exc.json_body['error'])
+            self.assertIsNot(hasher._executor, executor)
+            for _ in range(hasher.max_pending + 1):
+                self.assertTrue(hasher.verify('secret', password_hash))
+        finally:
+            hasher.shutdown()
+
     def test_logout_success(self):
         request = dummy_request(self.session, authenticated_userid=self.client_user.id)
         response = logout(request)
@@ -231,6 +347,67 @@ class TestAuthViews(BaseTest):
         self.assertIn('Set-Cookie', response.headers) # Should contain headers to clear cookie
 
 
+class TestRequestUser(BaseTest):
+    """Tests for request.user and the cross-request user cache."""
+
+    def count_statements(self, fn):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(self.engine, 'before_cursor_execute', listener)
+        try:
+            result = fn()
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', listener)
+        return result, len(statements)
+
+    def test_anonymous_request_has_no_user(self):
+        self.assertIsNone(dummy_request(self.session).user)
+
+    def test_user_loaded_once_per_request(self):
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id)
+        user, first = self.count_statements(lambda: request.user)
+        _, second = self.count_statements(lambda: request.user)
+        self.assertEqual((user.id, user.role, user.username), (self.client_user.id, 'client', 'test_client'))
+        self.assertEqual((first, second), (1, 0))
+
+    def test_user_cache_shared_across_requests(self):
+        self.config.registry['user_cache'] = UserCache(max_size=10, ttl=60)
+        dummy_request(self.session, authenticated_userid=self.client_user.id).user
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id)
+        user, statements = self.count_statements(lambda: request.user)
+        self.assertEqual(user.role, 'client')
+        self.assertEqual(statements, 0)
+
+    def test_user_cache_invalidated_on_update(self):
+        cache = UserCache(max_size=10, ttl=60)
+        self.config.registry['user_cache'] = cache
+        dummy_request(self.session, authenticated_userid=self.client_user.id).user
+        self.assertIsNotNone(cache.get(self.client_user.id))
+
+        self.client_user.username = 'renamed_client'
+        self.session.flush()
+        self.assertIsNone(cache.get(self.client_user.id))
+        user = dummy_request(self.session, authenticated_userid=self.client_user.id).user
+        self.assertEqual(user.username, 'renamed_client')
+
+    def test_user_cache_ttl_and_lru(self):
+        now = [0.0]
+        cache = UserCache(max_size=2, ttl=10, clock=lambda: now[0])
+        for user_id in ('a', 'b'):
+            cache.set(RequestUser(user_id, 'client', user_id))
+        cache.get('a')
+        cache.set(RequestUser('c', 'client', 'c'))
+        self.assertIsNone(cache.get('b'))  # least recently used
+        self.assertIsNotNone(cache.get('a'))
+        now[0] = 11
+        self.assertIsNone(cache.get('a'))
+
+    def test_deleted_user_is_unauthorized(self):
+        request = dummy_request(self.session, authenticated_userid='deleted_user')
+        with self.assertRaises(HTTPUnauthorized):
+            list_bookings(request)
+
+
 class TestScheduleViews(BaseTest):
     """Tests for schedule views."""
 
@@ -251,6 +428,70 @@ class TestScheduleViews(BaseTest):
         with self.assertRaises(HTTPUnauthorized):
             list_schedules(request)
 
+    def test_list_schedules_keyset_pagination(self):
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, params={'limit': '1'})
+        first_page = list_schedules(request)
+        self.assertEqual(len(first_page), 1)
+        self.assertEqual(first_page[0]['id'], self.schedule_psy_available.id)
+        cursor = request.response.headers['X-Next-Cursor']
+
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, params={'limit': '1', 'cursor': cursor})
+        second_page = list_schedules(request)
+        self.assertEqual(len(second_page), 1)
+        self.assertEqual(second_page[0]['id'], self.schedule_psy_booked.id)
+        self.assertNotIn('X-Next-Cursor', request.response.headers)
+
+    def test_list_schedules_keyset_ties_on_same_slot(self):
+        twins = [
+            Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=date(2025, 12, 25), time_slot=time(10, 0), is_booked=False)
+            for _ in range(3)
+        ]
+        self.session.add_all(twins)
+        self.session.flush()
+
+        seen, cursor = [], None
+        while True:
+            params = {'limit': '2'}
+            if cursor:
+                params['cursor'] = cursor
+            request = dummy_request(self.session, authenticated_userid=self.client_user.id, params=params)
+            seen.extend(s['id'] for s in list_schedules(request))
+            cursor = request.response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_list_schedules_limit_is_capped(self):
+        from .pagination import MAX_PAGE_SIZE
+        self.session.add_all([
+            Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=date(2026, 1, 1), time_slot=time(h % 24, h // 24), is_booked=False)
+            for h in range(MAX_PAGE_SIZE + 5)
+        ])
+        self.session.flush()
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, params={'limit': '100000'})
+        response = list_schedules(request)
+        self.assertEqual(len(response), MAX_PAGE_SIZE)
+        self.assertIn('X-Next-Cursor', request.response.headers)
+
+    def test_list_schedules_filters(self):
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, params={'is_booked': 'false'})
+        response = list_schedules(request)
+        self.assertEqual([s['id'] for s in response], [self.schedule_psy_available.id])
+
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, params={'date_from': '2025-12-26', 'date_to': '2025-12-31'})
+        response = list_schedules(request)
+        self.assertEqual([s['id'] for s in response], [self.schedule_psy_booked.id])
+
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, params={'psychologist_id': 'someone_else'})
+        self.assertEqual(list_schedules(request), [])
+
+    def test_list_schedules_invalid_params(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'limit': 'abc'}, {'limit': '0'}, {'date_from': '25-12-2025'}, {'is_booked': 'maybe'}):
+            request = dummy_request(self.session, authenticated_userid=self.client_user.id, params=params)
+            with self.assertRaises(HTTPBadRequest):
+                list_schedules(request)
+
     def test_add_schedule_success(self):
         request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id, json_body={
             'date': '2025-07-01',
@@ -258,8 +499,8 @@ class TestScheduleViews(BaseTest):
         })
         response = add_schedule(request)
         self.assertIn('id', response)
-        self.assertEqual(response['date'], '2025-07-01')
-        self.assertEqual(response['time_slot'], '16:00')
+        self.assertEqual(response['date'], date(2025, 7, 1))
+        self.assertEqual(response['time_slot'], time(16, 0))
         self.assertEqual(response['psychologist_id'], self.psychologist_user.id)
         self.assertFalse(response['is_booked'])
 
@@ -280,11 +521,77 @@ class TestScheduleViews(BaseTest):
             add_schedule(request)
         self.assertIn('Invalid date or time format', cm.exception.json_body['error'])
 
+    def test_schedule_times_must_fall_on_a_quarter_hour(self):
+        psychologist_id = self.psychologist_user.id
+        with self.assertRaises(HTTPBadRequest):
+            add_schedule(dummy_request(self.session, authenticated_userid=psychologist_id,
+                                       json_body={'date': '2025-07-01', 'time_slot': '09:10'}))
+        with self.assertRaises(HTTPBadRequest) as cm:
+            add_schedules_bulk(dummy_request(self.session, authenticated_userid=psychologist_id, json_body={'recurrence': {
+                'date_from': '2026-11-02', 'date_to': '2026-11-15', 'weekdays': ['mon'], 'time_slots': ['09:00', '09:50'],
+            }}))
+        self.assertIn("'09:50'", cm.exception.json_body['error'])
+        with self.assertRaises(HTTPBadRequest):
+            update_schedule(dummy_request(self.session, authenticated_userid=psychologist_id,
+                                          matchdict={'id': self.schedule_psy_available.id}, json_body={'time_slot': '11:05'}))
+        self.assertEqual(add_schedule(dummy_request(self.session, authenticated_userid=psychologist_id,
+                                                    json_body={'date': '2025-07-01', 'time_slot': '09:45'}))['time_slot'], time(9, 45))
+
+    def test_add_schedules_bulk_from_slots_skips_existing(self):
+        request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id, json_body={'slots': [
+            {'date': '2025-12-25', 'time_slot': '10:00'},  # already in BaseTest
+            {'date': '2025-12-25', 'time_slot': '11:00'},
+            {'date': '2025-12-25', 'time_slot': '11:00'},  # repeated in the payload
+        ]})
+        with self.assert_query_budget(3):
+            response = add_schedules_bulk(request)
+        self.assertEqual([(s['date'], s['time_slot']) for s in response['created']], [(date(2025, 12, 25), time(11, 0))])
+        self.assertEqual(len(response['skipped']), 2)
+        self.assertEqual(self.session.query(Schedule).filter_by(psychologist_id=self.psychologist_user.id).count(), 3)
+
+    def test_add_schedules_bulk_from_recurrence(self):
+        request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id, json_body={'recurrence': {
+            'date_from': '2026-11-02', 'date_to': '2026-11-15',
+            'weekdays': ['mon', 'wed'], 'time_slots': ['09:00', '13:30'],
+        }})
+        response = add_schedules_bulk(request)
+        self.assertEqual(len(response['created']), 8)
+        self.assertEqual({s['date'].weekday() for s in response['created']}, {0, 2})
+
+        # Publishing the same rule again creates nothing.
+        request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id, json_body=request.json_body)
+        response = add_schedules_bulk(request)
+        self.assertEqual((len(response['created']), len(response['skipped'])), (0, 8))
+
+    def test_add_schedules_bulk_reports_every_error_and_writes_nothing(self):
+        request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id, json_body={'slots': [
+            {'date': '2025-13-01', 'time_slot': '10:00'},
+            {'date': '2025-12-01', 'time_slot': '10:00'},
+            {'date': '2025-12-01', 'time_slot': '25:00'},
+        ]})
+        with self.assertRaises(HTTPBadRequest) as cm:
+            add_schedules_bulk(request)
+        self.assertIn('slots[0]', cm.exception.json_body['error'])
+        self.assertIn('slots[2]', cm.exception.json_body['error'])
+        self.assertEqual(self.session.query(Schedule).count(), 2)
+
+    def test_add_schedules_bulk_limits(self):
+        request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id, json_body={'recurrence': {
+            'date_from': '2026-01-01', 'date_to': '2036-01-01', 'weekdays': ['mon'], 'time_slots': ['09:00'] * 3,
+        }})
+        with self.assertRaises(HTTPBadRequest) as cm:
+            add_schedules_bulk(request)
+        self.assertIn('At most', cm.exception.json_body['error'])
+
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, json_body={'slots': []})
+        with self.assertRaises(HTTPUnauthorized):
+            add_schedules_bulk(request)
+
     def test_get_schedule_success(self):
         request = dummy_request(self.session, authenticated_userid=self.client_user.id, matchdict={'id': self.schedule_psy_available.id})
         response = get_schedule(request)
         self.assertEqual(response['id'], self.schedule_psy_available.id)
-        self.assertEqual(response['date'], '2025-12-25')
+        self.assertEqual(response['date'], date(2025, 12, 25))
 
     def test_get_schedule_not_found(self):
         request = dummy_request(self.session, authenticated_userid=self.client_user.id, matchdict={'id': 'nonexistent_id'})
@@ -297,7 +604,7 @@ class TestScheduleViews(BaseTest):
         })
         response = update_schedule(request)
         self.assertEqual(response['id'], self.schedule_psy_available.id)
-        self.assertEqual(response['time_slot'], '11:30')
+        self.assertEqual(response['time_slot'], time(11, 30))
         updated_schedule = self.session.get(Schedule, self.schedule_psy_available.id)
         self.assertEqual(updated_schedule.time_slot, time(11, 30))
 
@@ -395,6 +702,17 @@ class TestBookingViews(BaseTest):
             create_booking(request)
         self.assertIn('Schedule already booked', cm.exception.json_body['error'])
 
+    def test_create_booking_rejects_second_active_booking(self):
+        # is_booked out of sync with the bookings table: the unique index still holds.
+        self.schedule_psy_booked.is_booked = False
+        self.session.flush()
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, json_body={
+            'schedule_id': self.schedule_psy_booked.id
+        })
+        with self.assertRaises(HTTPBadRequest) as cm:
+            create_booking(request)
+        self.assertIn('Schedule already booked', cm.exception.json_body['error'])
+
     def test_get_booking_client_success(self):
         request = dummy_request(self.session, authenticated_userid=self.client_user.id, matchdict={'id': self.booking_client_confirmed.id})
         response = get_booking(request)
@@ -575,6 +893,146 @@ class TestBookingViews(BaseTest):
         self.assertFalse(self.session.get(Schedule, self.schedule_psy_booked.id).is_booked) # Schedule should be unbooked
 
 
+class TestBookingContention(FileDatabaseTest):
+    """Many clients racing for one slot against a shared on-disk database."""
+
+    CLIENTS = 100
+
+    def setUp(self):
+        self.engine, self.session_factory = self.create_file_database()
+
+        session = self.session_factory()
+        psychologist = User(id=str(uuid.uuid4()), username="race_psy", email="race_psy@example.com", role="psychologist", password="x")
+        self.client_ids = [str(uuid.uuid4()) for _ in range(self.CLIENTS)]
+        session.add(psychologist)
+        session.add_all([
+            User(id=client_id, username=f"race_client_{i}", email=f"race_{i}@example.com", role="client", password="x")
+            for i, client_id in enumerate(self.client_ids)
+        ])
+        self.schedule_id = str(uuid.uuid4())
+        session.add(Schedule(id=self.schedule_id, psychologist_id=psychologist.id, date=date(2026, 3, 1), time_slot=time(10, 0), is_booked=False))
+        session.commit()
+        session.close()
+
+    def test_exactly_one_client_wins_the_slot(self):
+        from .models import get_tm_session
+        barrier = threading.Barrier(self.CLIENTS)
+        outcomes = []
+        outcomes_lock = threading.Lock()
+
+        def attempt(client_id):
+            tm = transaction.TransactionManager(explicit=True)
+            barrier.wait()
+            try:
+                with tm:
+                    session = get_tm_session(self.session_factory, tm)
+                    request = dummy_request(session, authenticated_userid=client_id, json_body={'schedule_id': self.schedule_id})
+                    create_booking(request)
+                outcome = 'won'
+            except HTTPBadRequest as e:
+                outcome = e.json_body['error']
+            except Exception as e:
+                outcome = repr(e)
+            with outcomes_lock:
+                outcomes.append(outcome)
+
+        threads = [threading.Thread(target=attempt, args=(client_id,)) for client_id in self.client_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count('won'), 1, outcomes)
+        self.assertEqual(outcomes.count('Schedule already booked'), self.CLIENTS - 1, outcomes)
+
+        session = self.session_factory()
+        self.assertEqual(session.query(Booking).filter_by(schedule_id=self.schedule_id).count(), 1)
+        self.assertTrue(session.get(Schedule, self.schedule_id).is_booked)
+        session.close()
+
+
+class TestStreamingLists(FileDatabaseTest):
+    """?stream=true list responses, read after the request's session is gone."""
+
+    SCHEDULES = 30
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.engine, self.session_factory = self.create_file_database()
+        self.config.registry['dbsession_factory'] = self.session_factory
+
+        session = self.session_factory()
+        self.psychologist_id = str(uuid.uuid4())
+        self.client_id = str(uuid.uuid4())
+        session.add(User(id=self.psychologist_id, username="stream_psy", email="stream_psy@example.com", role="psychologist", password="x"))
+        session.add(User(id=self.client_id, username="stream_client", email="stream_client@example.com", role="client", password="x"))
+        start = datetime(2026, 1, 1, 9, 0)
+        for i in range(self.SCHEDULES):
+            schedule = Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_id, date=date(2026, 1, 1) + timedelta(days=i // 5), time_slot=time(9 + i % 5, 0), is_booked=i % 2 == 0)
+            session.add(schedule)
+            if schedule.is_booked:
+                booking = Booking(id=str(uuid.uuid4()), client_id=self.client_id, schedule_id=schedule.id, status="confirmed", created_at=start + timedelta(hours=i))
+                session.add(booking)
+                session.add(Review(id=str(uuid.uuid4()), booking_id=booking.id, rating=1 + i % 5, comment="", created_at=start + timedelta(hours=i)))
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def stream(self, view, userid, **params):
+        session = self.session_factory()
+        request = dummy_request(session, authenticated_userid=userid, params=dict(params, stream='true'))
+        response = view(request)
+        session.close()  # as pyramid_tm does before the body is sent
+        return json.loads(b''.join(response.app_iter))
+
+    def test_stream_schedules(self):
+        schedules = self.stream(list_schedules, self.psychologist_id)
+        self.assertEqual(len(schedules), self.SCHEDULES)
+        keys = [(s['date'], s['time_slot']) for s in schedules]
+        self.assertEqual(keys, sorted(keys))
+        booked = [s for s in schedules if s['is_booked']]
+        self.assertTrue(all(s['current_booking']['client_details']['id'] == self.client_id for s in booked))
+
+    def test_stream_schedules_applies_filters(self):
+        schedules = self.stream(list_schedules, self.client_id, is_booked='false', date_to='2026-01-02')
+        self.assertEqual(len(schedules), 5)
+        self.assertFalse(any(s['is_booked'] for s in schedules))
+
+    def test_stream_bookings(self):
+        for userid in (self.client_id, self.psychologist_id):
+            bookings = self.stream(list_bookings, userid)
+            self.assertEqual(len(bookings), self.SCHEDULES // 2)
+            self.assertEqual([b['created_at'] for b in bookings], sorted(b['created_at'] for b in bookings))
+
+    def test_stream_reviews_newest_first(self):
+        reviews = self.stream(list_reviews, None, min_rating='3')
+        self.assertTrue(reviews)
+        self.assertTrue(all(r['rating'] >= 3 for r in reviews))
+        self.assertEqual([r['created_at'] for r in reviews], sorted((r['created_at'] for r in reviews), reverse=True))
+
+    def test_invalid_params_fail_before_streaming(self):
+        request = dummy_request(self.session_factory(), authenticated_userid=self.psychologist_id, params={'stream': 'true', 'date_from': 'soon'})
+        with self.assertRaises(HTTPBadRequest):
+            list_schedules(request)
+
+    def test_rows_written_in_chunks(self):
+        session = self.session_factory()
+        request = dummy_request(session)
+        response = stream_json_array(request, session.query(Schedule).order_by(Schedule.id), Schedule.to_dict, chunk_size=4)
+        chunks = list(response.app_iter)
+        self.assertEqual(len(chunks), 2 + -(-self.SCHEDULES // 4))  # brackets + row chunks
+        self.assertEqual(len(json.loads(b''.join(chunks))), self.SCHEDULES)
+        self.assertEqual(response.content_type, 'application/json')
+
+    def test_empty_result(self):
+        session = self.session_factory()
+        request = dummy_request(session)
+        response = stream_json_array(request, session.query(Schedule).filter(Schedule.id == 'none'), Schedule.to_dict)
+        self.assertEqual(b''.join(response.app_iter), b'[]')
+
+
 class TestReviewViews(BaseTest):
     """Tests for review views."""
 
@@ -631,7 +1089,7 @@ class TestReviewViews(BaseTest):
             'booking_id': self.booking_client_confirmed.id,
             'comment': 'Missing rating.'
         })
-        with self.assertRaises(IntegrityError): # rating is non-nullable
+        with self.assertRaises(HTTPBadRequest):
             create_review(request)
 
     def test_create_review_missing_booking_id(self):
@@ -648,6 +1106,113 @@ class TestReviewViews(BaseTest):
         self.assertEqual(len(response), 1)
         self.assertEqual(response[0]['id'], self.review_client.id)
 
+    def add_reviews(self, count, rating=4):
+        """Adds ``count`` reviewed bookings for the test psychologist, oldest first."""
+        reviews = []
+        for i in range(count):
+            schedule = Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=date(2025, 10, 1), time_slot=time(8, i), is_booked=True)
+            booking = Booking(id=str(uuid.uuid4()), client_id=self.client_user.id, schedule_id=schedule.id, status="confirmed", created_at=datetime.utcnow())
+            review = Review(id=str(uuid.uuid4()), booking_id=booking.id, rating=rating, comment=f"Review {i}", created_at=datetime(2026, 1, 1, 12, i))
+            self.session.add_all([schedule, booking, review])
+            reviews.append(review)
+        self.session.flush()
+        return reviews
+
+    def test_create_review_sets_psychologist(self):
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, json_body={
+            'booking_id': self.booking_client_confirmed.id,
+            'rating': 3
+        })
+        response = create_review(request)
+        self.assertEqual(response['psychologist_id'], self.psychologist_user.id)
+        self.assertIsNotNone(response['created_at'])
+
+    def test_list_reviews_newest_first_paginated(self):
+        reviews = self.add_reviews(3)
+        request = dummy_request(self.session, params={'limit': '2'})
+        first_page = list_reviews(request)
+        self.assertEqual([r['id'] for r in first_page], [self.review_client.id, reviews[2].id])
+        cursor = request.response.headers['X-Next-Cursor']
+
+        request = dummy_request(self.session, params={'limit': '2', 'cursor': cursor})
+        second_page = list_reviews(request)
+        self.assertEqual([r['id'] for r in second_page], [reviews[1].id, reviews[0].id])
+        self.assertNotIn('X-Next-Cursor', request.response.headers)
+
+    def test_list_reviews_filters(self):
+        self.add_reviews(2, rating=2)
+        other_psy = User(id=str(uuid.uuid4()), username="other_psy_reviews", email="other_psy_reviews@example.com", role="psychologist", password="x")
+        self.session.add(other_psy)
+        self.session.flush()
+
+        request = dummy_request(self.session, params={'min_rating': '5'})
+        self.assertEqual([r['id'] for r in list_reviews(request)], [self.review_client.id])
+
+        request = dummy_request(self.session, params={'booking_id': self.booking_client_confirmed.id})
+        self.assertEqual([r['id'] for r in list_reviews(request)], [self.review_client.id])
+
+        request = dummy_request(self.session, params={'psychologist_id': self.psychologist_user.id})
+        self.assertEqual(len(list_reviews(request)), 3)
+
+        request = dummy_request(self.session, params={'psychologist_id': other_psy.id})
+        self.assertEqual(list_reviews(request), [])
+
+    def test_create_review_updates_rating_totals(self):
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, json_body={
+            'booking_id': self.booking_client_confirmed.id,
+            'rating': 2
+        })
+        create_review(request)
+        self.session.expire_all()
+        rating = self.session.get(PsychologistRating, self.psychologist_user.id)
+        self.assertEqual(rating.review_count, 2)
+        self.assertEqual(rating.rating_sum, 7)
+        self.assertEqual(rating.average_rating, 3.5)
+        self.assertEqual(rating.histogram, {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1})
+
+    def test_first_review_creates_rating_totals_with_one_upsert(self):
+        self.session.query(PsychologistRating).delete()
+        self.session.flush()
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(self.engine, 'before_cursor_execute', listener)
+        try:
+            create_review(dummy_request(self.session, authenticated_userid=self.client_user.id, json_body={
+                'booking_id': self.booking_client_confirmed.id,
+                'rating': 4
+            }))
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', listener)
+        [upsert] = [s for s in statements if 'psychologist_ratings' in s]
+        self.assertIn('ON CONFLICT', upsert)
+        self.session.expire_all()
+        rating = self.session.get(PsychologistRating, self.psychologist_user.id)
+        self.assertEqual((rating.review_count, rating.rating_sum, rating.rating_4_count), (1, 4, 1))
+
+    def test_create_review_rating_out_of_range(self):
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, json_body={
+            'booking_id': self.booking_client_confirmed.id,
+            'rating': 6
+        })
+        with self.assertRaises(HTTPBadRequest):
+            create_review(request)
+
+    def test_rebuild_psychologist_ratings(self):
+        self.add_reviews(3, rating=1)
+        self.session.query(PsychologistRating).delete()
+        self.session.flush()
+
+        self.assertEqual(rebuild_psychologist_ratings(self.session), 1)
+        rating = self.session.get(PsychologistRating, self.psychologist_user.id)
+        self.assertEqual(rating.review_count, 4)
+        self.assertEqual(rating.rating_sum, 8)
+        self.assertEqual(rating.histogram, {'1': 3, '2': 0, '3': 0, '4': 0, '5': 1})
+
+    def test_list_reviews_invalid_min_rating(self):
+        request = dummy_request(self.session, params={'min_rating': 'five'})
+        with self.assertRaises(HTTPBadRequest):
+            list_reviews(request)
+
 
 class TestPsychologistViews(BaseTest):
     """Tests for psychologist views."""
@@ -660,6 +1225,17 @@ class TestPsychologistViews(BaseTest):
         self.assertGreater(len(response[0]['available_schedules']), 0)
         self.assertTrue(all(not s['is_booked'] for s in response[0]['available_schedules']))
 
+    def test_get_psychologists_with_available_schedules_includes_ratings(self):
+        upcoming = Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=datetime.utcnow().date() + timedelta(days=7), time_slot=time(9, 0), is_booked=False)
+        self.session.add(upcoming)
+        self.session.flush()
+
+        request = dummy_request(self.session)
+        response = get_psychologists_with_available_schedules(request)
+        self.assertEqual(len(response), 1)
+        self.assertEqual(response[0]['average_rating'], 5.0)
+        self.assertEqual(response[0]['total_reviews'], 1)
+
     def test_get_psychologists_with_no_available_schedules(self):
         # Book all schedules for the psychologist
         self.schedule_psy_available.is_booked = True
@@ -669,6 +1245,52 @@ class TestPsychologistViews(BaseTest):
         response = get_psychologists_with_available_schedules(request)
         self.assertEqual(len(response), 0) # No psychologists should be returned if no available schedules
 
+    def add_search_slots(self):
+        other = User(id=str(uuid.uuid4()), username="other_psychologist", email="other@example.com", role="psychologist", password="x")
+        self.session.add(other)
+        start = datetime.utcnow().date() + timedelta(days=1)
+        for day in range(3):
+            for hour in (8, 9, 11, 12):
+                for psychologist_id in (self.psychologist_user.id, other.id):
+                    self.session.add(Schedule(id=str(uuid.uuid4()), psychologist_id=psychologist_id,
+                                              date=start + timedelta(days=day), time_slot=time(hour, 0),
+                                              is_booked=(hour == 11 and psychologist_id == other.id)))
+        self.session.flush()
+        return start, other
+
+    def test_search_available_schedules_filters_and_merges_in_time_order(self):
+        start, other = self.add_search_slots()
+        request = dummy_request(self.session, params={
+            'date_from': start.isoformat(), 'date_to': (start + timedelta(days=1)).isoformat(),
+            'time_from': '09:00', 'time_to': '12:00',
+        })
+        response = search_available_schedules(request)
+        keys = [(s['date'], s['time_slot']) for s in response]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(response), 6)  # 2 days x (09:00 both, 11:00 only the free one)
+        self.assertEqual({s['psychologist']['id'] for s in response}, {self.psychologist_user.id, other.id})
+        self.assertTrue(all(time(9, 0) <= s['time_slot'] < time(12, 0) for s in response))
+
+    def test_search_available_schedules_pages(self):
+        self.add_search_slots()
+        seen, cursor = [], None
+        while True:
+            params = {'time_from': '09:00', 'limit': '4'}
+            if cursor:
+                params['cursor'] = cursor
+            request = dummy_request(self.session, params=params)
+            seen.extend(s['id'] for s in search_available_schedules(request))
+            cursor = request.response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 15)
+        self.assertEqual(len(set(seen)), 15)
+
+    def test_search_available_schedules_rejects_empty_window(self):
+        request = dummy_request(self.session, params={'time_from': '12:00', 'time_to': '09:00'})
+        with self.assertRaises(HTTPBadRequest):
+            search_available_schedules(request)
+
     def test_get_psychologist_detail_success(self):
         request = dummy_request(self.session, matchdict={'id': self.psychologist_user.id})
         response = get_psychologist_detail(request)
@@ -681,6 +1303,25 @@ class TestPsychologistViews(BaseTest):
         self.assertEqual(response['average_rating'], 5.0)
         self.assertEqual(response['total_reviews'], 1)
 
+    def test_get_psychologist_detail_embeds_newest_reviews(self):
+        from .views.pyschologist import DETAIL_REVIEWS_LIMIT
+        reviews = TestReviewViews.add_reviews(self, DETAIL_REVIEWS_LIMIT + 2, rating=3)
+
+        request = dummy_request(self.session, matchdict={'id': self.psychologist_user.id})
+        response = get_psychologist_detail(request)
+        self.assertEqual(response['total_reviews'], DETAIL_REVIEWS_LIMIT + 3)
+        self.assertEqual(response['average_rating'], round((5 + 3 * (DETAIL_REVIEWS_LIMIT + 2)) / (DETAIL_REVIEWS_LIMIT + 3), 1))
+        self.assertEqual(len(response['reviews']), DETAIL_REVIEWS_LIMIT)
+        self.assertEqual(response['rating_histogram']['3'], DETAIL_REVIEWS_LIMIT + 2)
+        self.assertEqual(response['reviews'][1]['id'], reviews[-1].id)
+
+        request = dummy_request(self.session, params={
+            'psychologist_id': self.psychologist_user.id,
+            'cursor': response['reviews_next_cursor'],
+        })
+        rest = list_reviews(request)
+        self.assertEqual([r['id'] for r in rest], [r.id for r in reversed(reviews[:3])])
+
     def test_get_psychologist_detail_not_found(self):
         request = dummy_request(self.session, matchdict={'id': 'nonexistent_psy'})
         with self.assertRaises(HTTPNotFound):
@@ -699,3 +1340,1162 @@ class TestPsychologistViews(BaseTest):
         self.assertEqual(response['total_reviews'], 0)
         self.assertIsNone(response['average_rating'])
         self.assertEqual(len(response['reviews']), 0)
+
+
+
+class TestAvailablePsychologistsCache(BaseTest):
+    """Tests for the cached /psychologists/available payload."""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = GenerationalCache(ttl=60)
+        self.config.registry[AVAILABLE_PSYCHOLOGISTS_CACHE] = self.cache
+        self.upcoming = Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=datetime.utcnow().date() + timedelta(days=7), time_slot=time(9, 0), is_booked=False)
+        self.session.add(self.upcoming)
+        self.session.flush()
+
+    def get_available(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(self.engine, 'before_cursor_execute', listener)
+        try:
+            request = dummy_request(self.session)
+            response = get_psychologists_with_available_schedules(request)
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', listener)
+        return response, request.response.headers['X-Cache'], len(statements)
+
+    def test_second_request_served_from_cache(self):
+        first, first_status, first_statements = self.get_available()
+        second, second_status, second_statements = self.get_available()
+        self.assertEqual((first_status, second_status), ('MISS', 'HIT'))
+        self.assertGreater(first_statements, 0)
+        self.assertEqual(second_statements, 0)
+        self.assertEqual(second, first)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_booking_invalidates_cache(self):
+        self.get_available()
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, json_body={'schedule_id': self.upcoming.id})
+        create_booking(request)
+
+        response, status, _ = self.get_available()
+        self.assertEqual(status, 'MISS')
+        self.assertEqual(response, [])
+
+    def test_schedule_write_invalidates_cache(self):
+        self.get_available()
+        request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id, json_body={'date': (datetime.utcnow().date() + timedelta(days=8)).isoformat(), 'time_slot': '13:00'})
+        add_schedule(request)
+
+        response, status, _ = self.get_available()
+        self.assertEqual(status, 'MISS')
+        self.assertEqual(len(response[0]['available_schedules']), 2)
+
+    def test_invalidation_schedules_bump_after_commit(self):
+        request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id, matchdict={'id': self.upcoming.id})
+        delete_schedule(request)
+        self.assertEqual(self.cache.invalidations, 1)
+        hooks = list(transaction.manager.get().getAfterCommitHooks())
+        self.assertEqual(len(hooks), 1)
+        hook, args, kwargs = hooks[0]
+        hook(True, *args, **kwargs)
+        self.assertEqual(self.cache.invalidations, 2)
+
+    def test_value_computed_across_invalidation_is_not_stored(self):
+        def compute():
+            self.cache.invalidate()  # a write lands mid-rebuild
+            return 'stale'
+        self.assertEqual(self.cache.get_or_compute('k', compute), ('stale', False))
+        self.assertEqual(self.cache.get_or_compute('k', lambda: 'fresh'), ('fresh', False))
+        self.assertEqual(self.cache.get_or_compute('k', lambda: 'other'), ('fresh', True))
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        release = threading.Event()
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get_or_compute('k', compute))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([value for value, _ in results], ['value'] * 10)
+
+    def test_ttl_expires_entries(self):
+        now = [0.0]
+        cache = GenerationalCache(ttl=10, clock=lambda: now[0])
+        cache.get_or_compute('k', lambda: 'a')
+        now[0] = 11
+        self.assertEqual(cache.get_or_compute('k', lambda: 'b'), ('b', False))
+
+
+class TestAvailabilityIndex(BaseTest):
+    """Tests for the in-memory availability index and its sync from the write views."""
+
+    def setUp(self):
+        super().setUp()
+        self.today = datetime.utcnow().date()
+        self.tomorrow = self.today + timedelta(days=1)
+        self.session.add_all([
+            Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=self.tomorrow, time_slot=time(9, 30), is_booked=False),
+            Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=self.tomorrow, time_slot=time(14, 0), is_booked=False),
+            Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=self.tomorrow + timedelta(days=1), time_slot=time(8, 0), is_booked=True),
+        ])
+        self.session.flush()
+
+    def test_first_free_in_window(self):
+        index = AvailabilityIndex.build(self.session, self.today)
+        psychologist_id = self.psychologist_user.id
+        day_after = self.tomorrow + timedelta(days=1)
+
+        self.assertEqual(index.first_free_in_window(self.tomorrow, day_after, time(9, 0), time(12, 0)),
+                         {psychologist_id: (self.tomorrow, time(9, 30))})
+        self.assertEqual(index.first_free_in_window(self.tomorrow, day_after, time(12, 0)),
+                         {psychologist_id: (self.tomorrow, time(14, 0))})
+        # time_to is excluded, and the 08:00 slot is booked.
+        self.assertEqual(index.first_free_in_window(self.today, day_after, time(8, 0), time(9, 30)), {})
+        self.assertEqual(index.stats()['free_slots'], 2)
+
+    def test_free_psychologists_view_with_and_without_index(self):
+        params = {'date_from': self.tomorrow.isoformat(), 'time_from': '09:00', 'time_to': '12:00'}
+        expected = [{'psychologist_id': self.psychologist_user.id, 'date': self.tomorrow, 'time_slot': time(9, 30)}]
+
+        self.assertEqual(get_free_psychologists(dummy_request(self.session, params=params)), expected)
+
+        self.config.registry[AVAILABILITY_INDEX] = AvailabilityIndex.build(self.session, self.today)
+        with self.assert_query_budget(0):
+            self.assertEqual(get_free_psychologists(dummy_request(self.session, params=params)), expected)
+
+    def test_free_psychologists_limits_the_date_range(self):
+        self.config.registry.settings['availability.max_days'] = '7'
+        self.config.registry[AVAILABILITY_INDEX] = AvailabilityIndex.build(self.session, self.today)
+        params = {'date_from': self.tomorrow.isoformat(), 'date_to': '9999-12-31'}
+        with self.assertRaises(HTTPBadRequest):
+            get_free_psychologists(dummy_request(self.session, params=params))
+
+        params['date_to'] = (self.tomorrow + timedelta(days=6)).isoformat()
+        self.assertEqual(len(get_free_psychologists(dummy_request(self.session, params=params))), 1)
+
+    def test_write_views_sync_the_index_on_commit(self):
+        index = self.config.registry[AVAILABILITY_INDEX] = AvailabilityIndex.build(self.session, self.today)
+        day_after = self.tomorrow + timedelta(days=1)
+        # The commits below detach the fixtures.
+        psychologist_id, client_id = self.psychologist_user.id, self.client_user.id
+
+        request = dummy_request(self.session, authenticated_userid=psychologist_id,
+                                json_body={'date': day_after.isoformat(), 'time_slot': '10:00'})
+        schedule_id = add_schedule(request)['id']
+        request = dummy_request(self.session, authenticated_userid=client_id,
+                                json_body={'schedule_id': schedule_id})
+        create_booking(request)
+        self.assertEqual(index.stats()['free_slots'], 2)  # nothing applied before the commit
+
+        transaction.commit()
+        self.transaction = transaction.begin()
+        # Added and then booked within the transaction: still not free.
+        self.assertEqual(index.first_free_in_window(day_after, day_after), {})
+
+        request = dummy_request(self.session, authenticated_userid=psychologist_id,
+                                json_body={'date': day_after.isoformat(), 'time_slot': '11:00'})
+        add_schedule(request)
+        transaction.commit()
+        self.transaction = transaction.begin()
+        self.assertEqual(index.first_free_in_window(day_after, day_after),
+                         {psychologist_id: (day_after, time(11, 0))})
+
+    def test_sync_applies_the_day_as_committed(self):
+        index = self.config.registry[AVAILABILITY_INDEX] = AvailabilityIndex.build(self.session, self.today)
+        day_after = self.tomorrow + timedelta(days=1)
+        psychologist_id = self.psychologist_user.id
+
+        request = dummy_request(self.session, authenticated_userid=psychologist_id,
+                                json_body={'date': day_after.isoformat(), 'time_slot': '10:00'})
+        schedule_id = add_schedule(request)['id']
+        # Another write booking the slot, whose own refresh ran before this
+        # one: the day must end up as committed, not as add_schedule saw it.
+        self.session.query(Schedule).filter(Schedule.id == schedule_id).update({'is_booked': True})
+        transaction.commit()
+        self.transaction = transaction.begin()
+        self.assertEqual(index.first_free_in_window(day_after, day_after), {})
+
+
+class TestEngineProfiles(FileDatabaseTest):
+    """Tests for the engine profiles applied by get_engine."""
+
+    def setUp(self):
+        self.db_url = self.temp_database_url()
+
+    def get_engine(self, url=None, **settings):
+        from .models import get_engine
+        settings = {'sqlalchemy.' + key: value for key, value in settings.items()}
+        settings['sqlalchemy.url'] = url or self.db_url
+        engine = get_engine(settings)
+        self.addCleanup(engine.dispose)
+        return engine
+
+    def pragma(self, engine, name):
+        with engine.connect() as connection:
+            return connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+    def test_web_profile_tunes_pool_and_sqlite(self):
+        engine = self.get_engine(profile='web')
+        self.assertEqual(self.pragma(engine, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(engine, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(engine, 'busy_timeout'), 5000)
+        self.assertEqual(engine.pool.size(), 10)
+        self.assertTrue(engine.pool._pre_ping)
+
+    def test_settings_override_the_profile(self):
+        engine = self.get_engine(profile='web', pool_size='3', **{'sqlite.synchronous': 'FULL'})
+        self.assertEqual(self.pragma(engine, 'synchronous'), 2)
+        self.assertEqual(engine.pool.size(), 3)
+
+    def test_default_profile_and_in_memory_database_are_untouched(self):
+        self.assertEqual(self.pragma(self.get_engine(), 'journal_mode'), 'delete')
+        engine = self.get_engine(url='sqlite://', profile='web')
+        self.assertEqual(self.pragma(engine, 'journal_mode'), 'memory')
+        self.assertEqual(self.pragma(engine, 'busy_timeout'), 5000)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            self.get_engine(profile='turbo')
+
+
+class TestReplicaRouting(FileDatabaseTest):
+    """Safe reads go to the replica, writes and read-your-writes to the primary."""
+
+    def setUp(self):
+        self.config = testing.setUp(settings={
+            'sqlalchemy.url': self.temp_database_url(),
+            'replicas': 'r1',
+            'replica.r1.url': self.temp_database_url(),
+        })
+        self.config.include('.models')
+        self.registry = self.config.registry
+        self.primary = self.registry['dbsession_factory']
+        self.replica = next(self.registry['replica_session_factories'])
+
+    def tearDown(self):
+        testing.tearDown()
+        for factory in (self.primary, self.replica):
+            factory.kw['bind'].dispose()
+
+    def make_request(self, method='GET', route='schedules', cookies=None):
+        request = testing.DummyRequest(method=method, cookies=cookies or {})
+        request.matched_route = testing.DummyResource(name=route)
+        return request
+
+    def test_safe_reads_of_replica_routes_use_the_replica(self):
+        from .models import request_session_factory
+        self.assertIs(request_session_factory(self.make_request()), self.replica)
+        self.assertIs(request_session_factory(self.make_request(route='psychologists_search')), self.replica)
+
+    def test_writes_details_and_recent_writers_use_the_primary(self):
+        from .models import PRIMARY_COOKIE, request_session_factory
+        self.assertIs(request_session_factory(self.make_request(method='POST')), self.primary)
+        self.assertIs(request_session_factory(self.make_request(route='booking_detail')), self.primary)
+        self.assertIs(request_session_factory(self.make_request(route='psychologist_detail')), self.primary)
+        self.assertIs(request_session_factory(self.make_request(route='psychologists_with_available_schedules')), self.primary)
+        self.assertIs(request_session_factory(self.make_request(cookies={PRIMARY_COOKIE: '1'})), self.primary)
+
+    def test_write_sets_the_read_your_writes_cookie(self):
+        from .models import PRIMARY_COOKIE, get_dbsession
+        request = self.make_request(method='POST')
+        request.tm = transaction.TransactionManager(explicit=True)
+        request.tm.begin()
+        session = get_dbsession(request)
+        self.assertIs(session.bind, self.primary.kw['bind'])
+        request.tm.abort()
+
+        response = Response()
+        for callback in request.response_callbacks:
+            callback(request, response)
+        self.assertIn(f'{PRIMARY_COOKIE}=1', response.headers['Set-Cookie'])
+        self.assertIn('Max-Age=5', response.headers['Set-Cookie'])
+
+    def test_read_only_post_does_not_stick_to_primary(self):
+        from .models import get_dbsession
+        request = self.make_request(method='POST', route='batch')
+        request.tm = transaction.TransactionManager(explicit=True)
+        request.tm.begin()
+        get_dbsession(request)
+        request.tm.abort()
+        self.assertFalse(getattr(request, 'response_callbacks', None))
+
+    def test_list_view_reads_replica_data(self):
+        from .models import get_dbsession
+        psychologist_id = str(uuid.uuid4())
+        for factory in (self.primary, self.replica):
+            Base.metadata.create_all(factory.kw['bind'])
+        # Only the replica has the row, which makes the routing visible.
+        session = self.replica()
+        session.add(User(id=psychologist_id, username="replica_psy", email="replica@example.com", role="psychologist", password="x"))
+        session.add(Schedule(id=str(uuid.uuid4()), psychologist_id=psychologist_id, date=datetime.utcnow().date() + timedelta(days=1), time_slot=time(9, 0), is_booked=False))
+        session.commit()
+        session.close()
+
+        request = self.make_request(route='psychologists_search')
+        request.tm = transaction.TransactionManager(explicit=True)
+        request.tm.begin()
+        request.dbsession = get_dbsession(request)
+        try:
+            self.assertEqual(len(search_available_schedules(request)), 1)
+        finally:
+            request.tm.abort()
+
+    def test_availability_index_is_built_from_the_primary(self):
+        from .availability import get_availability_index
+        psychologist_id = str(uuid.uuid4())
+        for factory in (self.primary, self.replica):
+            Base.metadata.create_all(factory.kw['bind'])
+        # Only the primary has the slot, as when the replica lags behind.
+        session = self.primary()
+        session.add(User(id=psychologist_id, username="primary_psy", email="primary@example.com", role="psychologist", password="x"))
+        session.add(Schedule(id=str(uuid.uuid4()), psychologist_id=psychologist_id, date=datetime.utcnow().date() + timedelta(days=1), time_slot=time(9, 0), is_booked=False))
+        session.commit()
+        session.close()
+
+        self.registry[AVAILABILITY_INDEX] = AvailabilityIndex(datetime.utcnow().date())
+        request = self.make_request(route='psychologists_free')
+        request.dbsession = self.replica()
+        try:
+            self.assertEqual(get_availability_index(request).stats()['free_slots'], 1)
+        finally:
+            request.dbsession.close()
+
+
+class TestConditionalGets(BaseTest):
+    """Tests for ETags and If-None-Match on the detail endpoints."""
+
+    def revalidate(self, view, etag, **kwargs):
+        request = dummy_request(self.session, **kwargs)
+        request.headers['If-None-Match'] = f'"{etag}"'
+        return view(request), request
+
+    def test_booking_not_modified_after_version_lookup(self):
+        kwargs = dict(authenticated_userid=self.client_user.id, matchdict={'id': self.booking_client_confirmed.id})
+        request = dummy_request(self.session, **kwargs)
+        get_booking(request)
+        etag = request.response.etag
+        self.assertTrue(etag)
+
+        with self.assert_query_budget(2):  # the caller, then the versions
+            with self.assertRaises(HTTPNotModified) as cm:
+                self.revalidate(get_booking, etag, **kwargs)
+        self.assertEqual(cm.exception.headers['ETag'], f'"{etag}"')
+
+        self.booking_client_confirmed.status = 'rejected'
+        self.session.flush()
+        data, request = self.revalidate(get_booking, etag, **kwargs)
+        self.assertEqual(data['status'], 'rejected')
+        self.assertNotEqual(request.response.etag, etag)
+
+    def test_booking_revalidation_still_checks_permission(self):
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id,
+                                matchdict={'id': self.booking_client_confirmed.id})
+        get_booking(request)
+        other = User(id=str(uuid.uuid4()), username='other', email='other@example.com', role='client', password='x')
+        self.session.add(other)
+        self.session.flush()
+        with self.assertRaises(HTTPUnauthorized):
+            self.revalidate(get_booking, request.response.etag, authenticated_userid=other.id,
+                            matchdict={'id': self.booking_client_confirmed.id})
+
+    def test_schedule_etag_follows_its_bookings(self):
+        matchdict = {'id': self.schedule_psy_booked.id}
+        request = dummy_request(self.session, matchdict=matchdict)
+        get_schedule(request)
+        etag = request.response.etag
+        with self.assertRaises(HTTPNotModified):
+            self.revalidate(get_schedule, etag, matchdict=matchdict)
+
+        self.client_user.username = 'renamed_client'  # shown in the current booking
+        self.session.flush()
+        data, request = self.revalidate(get_schedule, etag, matchdict=matchdict)
+        self.assertEqual(data['current_booking']['client_details']['username'], 'renamed_client')
+        self.assertNotEqual(request.response.etag, etag)
+
+        with self.assertRaises(HTTPNotFound):
+            self.revalidate(get_schedule, etag, matchdict={'id': 'missing'})
+
+    def test_psychologist_etag_follows_schedules_and_reviews(self):
+        matchdict = {'id': self.psychologist_user.id}
+        self.schedule_psy_available.date = date.today() + timedelta(days=1)
+        self.session.flush()
+        request = dummy_request(self.session, matchdict=matchdict)
+        get_psychologist_detail(request)
+        etag = request.response.etag
+        with self.assert_query_budget(1):
+            with self.assertRaises(HTTPNotModified):
+                self.revalidate(get_psychologist_detail, etag, matchdict=matchdict)
+
+        self.schedule_psy_available.is_booked = True
+        self.session.flush()
+        data, request = self.revalidate(get_psychologist_detail, etag, matchdict=matchdict)
+        self.assertEqual(data['available_schedules'], [])
+        etag = request.response.etag
+
+        self.session.add(Review(id=str(uuid.uuid4()), booking_id=self.booking_client_confirmed.id,
+                                psychologist_id=self.psychologist_user.id, rating=4, comment='Fine'))
+        self.session.flush()
+        data, request = self.revalidate(get_psychologist_detail, etag, matchdict=matchdict)
+        self.assertEqual(data['reviews'][0]['comment'], 'Fine')
+        self.assertNotEqual(request.response.etag, etag)
+
+
+class TestConditionalWrites(BaseTest):
+    """Tests for If-Match on schedule and booking writes."""
+
+    def write(self, view, etag=None, **kwargs):
+        request = dummy_request(self.session, **kwargs)
+        if etag:
+            request.headers['If-Match'] = f'"{etag}"'
+        return view(request), request
+
+    def current_etag(self, view, **kwargs):
+        return self.write(view, **kwargs)[1].response.etag
+
+    def test_schedule_write_with_stale_etag_is_rejected(self):
+        kwargs = dict(authenticated_userid=self.psychologist_user.id, matchdict={'id': self.schedule_psy_available.id})
+        etag = self.current_etag(get_schedule, **kwargs)
+
+        _, request = self.write(update_schedule, etag, json_body={'time_slot': '12:00'}, **kwargs)
+        new_etag = request.response.etag
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual(new_etag, self.current_etag(get_schedule, **kwargs))
+
+        with self.assertRaises(HTTPPreconditionFailed) as cm:
+            self.write(update_schedule, etag, json_body={'time_slot': '13:00'}, **kwargs)
+        self.assertEqual(cm.exception.headers['ETag'], f'"{new_etag}"')
+        self.assertEqual(self.schedule_psy_available.time_slot, time(12, 0))
+
+        with self.assertRaises(HTTPPreconditionFailed):
+            self.write(delete_schedule, etag, **kwargs)
+        self.write(delete_schedule, new_etag, **kwargs)
+        self.assertIsNone(self.session.get(Schedule, self.schedule_psy_available.id))
+
+    def test_booking_write_with_stale_etag_is_rejected(self):
+        booking_id = self.booking_client_confirmed.id
+        kwargs = dict(authenticated_userid=self.psychologist_user.id, matchdict={'id': booking_id})
+        etag = self.current_etag(get_booking, **kwargs)
+
+        self.write(update_booking_status, json_body={'status': 'rejected'}, **kwargs)
+        with self.assertRaises(HTTPPreconditionFailed):
+            self.write(update_booking_status, etag, json_body={'status': 'rejected'}, **kwargs)
+        with self.assertRaises(HTTPPreconditionFailed):
+            self.write(delete_booking, etag, **kwargs)
+        self.write(delete_booking, self.current_etag(get_booking, **kwargs), **kwargs)
+        self.assertIsNone(self.session.get(Booking, booking_id))
+
+
+class TestOptimisticLocking(FileDatabaseTest):
+    """A write landing between a view's load and its flush, on a shared on-disk database."""
+
+    def setUp(self):
+        self.engine, self.session_factory = self.create_file_database()
+        self.config = testing.setUp()
+
+        session = self.session_factory()
+        self.psychologist_id = str(uuid.uuid4())
+        self.schedule_id = str(uuid.uuid4())
+        session.add(User(id=self.psychologist_id, username='lock_psy', email='lock_psy@example.com', role='psychologist', password='x'))
+        session.add(Schedule(id=self.schedule_id, psychologist_id=self.psychologist_id, date=date(2026, 3, 1), time_slot=time(10, 0)))
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def concurrent_time_slot(self, time_slot):
+        from .models import get_tm_session
+        tm = transaction.TransactionManager(explicit=True)
+        with tm:
+            get_tm_session(self.session_factory, tm).get(Schedule, self.schedule_id).time_slot = time_slot
+
+    def test_stale_flush_answers_412_without_writing(self):
+        from .models import get_tm_session
+        tm = transaction.TransactionManager(explicit=True)
+        tm.begin()
+        session = get_tm_session(self.session_factory, tm)
+        event.listen(session, 'before_flush', lambda *args: self.concurrent_time_slot(time(9, 0)), once=True)
+        request = dummy_request(session, authenticated_userid=self.psychologist_id,
+                                json_body={'time_slot': '11:00'}, matchdict={'id': self.schedule_id})
+        request.tm = tm
+        with self.assertRaises(HTTPPreconditionFailed):
+            update_schedule(request)
+        tm.abort()
+
+        session = self.session_factory()
+        schedule = session.get(Schedule, self.schedule_id)
+        self.assertEqual((schedule.time_slot, schedule.version), (time(9, 0), 2))
+        session.close()
+
+
+class TestBatch(FileDatabaseTest):
+    """POST /batch through the router, with a testing security policy for the caller."""
+
+    def setUp(self):
+        from pyramid.config import Configurator
+        from webtest import TestApp
+        from .models import get_session_factory
+        self.config = Configurator(settings={
+            'sqlalchemy.url': self.temp_database_url(),
+            'batch.max_requests': '6',
+        })
+        for module in ('.renderers', '.models', '.security', '.caching', '.availability', '.events', '.routes'):
+            self.config.include(module)
+        self.config.add_request_method(get_request_user, 'user', reify=True)
+        self.config.scan('.views')
+        self.engine = self.config.registry['dbsession_factory'].kw['bind']
+        Base.metadata.create_all(self.engine)
+
+        session = get_session_factory(self.engine)()
+        self.psychologist_id, self.client_id = str(uuid.uuid4()), str(uuid.uuid4())
+        self.schedule_id = str(uuid.uuid4())
+        session.add_all([
+            User(id=self.psychologist_id, username='batch_psy', email='batch_psy@example.com', role='psychologist', password='x'),
+            User(id=self.client_id, username='batch_client', email='batch_client@example.com', role='client', password='x'),
+            Schedule(id=self.schedule_id, psychologist_id=self.psychologist_id, date=date(2031, 1, 1), time_slot=time(9, 0)),
+            Schedule(psychologist_id=self.psychologist_id, date=date(2031, 1, 2), time_slot=time(9, 0)),
+        ])
+        session.commit()
+        session.close()
+
+        self.config.testing_securitypolicy(userid=self.client_id)
+        self.app = TestApp(self.config.make_wsgi_app())
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def batch(self, requests, status=200):
+        return self.app.post_json('/batch', {'requests': requests}, status=status).json
+
+    def test_responses_come_back_in_order(self):
+        etag = self.app.get(f'/schedules/{self.schedule_id}').headers['ETag']
+        responses = self.batch([
+            {'path': '/schedules?limit=1'},
+            {'path': f'/schedules/{self.schedule_id}', 'headers': {'If-None-Match': etag}},
+            {'path': '/bookings'},
+            {'path': '/missing'},
+            {'path': '/events'},
+            {'path': '/schedules?stream=true'},
+        ])['responses']
+
+        self.assertEqual([r['status'] for r in responses], [200, 304, 200, 404, 400, 400])
+        self.assertEqual(len(responses[0]['body']), 1)
+        self.assertIn('X-Next-Cursor', responses[0]['headers'])
+        self.assertEqual(responses[1], {'status': 304, 'headers': {'ETag': etag}, 'body': None})
+        self.assertEqual(responses[2]['body'], [])  # as the authenticated client
+
+    def test_batch_limits(self):
+        self.assertIn('At most 6', self.batch([{'path': '/bookings'}] * 7, status=400)['error'])
+        self.batch([{'path': '/bookings', 'method': 'POST'}], status=400)
+        self.batch([{'path': 'http://example.com/'}], status=400)
+
+        self.config.registry.settings['batch.max_statements'] = '1'
+        responses = self.batch([{'path': '/bookings'}, {'path': '/bookings'}])['responses']
+        self.assertEqual([r['status'] for r in responses], [200, 503])
+
+
+class TestBookingEvents(BaseTest):
+    """Tests for the booking event hub and the /events stream."""
+
+    def setUp(self):
+        super().setUp()
+        self.hub = self.config.registry[EVENT_HUB] = EventHub(max_streams=2, history=10)
+
+    def test_events_reach_only_their_users(self):
+        mine = self.hub.subscribe('client-1')
+        other = self.hub.subscribe('client-2')
+        self.hub.publish(['client-1', 'psy-1'], 'booking.updated', b'{"id":"b1"}')
+        self.assertEqual(mine.queue.get_nowait(), b'id: 1\nevent: booking.updated\ndata: {"id":"b1"}\n\n')
+        self.assertTrue(other.queue.empty())
+
+    def test_reconnect_replays_missed_events(self):
+        for i in range(3):
+            self.hub.publish(['client-1'], 'booking.updated', b'{}')
+        subscription = self.hub.subscribe('client-1', last_event_id=1)
+        self.assertEqual(subscription.queue.qsize(), 2)
+
+    def test_stream_limit_and_unsubscribe(self):
+        subscriptions = [self.hub.subscribe('client-1'), self.hub.subscribe('client-1')]
+        self.assertIsNone(self.hub.subscribe('client-1'))
+        self.hub.unsubscribe(subscriptions[0])
+        self.assertIsNotNone(self.hub.subscribe('client-1'))
+
+    def test_stream_sends_events_and_heartbeats_then_ends(self):
+        subscription = self.hub.subscribe('client-1')
+        self.hub.publish(['client-1'], 'booking.created', b'{}')
+        stream = EventStream(self.hub, subscription, duration=60, heartbeat=60)
+        frames = iter(stream)
+        body = [next(frames), next(frames)]
+        stream.close()
+        self.assertEqual(self.hub.stream_count(), 0)
+        self.assertEqual(body[0], b'retry: 1000\n\n')
+        self.assertIn(b'event: booking.created', body[1])
+
+        subscription = self.hub.subscribe('client-1')
+        body = list(EventStream(self.hub, subscription, duration=0.03, heartbeat=0.01))
+        self.assertIn(b': keepalive\n\n', body)
+
+    def test_booking_writes_publish_after_commit(self):
+        client_id, psychologist_id = self.client_user.id, self.psychologist_user.id
+        subscription = self.hub.subscribe(psychologist_id)
+
+        request = dummy_request(self.session, authenticated_userid=client_id,
+                                json_body={'schedule_id': self.schedule_psy_available.id})
+        booking_id = create_booking(request)['id']
+        self.assertTrue(subscription.queue.empty())  # not before the commit
+
+        transaction.commit()
+        self.transaction = transaction.begin()
+        frame = subscription.queue.get_nowait()
+        self.assertIn(b'event: booking.created', frame)
+        self.assertIn(booking_id.encode(), frame)
+
+        request = dummy_request(self.session, authenticated_userid=psychologist_id,
+                                json_body={'status': 'confirmed'}, matchdict={'id': booking_id})
+        update_booking_status(request)
+        self.transaction.abort()
+        self.transaction = transaction.begin()
+        self.assertTrue(subscription.queue.empty())  # rolled back, nothing sent
+
+    def test_events_view(self):
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id)
+        response = booking_events(request)
+        self.assertEqual(response.content_type, 'text/event-stream')
+        self.assertEqual(self.hub.stream_count(), 1)
+        response.app_iter.close()
+        self.assertEqual(self.hub.stream_count(), 0)
+
+    def test_events_view_falls_back_to_polling_when_full(self):
+        self.hub.max_streams = 0
+        self.hub.publish([self.client_user.id], 'booking.created', b'{}')
+        self.hub.publish(['someone-else'], 'booking.created', b'{}')
+
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id)
+        response = booking_events(request)
+        self.assertEqual(response.content_type, 'text/event-stream')
+        self.assertEqual(response.body, b'retry: 10000\n\nid: 2\n\n')  # no history without Last-Event-ID
+        self.assertEqual(self.hub.stream_count(), 0)
+
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id)
+        request.headers['Last-Event-ID'] = '0'
+        body = booking_events(request).body
+        self.assertIn(b'id: 1\nevent: booking.created', body)
+        self.assertTrue(body.endswith(b'id: 2\n\n'))
+
+
+class TestJSONRenderer(unittest.TestCase):
+    """Tests for the json renderer built from the json.* settings."""
+
+    value = {
+        'date': date(2025, 12, 25),
+        'time_slot': time(9, 30),
+        'created_at': datetime(2025, 12, 1, 8, 15, 30, 123456),
+        'items': [1, None, True],
+    }
+    expected = {
+        'date': '2025-12-25',
+        'time_slot': '09:30',
+        'created_at': '2025-12-01T08:15:30.123456',
+        'items': [1, None, True],
+    }
+
+    def render(self, **settings):
+        renderer = json_renderer_from_settings(settings)(None)
+        request = testing.DummyRequest()
+        request.response = Response()
+        body = renderer(self.value, {'request': request})
+        self.assertEqual(request.response.content_type, 'application/json')
+        return body.decode('utf-8') if isinstance(body, bytes) else body
+
+    def test_compact_stdlib(self):
+        body = self.render(**{'json.encoder': 'json'})
+        self.assertNotIn(' ', body.replace('"2025', ''))
+        self.assertEqual(json.loads(body), self.expected)
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_matches_stdlib(self):
+        self.assertEqual(self.render(**{'json.encoder': 'orjson'}), self.render(**{'json.encoder': 'json'}))
+
+    def test_pretty(self):
+        body = self.render(**{'json.pretty': 'true'})
+        self.assertIn('\n    "date": "2025-12-25"', body)
+        self.assertEqual(json.loads(body), self.expected)
+
+    def test_other_objects_use_json_method(self):
+        class Point:
+            def __json__(self, request):
+                return [1, 2]
+        for encoder in ('json', 'auto'):
+            renderer = json_renderer_from_settings({'json.encoder': encoder})(None)
+            self.assertEqual(json.loads(renderer({'p': Point()}, {})), {'p': [1, 2]})
+
+    def test_unknown_encoder(self):
+        with self.assertRaises(ValueError):
+            json_renderer_from_settings({'json.encoder': 'yaml'})
+
+
+class TestProjections(BaseTest):
+    """The column-projected payloads must match the models' to_dict()."""
+
+    def setUp(self):
+        super().setUp()
+        # A booked slot whose only booking is pending, and an older rejected
+        # booking next to the confirmed one.
+        self.schedule_pending = Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=date(2025, 12, 27), time_slot=time(9, 0), is_booked=True)
+        self.session.add(self.schedule_pending)
+        self.session.flush()
+        self.session.add_all([
+            Booking(id=str(uuid.uuid4()), client_id=self.client_user.id, schedule_id=self.schedule_pending.id, status="pending", created_at=datetime.utcnow()),
+            Booking(id=str(uuid.uuid4()), client_id=self.client_user.id, schedule_id=self.schedule_psy_booked.id, status="rejected", created_at=datetime.utcnow() - timedelta(days=1)),
+        ])
+        self.session.flush()
+        self.session.expire_all()
+
+    def test_schedule_rows_match_to_dict(self):
+        rows = self.session.query(*SCHEDULE_COLUMNS).order_by(Schedule.id).all()
+        expected = [s.to_dict() for s in self.session.query(Schedule).order_by(Schedule.id)]
+        self.assertEqual(schedule_rows_to_dicts(self.session, rows), expected)
+        self.assertEqual(sum('current_booking' in d for d in expected), 2)
+
+    def test_review_rows_match_to_dict(self):
+        rows = self.session.query(*REVIEW_COLUMNS).order_by(Review.id).all()
+        expected = [r.to_dict() for r in self.session.query(Review).order_by(Review.id)]
+        self.assertEqual([review_row_to_dict(row) for row in rows], expected)
+
+    def test_list_schedules_statements_do_not_grow_with_rows(self):
+        for i in range(20):
+            schedule = Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=date(2026, 2, 1), time_slot=time(8, i), is_booked=True)
+            self.session.add(schedule)
+            self.session.add(Booking(id=str(uuid.uuid4()), client_id=self.client_user.id, schedule_id=schedule.id, status="confirmed", created_at=datetime.utcnow()))
+        self.session.flush()
+        request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id)
+        request.user  # not part of the count
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(self.engine, 'before_cursor_execute', listener)
+        try:
+            response = list_schedules(request)
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', listener)
+        self.assertEqual(len(response), 23)
+        self.assertEqual(len(statements), 2)  # the page, then its current bookings
+
+
+class TestFieldsets(BaseTest):
+    """Tests for ?fields= and ?include= on the booking and schedule endpoints."""
+
+    def setUp(self):
+        super().setUp()
+        self.session.expunge_all()
+
+    @contextmanager
+    def statements(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(self.engine, 'before_cursor_execute', listener)
+        try:
+            yield statements
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', listener)
+
+    def request(self, userid=None, **params):
+        request = dummy_request(self.session, authenticated_userid=userid, params=params,
+                                matchdict=params.pop('matchdict', None))
+        request.user  # not part of the statements
+        return request
+
+    def test_thin_booking_list_skips_the_joins(self):
+        request = self.request(self.client_user.id, fields='status', include='')
+        with self.statements() as statements:
+            data = list_bookings(request)
+        self.assertEqual(data, [{'id': self.booking_client_confirmed.id, 'status': 'confirmed'}])
+        self.assertEqual(len(statements), 1, statements)
+        self.assertNotIn('JOIN', statements[0])
+
+    def test_booking_include_follows_dotted_paths(self):
+        request = self.request(self.psychologist_user.id, include='schedule.psychologist')
+        with self.assert_query_budget(1):
+            [data] = list_bookings(request)
+        self.assertNotIn('client_details', data)
+        self.assertEqual(data['schedule']['id'], self.schedule_psy_booked.id)
+        self.assertEqual(data['schedule']['psychologist']['username'], 'test_psychologist')
+        self.assertNotIn('current_booking', data['schedule'])
+
+        request = self.request(self.client_user.id, matchdict={'id': self.booking_client_confirmed.id},
+                               fields='status', include='client')
+        self.assertEqual(set(get_booking(request)), {'id', 'status', 'client_details'})
+
+    def test_unknown_names_are_rejected(self):
+        for params in ({'fields': 'status,secret'}, {'include': 'reviews'}):
+            with self.assertRaises(HTTPBadRequest):
+                list_bookings(self.request(self.client_user.id, **params))
+            with self.assertRaises(HTTPBadRequest):
+                list_schedules(self.request(self.client_user.id, **params))
+
+    def test_schedule_list_queries_only_what_is_included(self):
+        request = self.request(self.client_user.id, include='')
+        with self.statements() as statements:
+            data = list_schedules(request)
+        self.assertEqual(len(statements), 1)
+        self.assertFalse(any('current_booking' in d for d in data))
+
+        request = self.request(self.client_user.id, include='current_booking,psychologist')
+        with self.statements() as statements:
+            data = list_schedules(request)
+        self.assertEqual(len(statements), 3)  # the page, current bookings, psychologists
+        self.assertNotIn('users', statements[1])
+        booked = next(d for d in data if d['is_booked'])
+        self.assertNotIn('client_details', booked['current_booking'])
+        self.assertEqual(booked['psychologist']['id'], self.psychologist_user.id)
+
+    def test_schedule_rows_match_to_dict_for_every_include(self):
+        rows = self.session.query(*SCHEDULE_COLUMNS).order_by(Schedule.id).all()
+        for include in (frozenset(), {'current_booking'}, {'psychologist'}, Schedule.DEFAULT_INCLUDE):
+            expected = [s.to_dict(include) for s in self.session.query(Schedule).order_by(Schedule.id)]
+            self.assertEqual(schedule_rows_to_dicts(self.session, rows, include), expected)
+
+    def test_etag_is_per_representation(self):
+        matchdict = {'id': self.schedule_psy_booked.id}
+        full, thin = self.request(matchdict=matchdict), self.request(matchdict=matchdict, include='')
+        get_schedule(full)
+        self.assertEqual(set(get_schedule(thin)), {'id', 'psychologist_id', 'date', 'time_slot', 'is_booked'})
+        self.assertNotEqual(full.response.etag, thin.response.etag)
+
+        # The client only shows up in the full representation.
+        client = self.session.get(User, self.client_user.id)
+        client.username = 'renamed_client'
+        self.session.flush()
+        for params, etag in (({}, full.response.etag), ({'include': ''}, thin.response.etag)):
+            request = self.request(matchdict=matchdict, **params)
+            request.headers['If-None-Match'] = f'"{etag}"'
+            if params:
+                with self.assertRaises(HTTPNotModified):
+                    get_schedule(request)
+            else:
+                self.assertEqual(get_schedule(request)['current_booking']['client_details']['username'], 'renamed_client')
+
+    def test_write_preconditions_use_the_requested_representation(self):
+        params = dict(matchdict={'id': self.schedule_psy_available.id}, fields='time_slot', include='')
+        request = self.request(**params)
+        get_schedule(request)
+        etag = request.response.etag
+
+        request = self.request(self.psychologist_user.id, **params)
+        request.json_body = {'time_slot': '12:00'}
+        request.headers['If-Match'] = f'"{etag}"'
+        self.assertEqual(set(update_schedule(request)), {'id', 'time_slot'})
+        self.assertNotEqual(request.response.etag, etag)
+
+
+class TestQueryBudgets(BaseTest):
+    """Statements per view must not grow with the number of rows returned."""
+
+    ROWS = 10
+
+    def setUp(self):
+        super().setUp()
+        start = datetime.utcnow().date() + timedelta(days=1)
+        for i in range(self.ROWS):
+            schedule = Schedule(id=str(uuid.uuid4()), psychologist_id=self.psychologist_user.id, date=start, time_slot=time(8, i), is_booked=i % 2 == 0)
+            self.session.add(schedule)
+            if schedule.is_booked:
+                booking = Booking(id=str(uuid.uuid4()), client_id=self.client_user.id, schedule_id=schedule.id, status="confirmed", created_at=datetime.utcnow())
+                self.session.add(booking)
+                self.session.add(Review(id=str(uuid.uuid4()), booking_id=booking.id, rating=4, comment=""))
+        self.session.flush()
+        # Views must not rely on objects the fixtures left in the session.
+        self.session.expunge_all()
+
+    def request(self, userid=None, **kw):
+        request = dummy_request(self.session, authenticated_userid=userid, **kw)
+        request.user  # loaded once per request; not part of the budgets
+        return request
+
+    def test_list_bookings(self):
+        for userid in (self.client_user.id, self.psychologist_user.id):
+            request = self.request(userid)
+            with self.assert_query_budget(1):
+                list_bookings(request)
+
+    def test_get_booking(self):
+        request = self.request(self.client_user.id, matchdict={'id': self.booking_client_confirmed.id})
+        with self.assert_query_budget(1):
+            get_booking(request)
+
+    def test_list_schedules(self):
+        request = self.request(self.client_user.id)
+        with self.assert_query_budget(2):
+            list_schedules(request)
+
+    def test_list_reviews(self):
+        request = self.request()
+        with self.assert_query_budget(1):
+            list_reviews(request)
+
+    def test_available_psychologists(self):
+        request = self.request()
+        with self.assert_query_budget(2):
+            get_psychologists_with_available_schedules(request)
+
+    def test_psychologist_detail(self):
+        request = self.request(matchdict={'id': self.psychologist_user.id})
+        with self.assert_query_budget(4):
+            get_psychologist_detail(request)
+
+    def test_lazy_loads_are_reported(self):
+        with collect() as stats:
+            for booking in self.session.query(Booking):
+                booking.to_dict()  # loads each client separately
+        self.assertEqual(stats.repeated(), [])  # one client: the identity map absorbs it
+
+        with collect() as stats:
+            for schedule in self.session.query(Schedule):
+                schedule.to_dict()  # loads each schedule's bookings separately
+        [(statement, count)] = stats.repeated()
+        self.assertIn('FROM bookings', statement)
+        self.assertGreaterEqual(count, self.ROWS // 2)
+
+    def test_failed_statements_leave_nothing_on_the_connection(self):
+        from sqlalchemy import text
+        from sqlalchemy.exc import OperationalError
+        with self.engine.connect() as connection:
+            with collect() as stats:
+                for _ in range(3):
+                    with self.assertRaises(OperationalError):
+                        connection.execute(text('SELECT * FROM missing_table'))
+                connection.execute(text('SELECT 1'))
+            # conn.info outlives pool check-in, so anything left here would pile up.
+            self.assertEqual(connection.info, {})
+        self.assertEqual(stats.count, 1)
+
+    def test_tween_reports_statements(self):
+        def handler(request):
+            for schedule in self.session.query(Schedule):
+                schedule.bookings
+            return Response()
+        tween = sql_stats_tween_factory(handler, self.config.registry)
+        with self.assertLogs('ruangpulih.sqlstats', 'WARNING') as logs:
+            response = tween(dummy_request(self.session))
+        self.assertGreater(int(response.headers[QUERY_COUNT_HEADER]), self.ROWS)
+        self.assertEqual(response.headers[REPEATED_QUERIES_HEADER], '1')
+        self.assertIn('Possible N+1', logs.output[0])
+
+    def test_tween_quiet_without_repeats(self):
+        tween = sql_stats_tween_factory(lambda request: Response(), self.config.registry)
+        response = tween(dummy_request(self.session))
+        self.assertEqual(response.headers[QUERY_COUNT_HEADER], '0')
+        self.assertNotIn(REPEATED_QUERIES_HEADER, response.headers)
+
+
+class TestMetrics(unittest.TestCase):
+    """Tests for the request metrics tween and its Prometheus output."""
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.metrics = RequestMetrics(['bookings'], buckets=(0.1, 1.0))
+        self.config.registry['request_metrics'] = self.metrics
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def test_histogram_is_cumulative(self):
+        for latency in (0.05, 0.5, 0.5, 3.0):
+            self.metrics.started()
+            self.metrics.finished('bookings', 200, latency, 0.01, 0.002, 100)
+        text = self.metrics.render()
+        self.assertIn('ruangpulih_request_duration_seconds_bucket{route="bookings",le="0.1"} 1\n', text)
+        self.assertIn('ruangpulih_request_duration_seconds_bucket{route="bookings",le="1.0"} 3\n', text)
+        self.assertIn('ruangpulih_request_duration_seconds_bucket{route="bookings",le="+Inf"} 4\n', text)
+        self.assertIn('ruangpulih_request_duration_seconds_count{route="bookings"} 4\n', text)
+        self.assertIn('ruangpulih_responses_total{route="bookings",status="200"} 4\n', text)
+        self.assertIn('ruangpulih_response_bytes_total{route="bookings"} 400\n', text)
+        self.assertIn('ruangpulih_requests_in_flight 0\n', text)
+
+    def test_tween_records_route_status_and_render_time(self):
+        def handler(request):
+            self.assertEqual(self.metrics.in_flight, 1)
+            request.matched_route = testing.DummyResource(name='bookings')
+            request.environ['ruangpulih.render_seconds'] = 0.25
+            return Response(body=b'[]', status=201)
+        tween = metrics_tween_factory(handler, self.config.registry)
+        tween(testing.DummyRequest())
+
+        route = self.metrics.routes['bookings']
+        self.assertEqual(route.count, 1)
+        self.assertEqual(route.statuses, {201: 1})
+        self.assertEqual(route.render_seconds, 0.25)
+        self.assertEqual(route.response_bytes, 2)
+        self.assertEqual(self.metrics.in_flight, 0)
+
+    def test_tween_records_unmatched_failures(self):
+        def handler(request):
+            raise RuntimeError('boom')
+        tween = metrics_tween_factory(handler, self.config.registry)
+        with self.assertRaises(RuntimeError):
+            tween(testing.DummyRequest())
+        self.assertEqual(self.metrics.routes['unmatched'].statuses, {500: 1})
+        self.assertEqual(self.metrics.in_flight, 0)
+
+    def test_view_only_answers_allowed_addresses(self):
+        self.config.registry['metrics_allowed_ips'] = frozenset(['127.0.0.1'])
+        request = testing.DummyRequest(client_addr='127.0.0.1')
+        self.assertIn(b'ruangpulih_requests_in_flight', metrics_view(request).body)
+        with self.assertRaises(HTTPForbidden):
+            metrics_view(testing.DummyRequest(client_addr='203.0.113.7'))
+
+
+class TestCORS(unittest.TestCase):
+    """Tests for the CORS tween and its settings."""
+
+    def setUp(self):
+        self.config = testing.setUp(settings={
+            'cors.allowed_origins': 'http://localhost:5173\nhttps://app.example.com',
+        })
+        self.handled = []
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def make_tween(self):
+        def handler(request):
+            self.handled.append(request)
+            return Response(body=b'[]')
+        return cors_tween_factory(handler, self.config.registry)
+
+    def make_request(self, method='GET', origin=None):
+        environ = {'REQUEST_METHOD': method}
+        if origin is not None:
+            environ['HTTP_ORIGIN'] = origin
+        return testing.DummyRequest(environ=environ)
+
+    def test_preflight_is_answered_without_calling_the_handler(self):
+        response = self.make_tween()(self.make_request('OPTIONS', 'https://app.example.com'))
+        self.assertEqual(self.handled, [])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.headers['Access-Control-Allow-Origin'], 'https://app.example.com')
+        self.assertEqual(response.headers['Access-Control-Allow-Credentials'], 'true')
+        self.assertEqual(response.headers['Access-Control-Max-Age'], '3600')
+        self.assertIn('DELETE', response.headers['Access-Control-Allow-Methods'])
+        self.assertEqual(response.headers['Vary'], 'Origin')
+
+    def test_preflight_from_unknown_origin_gets_no_grant(self):
+        response = self.make_tween()(self.make_request('OPTIONS', 'https://evil.example.com'))
+        self.assertEqual(self.handled, [])
+        self.assertNotIn('Access-Control-Allow-Origin', response.headers)
+        self.assertNotIn('Access-Control-Allow-Methods', response.headers)
+        self.assertEqual(response.headers['Vary'], 'Origin')
+
+    def test_actual_request_from_allowed_origin(self):
+        response = self.make_tween()(self.make_request('GET', 'http://localhost:5173'))
+        self.assertEqual(len(self.handled), 1)
+        self.assertEqual(response.headers['Access-Control-Allow-Origin'], 'http://localhost:5173')
+        self.assertIn('X-Next-Cursor', response.headers['Access-Control-Expose-Headers'])
+        self.assertNotIn('Access-Control-Allow-Methods', response.headers)
+        self.assertEqual(response.headers['Vary'], 'Origin')
+
+    def test_actual_request_without_allowed_origin(self):
+        tween = self.make_tween()
+        for origin in (None, 'https://evil.example.com'):
+            response = tween(self.make_request('GET', origin))
+            self.assertNotIn('Access-Control-Allow-Origin', response.headers)
+            self.assertEqual(response.headers['Vary'], 'Origin')
+
+    def test_wildcard_allows_any_origin_without_credentials(self):
+        self.config.registry.settings['cors.allowed_origins'] = '*'
+        tween = self.make_tween()
+        for method in ('OPTIONS', 'GET'):
+            response = tween(self.make_request(method, 'https://other.example.com'))
+            self.assertEqual(response.headers['Access-Control-Allow-Origin'], '*')
+            self.assertNotIn('Access-Control-Allow-Credentials', response.headers)
+
+        self.config.registry.settings['cors.allow_credentials'] = 'true'
+        with self.assertRaises(ValueError):
+            self.make_tween()
+
+    def test_preflight_allows_patch(self):
+        response = self.make_tween()(self.make_request('OPTIONS', 'https://app.example.com'))
+        self.assertIn('PATCH', response.headers['Access-Control-Allow-Methods'].split(', '))
+
+
+class TestQueryPlans(BaseTest):
+    """
+    Runs EXPLAIN QUERY PLAN on the SQL issued by the hot read views and fails
+    if any of them falls back to a full scan of a large table.
+    """
+
+    HOT_TABLES = ('schedules', 'bookings', 'reviews')
+    SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+?)(?:_\d+)?(?: AS \w+)?$')
+
+    def capture_selects(self, view, request):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        event.listen(self.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            view(request)
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', before_cursor_execute)
+        return statements
+
+    def assert_no_table_scan(self, view, request):
+        statements = self.capture_selects(view, request)
+        self.assertTrue(statements, f'{view.__name__} issued no SELECT statements')
+
+        connection = self.session.connection()
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            for row in plan:
+                match = self.SCAN_RE.match(row[-1])
+                if match and match.group(1) in self.HOT_TABLES:
+                    self.fail(f'{view.__name__} scans {match.group(1)}: {row[-1]}\n{statement}')
+
+    def test_psychologists_with_available_schedules_uses_index(self):
+        request = dummy_request(self.session)
+        self.assert_no_table_scan(get_psychologists_with_available_schedules, request)
+
+    def test_search_available_schedules_uses_index(self):
+        request = dummy_request(self.session, params={'date_to': '2030-01-01', 'time_from': '09:00', 'time_to': '12:00'})
+        self.assert_no_table_scan(search_available_schedules, request)
+
+    def test_psychologist_detail_uses_index(self):
+        request = dummy_request(self.session, matchdict={'id': self.psychologist_user.id})
+        self.assert_no_table_scan(get_psychologist_detail, request)
+
+    def test_list_schedules_page_uses_index(self):
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, params={'limit': '1'})
+        list_schedules(request)
+        cursor = request.response.headers['X-Next-Cursor']
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id, params={'limit': '1', 'cursor': cursor})
+        self.assert_no_table_scan(list_schedules, request)
+
+    def test_list_schedules_psychologist_page_uses_index(self):
+        request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id, params={'date_from': '2025-01-01'})
+        self.assert_no_table_scan(list_schedules, request)
+
+    def test_list_reviews_for_psychologist_uses_index(self):
+        request = dummy_request(self.session, params={'psychologist_id': self.psychologist_user.id, 'min_rating': '3'})
+        self.assert_no_table_scan(list_reviews, request)
+
+    def test_list_bookings_client_uses_index(self):
+        request = dummy_request(self.session, authenticated_userid=self.client_user.id)
+        self.assert_no_table_scan(list_bookings, request)
+
+    def test_list_bookings_psychologist_uses_index(self):
+        request = dummy_request(self.session, authenticated_userid=self.psychologist_user.id)
+        self.assert_no_table_scan(list_bookings, request)
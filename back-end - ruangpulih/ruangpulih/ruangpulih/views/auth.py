@@ -1,8 +1,9 @@
 from pyramid.view import view_config
 from pyramid.response import Response
-from pyramid.httpexceptions import HTTPBadRequest, HTTPConflict, HTTPUnauthorized
+from pyramid.httpexceptions import HTTPBadRequest, HTTPConflict, HTTPUnauthorized, HTTPServiceUnavailable
 from pyramid.security import remember, forget
 from ..models.user import User
+from ..hashing import get_password_hasher
 from uuid import uuid4
 
 def require_fields(data, required_fields):
@@ -42,7 +43,7 @@ def register(request):
         role=role_str
     )
     
-    new_user.set_password(password)
+    new_user.password = get_password_hasher(request).hash(password)
     request.dbsession.add(new_user)
 
     return {
@@ -63,10 +64,19 @@ def login(request):
     email = data['email']
     password = data['password']
     user = request.dbsession.query(User).filter_by(email=email).first()
+    hasher = get_password_hasher(request)
 
-    if not user or not user.check_password(password):
+    if not user or not hasher.verify(password, user.password):
         return HTTPUnauthorized(json_body={'error': 'Invalid credentials'})
 
+    # Upgrade hashes made with an old bcrypt.rounds setting while we have the
+    # plaintext; if the hasher is saturated, try again on a later login.
+    if hasher.needs_update(user.password):
+        try:
+            user.password = hasher.hash(password)
+        except HTTPServiceUnavailable:
+            pass
+
     headers = remember(request, user.id)
 
     return Response(
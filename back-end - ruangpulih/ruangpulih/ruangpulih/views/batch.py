@@ -0,0 +1,130 @@
+"""
+POST /batch: several GETs in one round trip.
+
+    {"requests": [{"path": "/bookings?limit=10"},
+                  {"path": "/psychologists/<id>", "headers": {"If-None-Match": "\\"...\\""}}]}
+
+answers
+
+    {"responses": [{"status": 200, "headers": {"X-Next-Cursor": "..."}, "body": [...]}, ...]}
+
+Sub-requests go through the router without the tween stack: they share the
+batch's authenticated user, database session and transaction, and skip the
+per-request auth-ticket parsing, CORS, metrics and transaction setup. Their
+JSON bodies are spliced into the batch response as rendered, not decoded
+and encoded again. Only paginated reads are batched: ``?stream=true`` lists
+and ``/events`` answer 400.
+"""
+import json
+import time
+
+from pyramid.httpexceptions import HTTPBadRequest, HTTPException
+from pyramid.interfaces import IRoutesMapper
+from pyramid.request import Request
+from pyramid.response import Response
+from pyramid.view import view_config
+
+from ..sqlstats import collect
+from ..streaming import wants_stream
+
+# Response headers passed on to the batch caller.
+BATCH_RESPONSE_HEADERS = ('ETag', 'X-Next-Cursor', 'X-Cache')
+
+# Routes that do not answer with a bounded JSON document.
+NON_BATCHABLE_ROUTES = frozenset({'events'})
+
+
+def parse_batch(request):
+    """The ``(path, headers)`` of each sub-request, validated and within ``batch.max_requests``."""
+    try:
+        entries = request.json_body['requests']
+    except (ValueError, KeyError, TypeError):
+        raise HTTPBadRequest(json_body={"error": "Expected {\"requests\": [...]}"})
+    if not isinstance(entries, list) or not entries:
+        raise HTTPBadRequest(json_body={"error": "requests must be a non-empty list"})
+
+    max_requests = int(request.registry.settings.get('batch.max_requests', 20))
+    if len(entries) > max_requests:
+        raise HTTPBadRequest(json_body={"error": f"At most {max_requests} requests per batch"})
+
+    parsed = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise HTTPBadRequest(json_body={"error": "Each request must be an object"})
+        path = entry.get('path')
+        headers = entry.get('headers') or {}
+        if not isinstance(path, str) or not path.startswith('/') or path.startswith('//'):
+            raise HTTPBadRequest(json_body={"error": "Each request needs a path starting with /"})
+        if entry.get('method', 'GET').upper() != 'GET':
+            raise HTTPBadRequest(json_body={"error": "Only GET requests can be batched"})
+        if not isinstance(headers, dict) or not all(isinstance(v, str) for v in headers.values()):
+            raise HTTPBadRequest(json_body={"error": "headers must map names to strings"})
+        parsed.append((path, headers))
+    return parsed
+
+
+def make_subrequest(request, path, headers):
+    """A GET for ``path`` that shares the batch's user, session and transaction."""
+    subrequest = Request.blank(path, base_url=request.application_url, headers=headers)
+    subrequest.accept = 'application/json'
+    subrequest.tm = request.tm
+    subrequest.dbsession = request.dbsession
+    subrequest.user = request.user
+    return subrequest
+
+
+def run_subrequest(request, subrequest):
+    route = request.registry.getUtility(IRoutesMapper)(subrequest)['route']
+    if route is not None and (route.name in NON_BATCHABLE_ROUTES or route.name.startswith('__')):
+        return HTTPBadRequest(json_body={"error": "This path cannot be batched"})
+    # A streamed list is unbounded and read past the batch's work limits.
+    if wants_stream(subrequest):
+        return HTTPBadRequest(json_body={"error": "stream=true cannot be batched; page with limit and cursor"})
+    try:
+        return request.invoke_subrequest(subrequest, use_tweens=False)
+    except HTTPException as exc:
+        exc.prepare(subrequest.environ)  # a JSON body for errors raised without one
+        return exc
+
+
+def response_entry(response):
+    """One element of ``responses``, as JSON bytes."""
+    headers = {name: response.headers[name] for name in BATCH_RESPONSE_HEADERS if name in response.headers}
+    body = response.body
+    if not body:
+        body = b'null'
+    elif response.content_type != 'application/json':
+        body = json.dumps(response.text).encode()
+    return b'{"status":%d,"headers":%s,"body":%s}' % (response.status_code, json.dumps(headers).encode(), body)
+
+
+@view_config(route_name='batch', request_method='POST')
+def batch(request):
+    """
+    Runs the batched GETs in order and returns their responses together.
+
+    ``batch.max_requests`` bounds the number of sub-requests. The total work
+    is bounded by ``batch.max_statements`` and ``batch.max_seconds``: once
+    either is spent, the remaining sub-requests are not run and answer 503.
+    """
+    entries = parse_batch(request)
+    settings = request.registry.settings
+    max_statements = int(settings.get('batch.max_statements', 200))
+    deadline = time.perf_counter() + float(settings.get('batch.max_seconds', 5))
+
+    parts = []
+    with collect(track_statements=False) as stats:
+        for path, headers in entries:
+            if stats.count >= max_statements or time.perf_counter() >= deadline:
+                response = Response(
+                    status=503, json_body={"error": "Batch work limit reached; request not run"}
+                )
+            else:
+                response = run_subrequest(request, make_subrequest(request, path, headers))
+            parts.append(response_entry(response))
+
+    return Response(
+        body=b'{"responses":[' + b','.join(parts) + b']}',
+        content_type='application/json',
+        charset='utf-8',
+    )
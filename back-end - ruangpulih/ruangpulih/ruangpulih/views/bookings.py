@@ -1,19 +1,21 @@
 from pyramid.httpexceptions import HTTPBadRequest, HTTPUnauthorized, HTTPNotFound
 from pyramid.view import view_config
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, joinedload
 from ..models.booking import Booking
 from ..models.schedule import Schedule
 from ..models.user import User
+from ..availability import sync_availability
+from ..caching import invalidate_available_psychologists
+from ..etags import check_if_match, compute_etag, conditional_response, flush_versioned, wants_revalidation
+from ..events import publish_after_commit
+from ..fieldsets import FieldsetSpec
+from ..security import require_user
+from ..streaming import stream_json_array, wants_stream
 import uuid
 from datetime import datetime
 
-def get_user_id(request):
-    """Extracts and validates the authenticated user ID from the request."""
-    user_id = request.authenticated_userid
-    if not user_id:
-        raise HTTPUnauthorized(json_body={"error": "Unauthorized"})
-    return user_id
-
 def get_schedule_or_404(request, schedule_id):
     """Fetches a schedule by ID or raises HTTPNotFound."""
     schedule = request.dbsession.get(Schedule, schedule_id)
@@ -21,20 +23,61 @@ def get_schedule_or_404(request, schedule_id):
         raise HTTPNotFound(json_body={"error": "Schedule not found"})
     return schedule
 
+BOOKING_FIELDS = FieldsetSpec(
+    attributes=('id', 'client_id', 'schedule_id', 'status', 'created_at'),
+    relations={'client': 'client_details', 'schedule': 'schedule', 'schedule.psychologist': None},
+    default_include=Booking.DEFAULT_INCLUDE,
+)
+
+def booking_loads(include, schedule=False):
+    """Eager loads for the relationships in ``include``; ``schedule`` loads the schedule regardless."""
+    loads = []
+    if 'client' in include:
+        loads.append(joinedload(Booking.client))
+    if schedule or 'schedule' in include:
+        load = joinedload(Booking.schedule)
+        if 'schedule.psychologist' in include:
+            load = load.joinedload(Schedule.psychologist)
+        loads.append(load)
+    return loads
+
+def _booking_etag(fieldset, version, client_version, schedule_version, psychologist_version):
+    include = fieldset.include
+    return compute_etag(
+        'booking', fieldset.key, version,
+        client_version if 'client' in include else None,
+        schedule_version if 'schedule' in include else None,
+        psychologist_version if 'schedule.psychologist' in include else None,
+    )
+
+def booking_etag(booking, fieldset=BOOKING_FIELDS.default):
+    """
+    The ETag of ``booking.to_dict()`` in ``fieldset``: the booking and the
+    related rows it embeds.
+    """
+    include = fieldset.include
+    client = booking.client if 'client' in include else None
+    schedule = booking.schedule if 'schedule' in include else None
+    psychologist = schedule.psychologist if schedule and 'schedule.psychologist' in include else None
+    return _booking_etag(fieldset, booking.version, *(row.version if row else None for row in (client, schedule, psychologist)))
+
 @view_config(route_name='bookings', request_method='GET', renderer='json')
 def list_bookings(request):
     """
     Lists bookings based on the authenticated user's role.
     Clients see their own bookings.
     Psychologists see bookings for their schedules.
+
+    With ?stream=true the bookings are streamed oldest first instead of
+    being built into one list. ?fields= and ?include= select the payload
+    (see fieldsets.py); only the included relationships are joined.
     """
-    user_id = get_user_id(request)
-    user = request.dbsession.get(User, user_id)
+    user = require_user(request)
+    user_id = user.id
+    fieldset = BOOKING_FIELDS.parse(request)
+    serialize = lambda booking: fieldset.pick(booking.to_dict(fieldset.include))
 
-    bookings_query = request.dbsession.query(Booking).options(
-        joinedload(Booking.client),
-        joinedload(Booking.schedule).joinedload(Schedule.psychologist)
-    )
+    bookings_query = request.dbsession.query(Booking).options(*booking_loads(fieldset.include))
 
     if user.role == 'client':
         bookings_query = bookings_query.filter(Booking.client_id == user_id)
@@ -43,29 +86,39 @@ def list_bookings(request):
     else:
         raise HTTPUnauthorized(json_body={"error": "Access denied for this role"})
 
+    if wants_stream(request):
+        return stream_json_array(
+            request, bookings_query.order_by(Booking.created_at, Booking.id), serialize
+        )
+
     bookings = bookings_query.all()
-    return [b.to_dict() for b in bookings]
+    return [serialize(b) for b in bookings]
 
 @view_config(route_name='bookings', request_method='POST', renderer='json')
 def create_booking(request):
     """Allows clients to create a new booking for an available schedule."""
-    user_id = get_user_id(request)
-    user = request.dbsession.get(User, user_id)
+    user = require_user(request)
+    user_id = user.id
 
-    if not user or user.role != 'client':
+    if user.role != 'client':
         raise HTTPUnauthorized(json_body={"error": "Only clients can create bookings"})
 
     data = request.json_body
     schedule_id = data.get("schedule_id")
 
-    schedule = request.dbsession.query(Schedule).options(
-        joinedload(Schedule.bookings)
-    ).get(schedule_id)
-
-    if not schedule:
-        raise HTTPNotFound(json_body={"error": "Schedule not found"})
-
-    if schedule.is_booked:
+    # Claim the slot in a single statement: only one concurrent request can
+    # flip is_booked from false to true, everyone else gets no row back.
+    # RETURNING hands over the psychologist to notify without another query.
+    psychologist_id = request.dbsession.execute(
+        update(Schedule)
+        .where(Schedule.id == schedule_id, Schedule.is_booked == False)
+        .values(is_booked=True)
+        .returning(Schedule.psychologist_id)
+    ).scalar()
+
+    if psychologist_id is None:
+        if request.dbsession.query(Schedule.id).filter(Schedule.id == schedule_id).first() is None:
+            raise HTTPNotFound(json_body={"error": "Schedule not found"})
         raise HTTPBadRequest(json_body={"error": "Schedule already booked"})
 
     booking = Booking(
@@ -75,18 +128,21 @@ def create_booking(request):
         status="pending",
         created_at=datetime.utcnow()
     )
-    
-    schedule.is_booked = True 
-    
-    request.dbsession.add(booking)
-    request.dbsession.flush()
 
-    created_booking = request.dbsession.query(Booking).options(
-        joinedload(Booking.client),
-        joinedload(Booking.schedule).joinedload(Schedule.psychologist)
-    ).get(booking.id)
+    # The partial unique index on active bookings is the backstop if
+    # is_booked was ever out of sync with the bookings table.
+    try:
+        with request.dbsession.begin_nested():
+            request.dbsession.add(booking)
+    except IntegrityError:
+        raise HTTPBadRequest(json_body={"error": "Schedule already booked"})
+
+    invalidate_available_psychologists(request)
+    sync_availability(request, schedule_ids=[schedule_id])
 
-    return created_booking.to_dict()
+    data = booking.to_dict()
+    publish_after_commit(request, [user_id, psychologist_id], 'booking.created', data)
+    return data
 
 @view_config(route_name='booking_detail', request_method='GET', renderer='json')
 def get_booking(request):
@@ -95,24 +151,45 @@ def get_booking(request):
     Authorization: Clients can view their own, psychologists can view bookings for their schedules.
     """
     booking_id = request.matchdict['id']
-    user_id = get_user_id(request)
-    user = request.dbsession.get(User, user_id)
-
+    user = require_user(request)
+    fieldset = BOOKING_FIELDS.parse(request)
+
+    if wants_revalidation(request):
+        # Versions and the ids needed for the permission check only.
+        psychologist = aliased(User)
+        row = request.dbsession.execute(
+            select(Booking.client_id, Schedule.psychologist_id,
+                   Booking.version, User.version, Schedule.version, psychologist.version)
+            .select_from(Booking)
+            .outerjoin(Booking.schedule)
+            .outerjoin(Booking.client)
+            .outerjoin(psychologist, psychologist.id == Schedule.psychologist_id)
+            .where(Booking.id == booking_id)
+        ).first()
+        if not row:
+            raise HTTPNotFound(json_body={"error": "Booking not found"})
+        check_booking_access(user, row[0], row[1])
+        conditional_response(request, _booking_etag(fieldset, *row[2:]))
+
+    # The schedule is needed for the permission check, included or not.
     booking = request.dbsession.query(Booking).options(
-        joinedload(Booking.client),
-        joinedload(Booking.schedule).joinedload(Schedule.psychologist)
+        *booking_loads(fieldset.include, schedule=True)
     ).get(booking_id)
 
     if not booking:
         raise HTTPNotFound(json_body={"error": "Booking not found"})
-    
-    if user.role == 'client' and booking.client_id != user_id:
+
+    check_booking_access(user, booking.client_id, booking.schedule.psychologist_id)
+    conditional_response(request, booking_etag(booking, fieldset))
+    return fieldset.pick(booking.to_dict(fieldset.include))
+
+def check_booking_access(user, client_id, psychologist_id):
+    """Clients may view their own bookings, psychologists those on their schedules."""
+    if user.role == 'client' and client_id != user.id:
         raise HTTPUnauthorized(json_body={"error": "You do not have permission to view this booking"})
-    elif user.role == 'psychologist' and booking.schedule.psychologist_id != user_id:
+    elif user.role == 'psychologist' and psychologist_id != user.id:
         raise HTTPUnauthorized(json_body={"error": "You do not have permission to view this booking"})
 
-    return booking.to_dict()
-
 @view_config(route_name='booking_detail', request_method='PUT', renderer='json')
 @view_config(route_name='booking_detail', request_method='PATCH', renderer='json')
 def update_booking_status(request):
@@ -122,11 +199,14 @@ def update_booking_status(request):
     Psychologists can confirm/reject bookings for their schedules.
     """
     booking_id = request.matchdict['id']
-    user_id = get_user_id(request)
-    user = request.dbsession.get(User, user_id)
+    user = require_user(request)
+    user_id = user.id
+    fieldset = BOOKING_FIELDS.parse(request)
 
+    # Load exactly what the permission checks, the event's to_dict() and the
+    # response need, so both can be built from this object after the flush.
     booking = request.dbsession.query(Booking).options(
-        joinedload(Booking.schedule).joinedload(Schedule.psychologist)
+        *booking_loads(fieldset.include | Booking.DEFAULT_INCLUDE, schedule=True)
     ).get(booking_id)
 
     if not booking:
@@ -160,6 +240,7 @@ def update_booking_status(request):
     else:
         raise HTTPUnauthorized(json_body={"error": "Access denied for this role"})
 
+    check_if_match(request, booking_etag(booking, fieldset))
     booking.status = new_status
     
     if new_status == 'confirmed':
@@ -169,14 +250,14 @@ def update_booking_status(request):
     elif new_status == 'pending' and not booking.schedule.is_booked:
         booking.schedule.is_booked = True
         
-    request.dbsession.flush()
-
-    updated_booking = request.dbsession.query(Booking).options(
-        joinedload(Booking.client),
-        joinedload(Booking.schedule).joinedload(Schedule.psychologist)
-    ).get(booking_id)
+    flush_versioned(request)
+    request.response.etag = booking_etag(booking, fieldset)
+    invalidate_available_psychologists(request)
+    sync_availability(request, days=[(booking.schedule.psychologist_id, booking.schedule.date)])
 
-    return updated_booking.to_dict()
+    data = booking.to_dict()
+    publish_after_commit(request, [booking.client_id, booking.schedule.psychologist_id], 'booking.updated', data)
+    return fieldset.pick(booking.to_dict(fieldset.include))
 
 @view_config(route_name='booking_detail', request_method='DELETE', renderer='json')
 def delete_booking(request):
@@ -186,10 +267,11 @@ def delete_booking(request):
     Psychologists can delete any booking on their schedules.
     """
     booking_id = request.matchdict['id']
-    user_id = get_user_id(request)
-    user = request.dbsession.get(User, user_id)
+    user = require_user(request)
+    user_id = user.id
 
     booking = request.dbsession.query(Booking).options(
+        joinedload(Booking.client),
         joinedload(Booking.schedule)
     ).get(booking_id)
 
@@ -200,8 +282,18 @@ def delete_booking(request):
         raise HTTPUnauthorized(json_body={"error": "You do not have permission to delete this booking"})
     elif user.role == 'psychologist' and booking.schedule.psychologist_id != user_id:
         raise HTTPUnauthorized(json_body={"error": "You do not have permission to delete this booking"})
-    
+
+    check_if_match(request, booking_etag(booking, BOOKING_FIELDS.parse(request)))
     booking.schedule.is_booked = False 
     
     request.dbsession.delete(booking)
+    flush_versioned(request)
+    invalidate_available_psychologists(request)
+    sync_availability(request, days=[(booking.schedule.psychologist_id, booking.schedule.date)])
+    publish_after_commit(request, [booking.client_id, booking.schedule.psychologist_id], 'booking.deleted', {
+        "id": booking.id,
+        "client_id": booking.client_id,
+        "schedule_id": booking.schedule_id,
+        "status": booking.status,
+    })
     return {"message": "Booking deleted successfully"}
@@ -1,13 +1,22 @@
 from pyramid.httpexceptions import HTTPBadRequest, HTTPUnauthorized, HTTPNotFound
 from pyramid.view import view_config
-from sqlalchemy.orm import joinedload, subqueryload
-from sqlalchemy import and_, func
+from sqlalchemy.orm import subqueryload
+from sqlalchemy import and_, func, select
 from ..models.user import User
 from ..models.schedule import Schedule
-from ..models.booking import Booking
 from ..models.review import Review
+from ..models.rating import PsychologistRating, RATING_VALUES
+from ..pagination import keyset_page, keyset_paginate
+from ..availability import DEFAULT_MAX_DAYS, AvailabilityIndex, get_availability_index
+from ..caching import AVAILABLE_PSYCHOLOGISTS_CACHE
+from ..etags import compute_etag, conditional_response, wants_revalidation
+from .reviews import REVIEW_ORDER
+from .schedules import parse_date_param, parse_time_param
 from datetime import datetime, date, time
 
+# Number of newest reviews embedded in the psychologist detail payload.
+DETAIL_REVIEWS_LIMIT = 5
+
 def psychologist_to_dict(psychologist, average_rating=None, total_reviews=None, available_schedules=None):
     """Helper function to format psychologist details into a dictionary."""
     data = {
@@ -26,8 +35,8 @@ def schedule_to_dict_simple(schedule):
     """Helper function to format schedule details simply."""
     return {
         'id': str(schedule.id),
-        'date': schedule.date.isoformat(),
-        'time_slot': schedule.time_slot.strftime('%H:%M'),
+        'date': schedule.date,
+        'time_slot': schedule.time_slot,
         'is_booked': schedule.is_booked,
     }
 
@@ -38,17 +47,45 @@ def review_to_dict_simple(review):
         'booking_id': review.booking_id,
         'rating': review.rating,
         'comment': review.comment,
+        'created_at': review.created_at,
     }
 
 @view_config(route_name='psychologists_with_available_schedules', request_method='GET', renderer='json')
 def get_psychologists_with_available_schedules(request):
     """
     Lists psychologists with their available (unbooked) schedules from today onwards.
+
+    The payload is the same for every caller, so it is served from the
+    registry cache until a schedule, booking or review write invalidates it.
     """
     today = datetime.utcnow().date()
 
-    available_schedules_query = request.dbsession.query(Schedule).options(
-        joinedload(Schedule.psychologist)
+    cache = request.registry.get(AVAILABLE_PSYCHOLOGISTS_CACHE)
+    if cache is None:
+        return build_available_psychologists(request, today)
+
+    # Keyed by day so the "from today" cut-off moves at midnight.
+    payload, hit = cache.get_or_compute(
+        today.isoformat(), lambda: build_available_psychologists(request, today)
+    )
+    request.response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return payload
+
+def build_available_psychologists(request, today):
+    # Plain columns of each available slot and its psychologist; building
+    # Schedule and User objects for every row would cost far more than the
+    # dictionaries below.
+    available_schedules = request.dbsession.query(
+        Schedule.id,
+        Schedule.date,
+        Schedule.time_slot,
+        Schedule.is_booked,
+        User.id.label('psychologist_id'),
+        User.username,
+        User.email,
+        User.role,
+    ).join(
+        User, User.id == Schedule.psychologist_id
     ).filter(
         and_(
             Schedule.is_booked == False,
@@ -60,30 +97,166 @@ def get_psychologists_with_available_schedules(request):
         Schedule.time_slot
     )
 
-    all_available_schedules = available_schedules_query.all()
-
     psychologists_data = {}
-    for schedule in all_available_schedules:
-        if schedule.psychologist:
-            psychologist_id = str(schedule.psychologist.id)
-            if psychologist_id not in psychologists_data:
-                psychologists_data[psychologist_id] = psychologist_to_dict(schedule.psychologist)
-                psychologists_data[psychologist_id]['available_schedules'] = []
-
-            psychologists_data[psychologist_id]['available_schedules'].append(schedule_to_dict_simple(schedule))
-
-    # Average rating and total reviews are not calculated here for the list view
-    # as it might be performance-intensive for a large number of psychologists.
-    # They are set to None/0 by default in psychologist_to_dict.
+    for row in available_schedules:
+        data = psychologists_data.get(row.psychologist_id)
+        if data is None:
+            data = psychologists_data[row.psychologist_id] = {
+                'id': str(row.psychologist_id),
+                'username': row.username,
+                'email': row.email,
+                'role': row.role,
+                'average_rating': None,
+                'total_reviews': None,
+                'available_schedules': [],
+            }
+        data['available_schedules'].append(schedule_to_dict_simple(row))
+
+    # Ratings come from the precomputed per-psychologist totals: one indexed
+    # lookup for the whole page instead of aggregating reviews.
+    if psychologists_data:
+        ratings = request.dbsession.query(PsychologistRating).filter(
+            PsychologistRating.psychologist_id.in_(list(psychologists_data))
+        )
+        for rating in ratings:
+            data = psychologists_data[rating.psychologist_id]
+            data['average_rating'] = rating.average_rating
+            data['total_reviews'] = rating.review_count
+        for data in psychologists_data.values():
+            if data['total_reviews'] is None:
+                data['total_reviews'] = 0
+
     return list(psychologists_data.values())
 
+# Free slots in time order; matches ix_schedules_is_booked_date_time_slot
+# (is_booked, date, time_slot), with id as the unique tie-breaker.
+AVAILABILITY_ORDER = (Schedule.date, Schedule.time_slot, Schedule.id)
+
+@view_config(route_name='psychologists_search', request_method='GET', renderer='json')
+def search_available_schedules(request):
+    """
+    Free slots of every psychologist, merged in time order, one page at a
+    time: "free between 2026-11-02 and 2026-11-06, 09:00-12:00, earliest first".
+
+    Query parameters: date_from (default and minimum today), date_to,
+    time_from and time_to (HH:MM; a slot starting at time_to is excluded),
+    limit and cursor (taken from the X-Next-Cursor header of the previous page).
+
+    Filtering and ordering happen in SQL on the is_booked/date/time_slot
+    index, so a page costs the same however many slots exist.
+    """
+    today = datetime.utcnow().date()
+    date_from = parse_date_param(request, 'date_from')
+    date_to = parse_date_param(request, 'date_to')
+    time_from = parse_time_param(request, 'time_from')
+    time_to = parse_time_param(request, 'time_to')
+
+    date_from = max(date_from, today) if date_from is not None else today
+    if date_to is not None and date_to < date_from:
+        return []
+    if time_from is not None and time_to is not None and time_to <= time_from:
+        raise HTTPBadRequest(json_body={"error": "time_to must be after time_from"})
+
+    query = request.dbsession.query(
+        Schedule.id,
+        Schedule.date,
+        Schedule.time_slot,
+        Schedule.psychologist_id,
+        User.username,
+        User.email,
+    ).join(
+        User, User.id == Schedule.psychologist_id
+    ).filter(
+        Schedule.is_booked == False,
+        Schedule.date >= date_from,
+    )
+    if date_to is not None:
+        query = query.filter(Schedule.date <= date_to)
+    if time_from is not None:
+        query = query.filter(Schedule.time_slot >= time_from)
+    if time_to is not None:
+        query = query.filter(Schedule.time_slot < time_to)
+
+    return [
+        {
+            'id': str(row.id),
+            'date': row.date,
+            'time_slot': row.time_slot,
+            'psychologist': {
+                'id': str(row.psychologist_id),
+                'username': row.username,
+                'email': row.email,
+            },
+        }
+        for row in keyset_paginate(request, query, AVAILABILITY_ORDER)
+    ]
+
+@view_config(route_name='psychologists_free', request_method='GET', renderer='json')
+def get_free_psychologists(request):
+    """
+    Psychologists with a free slot in a window ("who is free Tuesday
+    morning?"), each with the earliest such slot, earliest first.
+
+    Query parameters: date_from (default and minimum today), date_to
+    (default date_from, at most ``availability.max_days`` later), time_from
+    and time_to (HH:MM, time_to excluded).
+
+    Answered from the in-memory availability index (see availability.py)
+    when it is enabled; otherwise an index of the window is built from the
+    database for this request.
+    """
+    today = datetime.utcnow().date()
+    date_from = parse_date_param(request, 'date_from')
+    date_from = max(date_from, today) if date_from is not None else today
+    date_to = parse_date_param(request, 'date_to') or date_from
+    max_days = int(request.registry.settings.get('availability.max_days', DEFAULT_MAX_DAYS))
+    if (date_to - date_from).days >= max_days:
+        raise HTTPBadRequest(json_body={"error": f"date_to must be less than {max_days} days after date_from"})
+    time_from = parse_time_param(request, 'time_from')
+    time_to = parse_time_param(request, 'time_to')
+    if time_from is not None and time_to is not None and time_to <= time_from:
+        raise HTTPBadRequest(json_body={"error": "time_to must be after time_from"})
+
+    index = get_availability_index(request)
+    if index is None:
+        index = AvailabilityIndex.build(request.dbsession, date_from, date_to)
+
+    found = index.first_free_in_window(date_from, date_to, time_from, time_to)
+    return [
+        {'psychologist_id': psychologist_id, 'date': day, 'time_slot': time_slot}
+        for psychologist_id, (day, time_slot) in sorted(found.items(), key=lambda item: (item[1], item[0]))
+    ]
+
 @view_config(route_name='psychologist_detail', request_method='GET', renderer='json')
 def get_psychologist_detail(request):
     """
     Retrieves detailed information for a specific psychologist,
-    including their available schedules and reviews.
+    including their available schedules and their newest reviews.
+    Older reviews are reached through GET /reviews?psychologist_id=...
+    with the returned reviews_next_cursor.
     """
     psychologist_id = request.matchdict['id']
+    today = datetime.utcnow().date()
+
+    if wants_revalidation(request):
+        # Reviews are never edited, so the review count and the newest
+        # review stand for the embedded reviews and rating.
+        newest_review_id = select(Review.id).where(Review.psychologist_id == psychologist_id).order_by(
+            *[c.desc() for c in REVIEW_ORDER]
+        ).limit(1).scalar_subquery()
+        rows = request.dbsession.execute(
+            select(User.version, PsychologistRating.review_count, newest_review_id, Schedule.id, Schedule.version)
+            .select_from(User)
+            .outerjoin(PsychologistRating, PsychologistRating.psychologist_id == User.id)
+            .outerjoin(Schedule, and_(
+                Schedule.psychologist_id == User.id, Schedule.is_booked == False, Schedule.date >= today
+            ))
+            .where(User.id == psychologist_id, User.role == 'psychologist')
+        ).all()
+        if not rows:
+            raise HTTPNotFound(json_body={"error": "Psychologist not found."})
+        schedules = sorted(tuple(row[3:]) for row in rows if row[3] is not None)
+        conditional_response(request, compute_etag('psychologist', *rows[0][:3], schedules))
 
     psychologist = request.dbsession.query(User).filter(
         and_(User.id == psychologist_id, User.role == 'psychologist')
@@ -92,8 +265,9 @@ def get_psychologist_detail(request):
     if not psychologist:
         raise HTTPNotFound(json_body={"error": "Psychologist not found."})
 
-    today = datetime.utcnow().date()
-    available_schedules = request.dbsession.query(Schedule).filter(
+    available_schedules = request.dbsession.query(
+        Schedule.id, Schedule.date, Schedule.time_slot, Schedule.is_booked, Schedule.version
+    ).filter(
         and_(
             Schedule.psychologist_id == psychologist_id,
             Schedule.is_booked == False,
@@ -104,22 +278,30 @@ def get_psychologist_detail(request):
         Schedule.time_slot
     ).all()
 
-    reviews_data = request.dbsession.query(Review).options(
-        joinedload(Review.booking)
-    ).join(Booking.schedule).filter(
-        Schedule.psychologist_id == psychologist_id
-    ).all()
+    rating = request.dbsession.get(PsychologistRating, psychologist_id)
 
-    num_reviews = len(reviews_data)
-    average_rating = round(sum(r.rating for r in reviews_data) / num_reviews, 1) if num_reviews > 0 else None
+    latest_reviews, reviews_next_cursor = keyset_page(
+        request.dbsession.query(Review).filter(Review.psychologist_id == psychologist_id),
+        REVIEW_ORDER, DETAIL_REVIEWS_LIMIT, descending=True
+    )
+
+    conditional_response(request, compute_etag(
+        'psychologist', psychologist.version, rating.review_count if rating else None,
+        latest_reviews[0].id if latest_reviews else None,
+        sorted((s.id, s.version) for s in available_schedules),
+    ))
 
     psychologist_details = psychologist_to_dict(
         psychologist,
-        average_rating=average_rating,
-        total_reviews=num_reviews,
+        average_rating=rating.average_rating if rating else None,
+        total_reviews=rating.review_count if rating else 0,
         available_schedules=[schedule_to_dict_simple(s) for s in available_schedules]
     )
 
-    psychologist_details['reviews'] = [review_to_dict_simple(r) for r in reviews_data]
+    psychologist_details['rating_histogram'] = (
+        rating.histogram if rating else {str(r): 0 for r in RATING_VALUES}
+    )
+    psychologist_details['reviews'] = [review_to_dict_simple(r) for r in latest_reviews]
+    psychologist_details['reviews_next_cursor'] = reviews_next_cursor
 
     return psychologist_details
@@ -1,23 +1,30 @@
 from pyramid.view import view_config
-from pyramid.httpexceptions import HTTPNotFound, HTTPUnauthorized
+from pyramid.httpexceptions import HTTPBadRequest, HTTPNotFound
 from ..models.review import Review
 from ..models.booking import Booking
+from ..models.rating import RATING_VALUES
+from ..pagination import keyset_paginate
+from ..projections import REVIEW_COLUMNS, review_row_to_dict
+from ..caching import invalidate_available_psychologists
+from ..security import require_user
+from ..streaming import stream_json_array, wants_stream
+from datetime import datetime
 import uuid
 
-def get_user_id(request):
-    user_id = request.authenticated_userid
-    if not user_id:
-        raise HTTPUnauthorized(json_body={"error": "Unauthorized"})
-    return user_id
+# Newest first; id breaks ties between reviews created in the same instant.
+REVIEW_ORDER = (Review.created_at, Review.id)
 
 @view_config(route_name='reviews', request_method='POST', renderer='json')
 def create_review(request):
-    user_id = get_user_id(request)
+    user_id = require_user(request).id
     data = request.json_body
     booking_id = data.get("booking_id")
     rating = data.get("rating")
     comment = data.get("comment", "")
 
+    if rating not in RATING_VALUES:
+        raise HTTPBadRequest(json_body={"error": "Rating must be an integer from 1 to 5"})
+
     booking = request.dbsession.get(Booking, booking_id)
     if not booking or booking.client_id != user_id:
         raise HTTPNotFound(json_body={"error": "Booking not found or not yours"})
@@ -26,12 +33,47 @@ def create_review(request):
         id=str(uuid.uuid4()),
         booking_id=booking_id,
         rating=rating,
-        comment=comment
+        comment=comment,
+        created_at=datetime.utcnow()
     )
     request.dbsession.add(review)
+    # Flushing also folds the rating into PsychologistRating (see models/rating.py).
+    request.dbsession.flush()
+    # The available-psychologists listing embeds rating totals.
+    invalidate_available_psychologists(request)
     return review.to_dict()
 
 @view_config(route_name='reviews', request_method='GET', renderer='json')
 def list_reviews(request):
-    reviews = request.dbsession.query(Review).all()
-    return [r.to_dict() for r in reviews]
+    """
+    Lists reviews newest first, one page at a time.
+
+    Query parameters: psychologist_id, booking_id, min_rating,
+    limit and cursor (taken from the X-Next-Cursor header of the previous page).
+    With stream=true every matching review is streamed in the same order
+    and limit/cursor are ignored.
+    """
+    reviews_query = request.dbsession.query(*REVIEW_COLUMNS)
+
+    psychologist_id = request.params.get('psychologist_id')
+    booking_id = request.params.get('booking_id')
+    min_rating = request.params.get('min_rating')
+
+    if psychologist_id:
+        reviews_query = reviews_query.filter(Review.psychologist_id == psychologist_id)
+    if booking_id:
+        reviews_query = reviews_query.filter(Review.booking_id == booking_id)
+    if min_rating is not None:
+        try:
+            min_rating = int(min_rating)
+        except ValueError:
+            raise HTTPBadRequest(json_body={"error": "min_rating must be an integer"})
+        reviews_query = reviews_query.filter(Review.rating >= min_rating)
+
+    if wants_stream(request):
+        return stream_json_array(
+            request, reviews_query.order_by(*[c.desc() for c in REVIEW_ORDER]), review_row_to_dict
+        )
+
+    rows = keyset_paginate(request, reviews_query, REVIEW_ORDER, descending=True)
+    return [review_row_to_dict(row) for row in rows]
@@ -1,59 +1,183 @@
 # File: views/schedules.py
 from pyramid.httpexceptions import HTTPBadRequest, HTTPUnauthorized, HTTPNotFound
 from pyramid.view import view_config
-from sqlalchemy.orm import joinedload
+from sqlalchemy import insert, select
+from sqlalchemy.orm import aliased, joinedload
 from ..models.schedule import Schedule
-from ..models.user import User
 from ..models.booking import Booking
+from ..models.user import User
+from ..pagination import keyset_paginate
+from ..projections import SCHEDULE_COLUMNS, schedule_rows_to_dicts
+from ..availability import SLOT_MINUTES, sync_availability
+from ..caching import invalidate_available_psychologists
+from ..etags import check_if_match, compute_etag, conditional_response, flush_versioned, wants_revalidation
+from ..fieldsets import FieldsetSpec
+from ..security import require_user
+from ..streaming import stream_json_array, wants_stream
 import uuid
-from datetime import datetime
-
-def get_user_id(request):
-    user_id = request.authenticated_userid
-    if not user_id:
-        raise HTTPUnauthorized(json_body={"error": "Unauthorized"})
-    return user_id
-
-def get_schedule_or_404(request, schedule_id):
-    schedule = request.dbsession.query(Schedule).options(
-        joinedload(Schedule.psychologist),
-        joinedload(Schedule.bookings).joinedload(Booking.client)
-    ).get(schedule_id)
+from datetime import datetime, timedelta
+
+# Most schedules one bulk request may create (about three months of
+# eight slots a day).
+MAX_BULK_SCHEDULES = 1000
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+SCHEDULE_FIELDS = FieldsetSpec(
+    attributes=('id', 'psychologist_id', 'date', 'time_slot', 'is_booked'),
+    relations={'current_booking': 'current_booking', 'current_booking.client': None, 'psychologist': 'psychologist'},
+    default_include=Schedule.DEFAULT_INCLUDE,
+)
+
+def schedule_loads(include):
+    """Eager loads for the relationships in ``include``."""
+    loads = []
+    if 'psychologist' in include:
+        loads.append(joinedload(Schedule.psychologist))
+    if 'current_booking' in include:
+        load = joinedload(Schedule.bookings)
+        if 'current_booking.client' in include:
+            load = load.joinedload(Booking.client)
+        loads.append(load)
+    return loads
+
+def get_schedule_or_404(request, schedule_id, include=Schedule.DEFAULT_INCLUDE):
+    schedule = request.dbsession.query(Schedule).options(*schedule_loads(include)).get(schedule_id)
     
     if not schedule:
         raise HTTPNotFound(json_body={"error": "Schedule not found"})
     return schedule
 
+def _schedule_etag(fieldset, version, bookings, psychologist_version):
+    """``bookings`` holds an (id, version, client version) triple per booking."""
+    include = fieldset.include
+    if 'current_booking' not in include:
+        bookings = ()
+    elif 'current_booking.client' not in include:
+        bookings = [(booking_id, booking_version, None) for booking_id, booking_version, _ in bookings]
+    return compute_etag(
+        'schedule', fieldset.key, version, sorted(bookings),
+        psychologist_version if 'psychologist' in include else None,
+    )
+
+def schedule_etag(schedule, fieldset=SCHEDULE_FIELDS.default):
+    """
+    The ETag of ``schedule.to_dict()`` in ``fieldset``: the schedule and the
+    related rows it embeds. The current booking is drawn from all of its
+    bookings, so they all count.
+    """
+    include = fieldset.include
+    bookings = ()
+    if 'current_booking' in include:
+        with_client = 'current_booking.client' in include
+        bookings = [
+            (booking.id, booking.version, booking.client.version if with_client and booking.client else None)
+            for booking in schedule.bookings
+        ]
+    psychologist = schedule.psychologist if 'psychologist' in include else None
+    return _schedule_etag(fieldset, schedule.version, bookings, psychologist.version if psychologist else None)
+
+def parse_slot_time(value):
+    """
+    A schedule's ``HH:MM`` start time, which must fall on a quarter hour: the
+    availability index keeps one bit per ``SLOT_MINUTES``.
+    """
+    time_slot = datetime.strptime(value, "%H:%M").time()
+    if time_slot.minute % SLOT_MINUTES:
+        raise ValueError(f"time {value!r} is not on a {SLOT_MINUTES}-minute boundary")
+    return time_slot
+
+def parse_date_param(request, name):
+    value = request.params.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPBadRequest(json_body={"error": f"Invalid {name} (expected YYYY-MM-DD)"})
+
+def parse_time_param(request, name):
+    value = request.params.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%H:%M").time()
+    except ValueError:
+        raise HTTPBadRequest(json_body={"error": f"Invalid {name} (expected HH:MM on a quarter hour)"})
+
+def parse_bool_param(request, name):
+    value = request.params.get(name)
+    if value is None:
+        return None
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise HTTPBadRequest(json_body={"error": f"Invalid {name} (expected true or false)"})
+
 @view_config(route_name='schedules', request_method='GET', renderer='json')
 def list_schedules(request):
-    schedules_query = request.dbsession.query(Schedule).options(
-        joinedload(Schedule.psychologist),
-        joinedload(Schedule.bookings).joinedload(Booking.client)
-    )
+    """
+    Lists schedules one page at a time, ordered by (date, time_slot, id).
+    Psychologists only see their own schedules.
+
+    Query parameters: date_from, date_to, psychologist_id, is_booked,
+    limit and cursor (taken from the X-Next-Cursor header of the previous page).
+    With stream=true every matching schedule is streamed in the same order
+    and limit/cursor are ignored. fields and include select the payload
+    (see fieldsets.py); relationships that are not included are not queried.
 
-    user_id = get_user_id(request)
-    user = request.dbsession.get(User, user_id)
+    Reads plain columns rather than Schedule objects; see projections.py.
+    """
+    schedules_query = request.dbsession.query(*SCHEDULE_COLUMNS)
+
+    user = require_user(request)
+    user_id = user.id
+    fieldset = SCHEDULE_FIELDS.parse(request)
+    serialize_chunk = lambda session, rows: [
+        fieldset.pick(data) for data in schedule_rows_to_dicts(session, rows, fieldset.include)
+    ]
 
     if user.role == 'psychologist':
         schedules_query = schedules_query.filter(Schedule.psychologist_id == user_id)
 
-    schedules = schedules_query.all()
-    return [s.to_dict() for s in schedules]
+    date_from = parse_date_param(request, 'date_from')
+    date_to = parse_date_param(request, 'date_to')
+    is_booked = parse_bool_param(request, 'is_booked')
+    psychologist_id = request.params.get('psychologist_id')
+
+    if date_from is not None:
+        schedules_query = schedules_query.filter(Schedule.date >= date_from)
+    if date_to is not None:
+        schedules_query = schedules_query.filter(Schedule.date <= date_to)
+    if is_booked is not None:
+        schedules_query = schedules_query.filter(Schedule.is_booked == is_booked)
+    if psychologist_id:
+        schedules_query = schedules_query.filter(Schedule.psychologist_id == psychologist_id)
+
+    order_by = (Schedule.date, Schedule.time_slot, Schedule.id)
+    if wants_stream(request):
+        return stream_json_array(
+            request, schedules_query.order_by(*order_by), serialize_chunk=serialize_chunk
+        )
+
+    rows = keyset_paginate(request, schedules_query, order_by)
+    return serialize_chunk(request.dbsession, rows)
 
 @view_config(route_name='schedules', request_method='POST', renderer='json')
 def add_schedule(request):
-    user_id = get_user_id(request)
-    user = request.dbsession.get(User, user_id)
+    user = require_user(request)
+    user_id = user.id
     
-    if not user or user.role != 'psychologist':
+    if user.role != 'psychologist':
         raise HTTPUnauthorized(json_body={"error": "Only psychologists can create schedules"})
 
     data = request.json_body
     try:
         date = datetime.strptime(data.get("date"), "%Y-%m-%d").date()
-        time_slot = datetime.strptime(data.get("time_slot"), "%H:%M").time()
+        time_slot = parse_slot_time(data.get("time_slot"))
     except Exception:
-        raise HTTPBadRequest(json_body={"error": "Invalid date or time format (date=YYYY-MM-DD, time=HH:MM)"})
+        raise HTTPBadRequest(json_body={"error": "Invalid date or time format (date=YYYY-MM-DD, time=HH:MM on a quarter hour)"})
 
     new_schedule = Schedule(
         id=str(uuid.uuid4()),
@@ -64,44 +188,200 @@ def add_schedule(request):
     )
     request.dbsession.add(new_schedule)
     request.dbsession.flush()
+    invalidate_available_psychologists(request)
+    sync_availability(request, days=[(user_id, date)])
 
-    created_schedule = request.dbsession.query(Schedule).options(
-        joinedload(Schedule.psychologist),
-        joinedload(Schedule.bookings).joinedload(Booking.client)
-    ).get(new_schedule.id)
+    # A new schedule has no bookings, so to_dict() needs nothing else loaded.
+    return new_schedule.to_dict()
 
-    return created_schedule.to_dict()
+def _parse_slot(value, errors, where):
+    """(date, time) from ``{"date": ..., "time_slot": ...}``, or None after recording an error."""
+    try:
+        return (
+            datetime.strptime(value.get("date"), "%Y-%m-%d").date(),
+            parse_slot_time(value.get("time_slot")),
+        )
+    except Exception:
+        errors.append(f"{where}: invalid date or time format (date=YYYY-MM-DD, time=HH:MM on a quarter hour)")
+        return None
+
+def _expand_recurrence(rule, errors):
+    """Every (date, time) of a recurrence rule: weekdays x time_slots within date_from..date_to."""
+    try:
+        date_from = datetime.strptime(rule.get("date_from"), "%Y-%m-%d").date()
+        date_to = datetime.strptime(rule.get("date_to"), "%Y-%m-%d").date()
+    except Exception:
+        errors.append("recurrence: invalid date_from or date_to (expected YYYY-MM-DD)")
+        return []
+    if date_to < date_from:
+        errors.append("recurrence: date_to is before date_from")
+        return []
+
+    weekdays = set()
+    for name in rule.get("weekdays") or []:
+        if not isinstance(name, str) or name.lower() not in WEEKDAYS:
+            errors.append(f"recurrence: invalid weekday {name!r} (expected one of {', '.join(WEEKDAYS)})")
+        else:
+            weekdays.add(WEEKDAYS.index(name.lower()))
+    if not weekdays and not errors:
+        errors.append("recurrence: weekdays is required")
+
+    time_slots = []
+    for value in rule.get("time_slots") or []:
+        try:
+            time_slots.append(parse_slot_time(value))
+        except Exception:
+            errors.append(f"recurrence: invalid time slot {value!r} (expected HH:MM on a quarter hour)")
+    if not time_slots and not errors:
+        errors.append("recurrence: time_slots is required")
+    if errors:
+        return []
+
+    # Every week adds at least one slot, so stopping past the limit also
+    # bounds the loop for rules spanning years.
+    slots = []
+    day = date_from
+    while day <= date_to and len(slots) <= MAX_BULK_SCHEDULES:
+        if day.weekday() in weekdays:
+            slots.extend((day, time_slot) for time_slot in time_slots)
+        day += timedelta(days=1)
+    return slots
+
+@view_config(route_name='schedules_bulk', request_method='POST', renderer='json')
+def add_schedules_bulk(request):
+    """
+    Creates many schedules for the current psychologist at once, from either
+    ``{"slots": [{"date": ..., "time_slot": ...}, ...]}`` or
+    ``{"recurrence": {"date_from": ..., "date_to": ..., "weekdays": ["mon", ...],
+    "time_slots": ["09:00", ...]}}``.
+
+    The whole payload is validated before anything is written, and every
+    problem is reported in one 400. Slots the psychologist already has (or
+    that repeat within the payload) are skipped and returned under
+    ``skipped``; the rest are inserted with one executemany.
+    """
+    user = require_user(request)
+    user_id = user.id
+
+    if user.role != 'psychologist':
+        raise HTTPUnauthorized(json_body={"error": "Only psychologists can create schedules"})
+
+    data = request.json_body
+    if not isinstance(data, dict) or ("slots" in data) == ("recurrence" in data):
+        raise HTTPBadRequest(json_body={"error": "Provide either slots or recurrence"})
+
+    errors = []
+    if "slots" in data:
+        if not isinstance(data["slots"], list):
+            raise HTTPBadRequest(json_body={"error": "slots must be a list"})
+        if len(data["slots"]) > MAX_BULK_SCHEDULES:
+            raise HTTPBadRequest(json_body={"error": f"At most {MAX_BULK_SCHEDULES} schedules per request"})
+        slots = [
+            _parse_slot(value if isinstance(value, dict) else {}, errors, f"slots[{i}]")
+            for i, value in enumerate(data["slots"])
+        ]
+    else:
+        rule = data["recurrence"]
+        slots = _expand_recurrence(rule if isinstance(rule, dict) else {}, errors)
+
+    if not errors and not slots:
+        errors.append("No schedules to create")
+    if not errors and len(slots) > MAX_BULK_SCHEDULES:
+        errors.append(f"At most {MAX_BULK_SCHEDULES} schedules per request")
+    if errors:
+        raise HTTPBadRequest(json_body={"error": "; ".join(errors)})
+
+    # Existing slots in the payload's date range and times, with one query
+    # on the (psychologist_id, date, time_slot) index.
+    rows = request.dbsession.execute(
+        select(Schedule.date, Schedule.time_slot).where(
+            Schedule.psychologist_id == user_id,
+            Schedule.date.between(min(d for d, _ in slots), max(d for d, _ in slots)),
+            Schedule.time_slot.in_(sorted({t for _, t in slots})),
+        )
+    )
+    existing = {tuple(row) for row in rows}
+
+    created, skipped = [], []
+    for slot in slots:
+        if slot in existing:
+            skipped.append({"date": slot[0], "time_slot": slot[1]})
+            continue
+        existing.add(slot)
+        created.append({
+            "id": str(uuid.uuid4()),
+            "psychologist_id": user_id,
+            "date": slot[0],
+            "time_slot": slot[1],
+            "is_booked": False,
+        })
+
+    if created:
+        request.dbsession.execute(insert(Schedule), created)
+        invalidate_available_psychologists(request)
+        sync_availability(request, days={(user_id, s["date"]) for s in created})
+
+    # The inserted rows are exactly what Schedule.to_dict() reports for a
+    # schedule without bookings.
+    return {"created": created, "skipped": skipped}
 
 @view_config(route_name='schedule_detail', request_method='GET', renderer='json')
 def get_schedule(request):
     schedule_id = request.matchdict['id']
-    schedule = get_schedule_or_404(request, schedule_id)
-    return schedule.to_dict()
+    fieldset = SCHEDULE_FIELDS.parse(request)
+
+    if wants_revalidation(request):
+        # The versions of the schedule, its psychologist, and its bookings
+        # and their clients, which to_dict() draws the current booking from.
+        psychologist = aliased(User)
+        rows = request.dbsession.execute(
+            select(Schedule.version, psychologist.version, Booking.id, Booking.version, User.version)
+            .select_from(Schedule)
+            .outerjoin(psychologist, psychologist.id == Schedule.psychologist_id)
+            .outerjoin(Schedule.bookings)
+            .outerjoin(Booking.client)
+            .where(Schedule.id == schedule_id)
+        ).all()
+        if not rows:
+            raise HTTPNotFound(json_body={"error": "Schedule not found"})
+        bookings = [tuple(row[2:]) for row in rows if row[2] is not None]
+        conditional_response(request, _schedule_etag(fieldset, rows[0][0], bookings, rows[0][1]))
+
+    schedule = get_schedule_or_404(request, schedule_id, fieldset.include)
+    conditional_response(request, schedule_etag(schedule, fieldset))
+    return fieldset.pick(schedule.to_dict(fieldset.include))
 
 @view_config(route_name='schedule_detail', request_method='PUT', renderer='json')
 def update_schedule(request):
     schedule_id = request.matchdict['id']
-    user_id = get_user_id(request)
-    schedule = get_schedule_or_404(request, schedule_id)
+    user_id = require_user(request).id
+    fieldset = SCHEDULE_FIELDS.parse(request)
+    schedule = get_schedule_or_404(request, schedule_id, fieldset.include)
 
     if schedule.psychologist_id != user_id:
         raise HTTPUnauthorized(json_body={"error": "You do not have permission to edit this schedule"})
+    check_if_match(request, schedule_etag(schedule, fieldset))
 
     data = request.json_body
+    old_date = schedule.date
     try:
         if 'date' in data:
             schedule.date = datetime.strptime(data['date'], "%Y-%m-%d").date()
         if 'time_slot' in data:
-            schedule.time_slot = datetime.strptime(data['time_slot'], "%H:%M").time()
+            schedule.time_slot = parse_slot_time(data['time_slot'])
     except Exception:
-        raise HTTPBadRequest(json_body={"error": "Invalid date or time format (date=YYYY-MM-DD, time=HH:MM)"})
+        raise HTTPBadRequest(json_body={"error": "Invalid date or time format (date=YYYY-MM-DD, time=HH:MM on a quarter hour)"})
 
-    return schedule.to_dict()
+    flush_versioned(request)
+    request.response.etag = schedule_etag(schedule, fieldset)
+    invalidate_available_psychologists(request)
+    sync_availability(request, days={(user_id, old_date), (user_id, schedule.date)})
+    return fieldset.pick(schedule.to_dict(fieldset.include))
 
 @view_config(route_name='schedule_detail', request_method='DELETE', renderer='json')
 def delete_schedule(request):
     schedule_id = request.matchdict['id']
-    user_id = get_user_id(request)
+    user_id = require_user(request).id
     schedule = get_schedule_or_404(request, schedule_id)
 
     if schedule.psychologist_id != user_id:
@@ -109,6 +389,10 @@ def delete_schedule(request):
 
     if schedule.is_booked:
         raise HTTPBadRequest(json_body={"error": "Cannot delete schedule that has been booked"})
+    check_if_match(request, schedule_etag(schedule, SCHEDULE_FIELDS.parse(request)))
 
     request.dbsession.delete(schedule)
+    flush_versioned(request)
+    invalidate_available_psychologists(request)
+    sync_availability(request, days=[(user_id, schedule.date)])
     return {"message": "Schedule deleted"}
@@ -48,6 +48,8 @@ setup(
     zip_safe=False,
     extras_require={
         'testing': tests_require,
+        # Faster JSON rendering, picked up automatically (see json.encoder).
+        'speedups': ['orjson'],
     },
     install_requires=requires,
     entry_points={
@@ -56,6 +58,7 @@ setup(
         ],
         'console_scripts': [
             'initialize_ruangpulih_db = ruangpulih.scripts.initialize_db:main',
+            'rebuild_ruangpulih_ratings = ruangpulih.scripts.rebuild_ratings:main',
         ],
     },
 )